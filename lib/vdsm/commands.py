@@ -20,7 +20,9 @@
 from __future__ import absolute_import
 
 from weakref import proxy
+import collections
 import errno
+import fcntl
 import io
 import logging
 import os
@@ -30,8 +32,11 @@ import subprocess
 import threading
 import time
 from . import cmdutils
+from . import concurrent
+from . import forkserver
 from .compat import CPopen
 from .utils import NoIntrPoll, stripNewLines, terminating
+from vdsm.common import zombiereaper
 from vdsm.common.exception import ActionStopped
 from vdsm import constants
 
@@ -40,6 +45,20 @@ from vdsm import constants
 # it
 BUFFSIZE = 1024
 
+# Maximum data buffered for AsyncProc stdout or stderr. When the buffer is
+# full, the process blocks until some data is read.
+MAX_BUFFER = 1024**2
+
+# How long a non-blocking AsyncProc read waits for new data.
+_READ_TIMEOUT = 1
+
+# How often AsyncProc.wait() checks the process when its streams are open
+# and closed.
+_WAIT_INTERVAL = 1
+_EXIT_INTERVAL = 0.01
+
+_ANY_CPU = list(range(os.sysconf('SC_NPROCESSORS_CONF')))
+
 
 def execCmd(command, sudo=False, cwd=None, data=None, raw=False,
             printable=None, env=None, sync=True, nice=None, ioclass=None,
@@ -48,32 +67,30 @@ def execCmd(command, sudo=False, cwd=None, data=None, raw=False,
     """
     Executes an external command, optionally via sudo.
 
+    If the fork server is running, the command is spawned by the fork server
+    instead of forking vdsm, see vdsm.forkserver.
+
     IMPORTANT NOTE: the new process would receive `deathSignal` when the
     controlling thread dies, which may not be what you intended: if you create
     a temporary thread, spawn a sync=False sub-process, and have the thread
-    finish, the new subprocess would die immediately.
+    finish, the new subprocess would die immediately. When using the fork
+    server, the new process receives `deathSignal` when vdsm terminates.
     """
 
-    command = cmdutils.wrap_command(command, with_ioclass=ioclass,
-                                    ioclassdata=ioclassdata, with_nice=nice,
-                                    with_setsid=setsid, with_sudo=sudo,
-                                    reset_cpu_affinity=resetCpuAffinity)
-
     # Unsubscriptable objects (e.g. generators) need conversion
     if not callable(getattr(command, '__getitem__', None)):
         command = tuple(command)
 
-    if not printable:
-        printable = command
-
-    execCmdLogger.debug(cmdutils.command_log_line(printable, cwd=cwd))
-
-    extra = {}
-    extra['stderr'] = subprocess.PIPE
-    extra['stdout'] = subprocess.PIPE
-    if deathSignal is not None:
-        extra['deathSignal'] = deathSignal
-    p = CPopen(command, close_fds=True, cwd=cwd, env=env, **extra)
+    p = None
+    if forkserver.running() and (ioclass is None or
+                                 forkserver.IOCLASS_SUPPORTED):
+        p = _fork_server_spawn(command, sudo, cwd, printable, env, nice,
+                               ioclass, ioclassdata, setsid, execCmdLogger,
+                               deathSignal, resetCpuAffinity)
+    if p is None:
+        p = _cpopen_spawn(command, sudo, cwd, printable, env, nice, ioclass,
+                          ioclassdata, setsid, execCmdLogger, deathSignal,
+                          resetCpuAffinity)
 
     if not sync:
         p = AsyncProc(p)
@@ -99,19 +116,67 @@ def execCmd(command, sudo=False, cwd=None, data=None, raw=False,
     return p.returncode, out, err
 
 
+def _fork_server_spawn(command, sudo, cwd, printable, env, nice, ioclass,
+                       ioclassdata, setsid, execCmdLogger, deathSignal,
+                       resetCpuAffinity):
+    """
+    Spawn command using the fork server, returning the new process, or None
+    if the fork server failed.
+    """
+    # The fork server sets nice, io class, session and cpu affinity itself,
+    # only sudo needs a wrapper.
+    command = cmdutils.wrap_command(command, with_sudo=sudo,
+                                    reset_cpu_affinity=False)
+    if resetCpuAffinity and cmdutils._USING_CPU_AFFINITY:
+        cpus = _ANY_CPU
+    else:
+        cpus = None
+
+    execCmdLogger.debug(cmdutils.command_log_line(printable or command,
+                                                  cwd=cwd))
+    try:
+        return forkserver.spawn(command, cwd=cwd, env=env, nice=nice,
+                                ioclass=ioclass, ioclassdata=ioclassdata,
+                                cpus=cpus, setsid=setsid,
+                                death_signal=deathSignal)
+    except forkserver.Error as e:
+        execCmdLogger.warning("Cannot use fork server (%s), forking vdsm", e)
+        return None
+
+
+def _cpopen_spawn(command, sudo, cwd, printable, env, nice, ioclass,
+                  ioclassdata, setsid, execCmdLogger, deathSignal,
+                  resetCpuAffinity):
+    command = cmdutils.wrap_command(command, with_ioclass=ioclass,
+                                    ioclassdata=ioclassdata, with_nice=nice,
+                                    with_setsid=setsid, with_sudo=sudo,
+                                    reset_cpu_affinity=resetCpuAffinity)
+
+    execCmdLogger.debug(cmdutils.command_log_line(printable or command,
+                                                  cwd=cwd))
+
+    extra = {}
+    extra['stderr'] = subprocess.PIPE
+    extra['stdout'] = subprocess.PIPE
+    if deathSignal is not None:
+        extra['deathSignal'] = deathSignal
+    return CPopen(command, close_fds=True, cwd=cwd, env=env, **extra)
+
+
 class AsyncProc(object):
     """
     AsyncProc is a funky class. It wraps a standard subprocess.Popen
     Object and gives it super powers. Like the power to read from a stream
-    without the fear of deadlock. It does this by always sampling all
-    stream while waiting for data. By doing this the other process can freely
-    write data to all stream without the fear of it getting stuck writing
-    to a full pipe.
+    without the fear of deadlock. It does this by reading the stdout and
+    stderr of all processes in a single event loop thread into bounded
+    buffers. By doing this the other process can freely write data to all
+    stream without the fear of it getting stuck writing to a full pipe, unless
+    nobody reads MAX_BUFFER bytes of its output.
     """
     class _streamWrapper(io.RawIOBase):
-        def __init__(self, parent, streamToWrap, fd):
+        def __init__(self, parent, stream, fd):
             io.IOBase.__init__(self)
-            self._stream = streamToWrap
+            self._stream = stream
             self._parent = proxy(parent)
             self._fd = fd
             self._closed = False
@@ -119,17 +184,17 @@ class AsyncProc(object):
         def close(self):
             if not self._closed:
                 self._closed = True
-                while not self._streamClosed:
-                    self._parent._processStreams()
+                if self._stream is None:
+                    self._parent._proc.stdin.close()
+                else:
+                    # Nobody will read the data, but the process must not
+                    # block on a full pipe.
+                    self._stream.set_handler(_DiscardHandler())
 
         @property
         def closed(self):
             return self._closed
 
-        @property
-        def _streamClosed(self):
-            return (self.fileno() in self._parent._closedfds)
-
         def fileno(self):
             return self._fd
 
@@ -137,35 +202,19 @@ class AsyncProc(object):
             return False
 
         def readable(self):
-            return True
+            return self._stream is not None
 
         def writable(self):
-            return True
-
-        def _readNonBlock(self, length):
-            hasNewData = (self._stream.len - self._stream.pos)
-            if hasNewData < length and not self._streamClosed:
-                self._parent._processStreams()
+            return self._stream is None
 
-            with self._parent._streamLock:
-                res = self._stream.read(length)
-                if self._stream.pos == self._stream.len:
-                    self._stream.truncate(0)
-
-            if res == "" and not self._streamClosed:
-                return None
-            else:
-                return res
-
-        def read(self, length):
+        def read(self, length=-1):
+            if length is None or length < 0:
+                return self.readall()
             if not self._parent.blocking:
-                return self._readNonBlock(length)
+                # Like the old inline polling, wait a little for new data.
+                return self._stream.read(length, _READ_TIMEOUT)
             else:
-                res = None
-                while res is None:
-                    res = self._readNonBlock(length)
-
-                return res
+                return self._stream.read(length, None)
 
         def readinto(self, b):
             data = self.read(len(b))
@@ -180,49 +229,31 @@ class AsyncProc(object):
         def write(self, data):
             if hasattr(data, "tobytes"):
                 data = data.tobytes()
-            with self._parent._streamLock:
-                oldPos = self._stream.pos
-                self._stream.pos = self._stream.len
-                self._stream.write(data)
-                self._stream.pos = oldPos
-
-            while self._stream.len > 0 and not self._streamClosed:
-                self._parent._processStreams()
-
-            if self._streamClosed:
-                self._closed = True
-
-            if self._stream.len != 0:
-                raise IOError(errno.EPIPE,
-                              "Could not write all data to stream")
-
-            return len(data)
+            written = 0
+            while written < len(data):
+                try:
+                    written += os.write(self._fd, data[written:])
+                except OSError as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    if e.errno != errno.EPIPE:
+                        raise
+                    self._closed = True
+                    raise IOError(errno.EPIPE,
+                                  "Could not write all data to stream")
+            return written
 
     def __init__(self, popenToWrap):
-        # this is an ugly hack to let this module load on Python 3, and fail
-        # later when AsyncProc is used.
-        from StringIO import StringIO
-
-        self._streamLock = threading.Lock()
         self._proc = popenToWrap
-
-        self._stdout = StringIO()
-        self._stderr = StringIO()
-        self._stdin = StringIO()
+        self._loop = _stream_loop()
 
         fdout = self._proc.stdout.fileno()
         fderr = self._proc.stderr.fileno()
-        self._fdin = self._proc.stdin.fileno()
-
-        self._closedfds = []
+        fdin = self._proc.stdin.fileno()
 
-        self._poller = select.epoll()
-        self._poller.register(fdout, select.EPOLLIN | select.EPOLLPRI)
-        self._poller.register(fderr, select.EPOLLIN | select.EPOLLPRI)
-        self._poller.register(self._fdin, 0)
-        self._fdMap = {fdout: self._stdout,
-                       fderr: self._stderr,
-                       self._fdin: self._stdin}
+        self._cond = threading.Condition(threading.Lock())
+        self._stdout = _Stream(fdout, self._cond, MAX_BUFFER)
+        self._stderr = _Stream(fderr, self._cond, MAX_BUFFER)
 
         self.stdout = io.BufferedReader(self._streamWrapper(self,
                                         self._stdout, fdout), BUFFSIZE)
@@ -231,58 +262,25 @@ class AsyncProc(object):
                                         self._stderr, fderr), BUFFSIZE)
 
         self.stdin = io.BufferedWriter(self._streamWrapper(self,
-                                       self._stdin, self._fdin), BUFFSIZE)
+                                       None, fdin), BUFFSIZE)
 
         self._returncode = None
 
         self.blocking = False
 
-    def _processStreams(self):
-        if len(self._closedfds) == 3:
-            return
+        self._loop.register(self._stdout)
+        self._loop.register(self._stderr)
 
-        if not self._streamLock.acquire(False):
-            self._streamLock.acquire()
-            self._streamLock.release()
-            return
-        try:
-            if self._stdin.len > 0 and self._stdin.pos == 0:
-                # Polling stdin is redundant if there is nothing to write
-                # turn on only if data is waiting to be pushed
-                self._poller.modify(self._fdin, select.EPOLLOUT)
-
-            pollres = NoIntrPoll(self._poller.poll, 1)
-
-            for fd, event in pollres:
-                stream = self._fdMap[fd]
-                if event & select.EPOLLOUT and self._stdin.len > 0:
-                    buff = self._stdin.read(BUFFSIZE)
-                    written = os.write(fd, buff)
-                    stream.pos -= len(buff) - written
-                    if stream.pos == stream.len:
-                        stream.truncate(0)
-                        self._poller.modify(fd, 0)
-
-                elif event & (select.EPOLLIN | select.EPOLLPRI):
-                    data = os.read(fd, BUFFSIZE)
-                    oldpos = stream.pos
-                    stream.pos = stream.len
-                    stream.write(data)
-                    stream.pos = oldpos
-
-                elif event & (select.EPOLLHUP | select.EPOLLERR):
-                    self._poller.unregister(fd)
-                    self._closedfds.append(fd)
-                    # I don't close the fd because the original Popen
-                    # will do it.
-
-            if self.stdin.closed and self._fdin not in self._closedfds:
-                self._poller.unregister(self._fdin)
-                self._closedfds.append(self._fdin)
-                self._proc.stdin.close()
-
-        finally:
-            self._streamLock.release()
+    def add_line_handler(self, name, callback, separator="\n"):
+        """
+        Call callback(line) from the event loop thread for every line
+        written to stream name ("stdout" or "stderr"), instead of keeping the
+        data for readers. The separator is removed from the line; use "\\r"
+        to parse progress updates. Data buffered before adding the handler is
+        passed to the handler.
+        """
+        stream = self._stdout if name == "stdout" else self._stderr
+        stream.set_handler(LineHandler(callback, separator))
 
     @property
     def pid(self):
@@ -312,15 +310,40 @@ class AsyncProc(object):
             execCmd([constants.EXT_KILL, "-%d" % (signal.SIGTERM,),
                     str(self.pid)], sudo=True)
 
+    def auto_reap(self):
+        """
+        Reap the process when it terminates, for callers that stop waiting
+        for it. The fork server reaps its own children.
+        """
+        if not isinstance(self._proc, forkserver.Process):
+            zombiereaper.autoReapPID(self.pid)
+
     def wait(self, timeout=None, cond=None):
+        """
+        Wait until the process has exited and line handlers got all the
+        process output. Return False if timeout expired or cond() returned
+        True before that.
+        """
         startTime = time.time()
-        while self.returncode is None:
-            if timeout is not None and (time.time() - startTime) > timeout:
+        interval = _WAIT_INTERVAL
+        while True:
+            exited = self.returncode is not None
+            with self._cond:
+                if exited and self._stdout.drained and self._stderr.drained:
+                    return True
+            elapsed = time.time() - startTime
+            if timeout is not None and elapsed > timeout:
                 return False
             if cond is not None and cond():
                 return False
-            self._processStreams()
-        return True
+            with self._cond:
+                if exited or self._stdout.eof and self._stderr.eof:
+                    # No more stream events will wake us up, and the process
+                    # is most likely exiting, or we wait for the handlers.
+                    interval = _EXIT_INTERVAL
+                if timeout is not None:
+                    interval = max(0, min(interval, timeout - elapsed))
+                self._cond.wait(interval)
 
     def communicate(self, data=None):
         if data is not None:
@@ -332,7 +355,255 @@ class AsyncProc(object):
         return "".join(self.stdout), "".join(self.stderr)
 
     def __del__(self):
-        self._poller.close()
+        self._loop.unregister(self._stdout)
+        self._loop.unregister(self._stderr)
+
+
+class LineHandler(object):
+    """
+    Split stream data to lines, calling callback with every line.
+    """
+
+    def __init__(self, callback, separator="\n"):
+        self._callback = callback
+        self._separator = separator
+        self._partial = ""
+
+    def __call__(self, data):
+        data = self._partial + data
+        lines = data.split(self._separator)
+        self._partial = lines.pop()
+        for line in lines:
+            self._callback(line)
+
+    def close(self):
+        if self._partial:
+            self._callback(self._partial)
+            self._partial = ""
+
+
+class _DiscardHandler(object):
+    """
+    Drop data of a stream nobody will read.
+    """
+
+    def __call__(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Stream(object):
+    """
+    A bounded buffer filled by the event loop from a process stream. All
+    methods must be called with cond locked, except read() and
+    set_handler().
+
+    Handlers are called without cond locked, holding handler_lock, which
+    must be taken before cond.
+    """
+
+    def __init__(self, fd, cond, max_size):
+        self.fd = fd
+        self.cond = cond
+        self.handler_lock = threading.Lock()
+        self.eof = False
+        self.done = False
+        self.paused = False
+        self.handler = None
+        self.on_resume = None
+        self._max_size = max_size
+        self._chunks = collections.deque()
+        self._size = 0
+
+    @property
+    def buffered(self):
+        return self._size
+
+    @property
+    def full(self):
+        return self._size >= self._max_size
+
+    @property
+    def drained(self):
+        """
+        True unless a line handler did not get all the stream data yet.
+        """
+        return self.done or not isinstance(self.handler, LineHandler)
+
+    def append(self, data):
+        """
+        Buffer data, or return the handler that should get it.
+        """
+        if not data:
+            self.eof = True
+        self.cond.notify_all()
+        if self.handler is not None:
+            return self.handler
+        if data:
+            self._chunks.append(data)
+            self._size += len(data)
+        else:
+            self.done = True
+        return None
+
+    def take(self, length=None):
+        """
+        Remove and return up to length bytes from the buffer.
+        """
+        if length is None or length >= self._size:
+            data = "".join(self._chunks)
+            self._chunks.clear()
+        else:
+            parts = []
+            remaining = length
+            while remaining:
+                chunk = self._chunks.popleft()
+                if len(chunk) > remaining:
+                    self._chunks.appendleft(chunk[remaining:])
+                    chunk = chunk[:remaining]
+                parts.append(chunk)
+                remaining -= len(chunk)
+            data = "".join(parts)
+        self._size -= len(data)
+        if self.paused and not self.full:
+            self.on_resume(self)
+        return data
+
+    def read(self, length, timeout):
+        """
+        Return up to length bytes, "" at end of stream, or None if no data
+        was available within timeout.
+        """
+        with self.cond:
+            deadline = None if timeout is None else time.time() + timeout
+            while self._size == 0 and not self.eof:
+                if deadline is None:
+                    self.cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self.cond.wait(remaining)
+            return self.take(length)
+
+    def set_handler(self, handler):
+        with self.handler_lock:
+            with self.cond:
+                self.handler = handler
+                data = self.take()
+                eof = self.eof
+            if data:
+                handler(data)
+            if eof:
+                handler.close()
+
+    def handle(self, handler, data):
+        """
+        Pass data returned by append() to handler, holding handler_lock.
+        """
+        if data:
+            handler(data)
+        else:
+            try:
+                handler.close()
+            finally:
+                with self.cond:
+                    self.done = True
+                    self.cond.notify_all()
+
+
+class _StreamLoop(object):
+    """
+    Read the stdout and stderr of all AsyncProc processes in one thread.
+    """
+
+    _log = logging.getLogger("commands.StreamLoop")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._poller = select.epoll()
+        self._thread = concurrent.thread(self._run, name="streams",
+                                         logger=self._log.name)
+        self._thread.start()
+
+    def register(self, stream):
+        fl = fcntl.fcntl(stream.fd, fcntl.F_GETFL)
+        fcntl.fcntl(stream.fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+        stream.on_resume = self._resume
+        with self._lock:
+            self._streams[stream.fd] = stream
+            self._poller.register(stream.fd, _READ_EVENTS)
+
+    def unregister(self, stream):
+        """
+        Must be called before closing the stream fd.
+        """
+        with self._lock:
+            if self._streams.get(stream.fd) is stream:
+                del self._streams[stream.fd]
+                self._poller.unregister(stream.fd)
+
+    def _resume(self, stream):
+        # Called with stream.cond locked, when a reader made room in a
+        # paused stream.
+        with self._lock:
+            if self._streams.get(stream.fd) is stream:
+                self._poller.modify(stream.fd, _READ_EVENTS)
+                stream.paused = False
+
+    def _run(self):
+        while True:
+            for fd, event in NoIntrPoll(self._poller.poll):
+                with self._lock:
+                    stream = self._streams.get(fd)
+                if stream is not None:
+                    self._read(stream)
+
+    def _read(self, stream):
+        with stream.handler_lock:
+            with stream.cond:
+                with self._lock:
+                    # The stream may be unregistered and its fd closed by
+                    # now.
+                    if self._streams.get(stream.fd) is not stream:
+                        return
+                    try:
+                        data = os.read(stream.fd, BUFFSIZE * 64)
+                    except OSError as e:
+                        if e.errno in (errno.EAGAIN, errno.EINTR):
+                            return
+                        data = ""
+                    if not data:
+                        del self._streams[stream.fd]
+                        self._poller.unregister(stream.fd)
+                handler = stream.append(data)
+                if not stream.eof and stream.full:
+                    with self._lock:
+                        if self._streams.get(stream.fd) is stream:
+                            self._poller.modify(stream.fd, 0)
+                            stream.paused = True
+            if handler is not None:
+                stream.handle(handler, data)
+
+
+_READ_EVENTS = select.EPOLLIN | select.EPOLLPRI
+
+_loop_lock = threading.Lock()
+_loop = None
+_loop_pid = None
+
+
+def _stream_loop():
+    global _loop, _loop_pid
+    with _loop_lock:
+        # A forked child (e.g. supervdsm) does not have our thread.
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = _StreamLoop()
+            _loop_pid = os.getpid()
+        return _loop
 
 
 def grepCmd(pattern, paths):
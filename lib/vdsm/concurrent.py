@@ -129,19 +129,36 @@ class Barrier(object):
 Result = namedtuple("Result", ["succeeded", "value"])
 
 
-def tmap(func, iterable):
+def tmap(func, iterable, workers=None):
+    """
+    Run func with each argument from iterable in another thread, and return a
+    list of Result in the same order as the arguments.
+
+    By default one thread is started for each argument. If workers is set, at
+    most workers threads are started, each running func with the next
+    argument until all arguments are consumed.
+    """
     args = list(iterable)
     results = [None] * len(args)
-
-    def worker(i, f, arg):
-        try:
-            results[i] = Result(True, f(arg))
-        except Exception as e:
-            results[i] = Result(False, e)
+    if workers is None:
+        workers = len(args)
+    indexes = iter(range(len(args)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(indexes, None)
+            if i is None:
+                return
+            try:
+                results[i] = Result(True, func(args[i]))
+            except Exception as e:
+                results[i] = Result(False, e)
 
     threads = []
-    for i, arg in enumerate(args):
-        t = thread(worker, args=(i, func, arg))
+    for i in range(min(workers, len(args))):
+        t = thread(worker)
         t.start()
         threads.append(t)
 
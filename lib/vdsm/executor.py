@@ -29,6 +29,23 @@ import logging
 import threading
 
 from . import concurrent
+from . import utils
+
+# Task priorities, tasks with higher priority are executed first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+_PRIORITIES = 3
+
+# Add a worker when a task waited more than this in the queue.
+_SCALE_UP_WAIT = 0.5
+
+# Remove a worker added for a busy queue after it was idle this long.
+_IDLE_TIMEOUT = 30
+
+_executors = {}
+_executors_lock = threading.Lock()
 
 
 class NotRunning(Exception):
@@ -70,11 +87,21 @@ class Executor(object):
       the stuck task finishes.  This prevents creating an excessive number
       of threads when many tasks are stuck.
 
+    - Tasks are dispatched with a priority, and waiting tasks with higher
+      priority are executed first.  Tasks with the same priority are executed
+      in dispatch order.
+
+    - If `max_workers` is set and tasks wait in the queue longer than
+      `scale_up_wait` seconds, more workers are added, up to `max_workers`.
+      Workers added this way exit after being idle for `idle_timeout`
+      seconds, until `workers_count` workers are left.
+
     """
     _log = logging.getLogger('Executor')
 
     def __init__(self, name, workers_count, max_tasks, scheduler,
-                 max_workers=None):
+                 max_workers=None, scale_up_wait=_SCALE_UP_WAIT,
+                 idle_timeout=_IDLE_TIMEOUT):
         """
         :param name: Name of the executor; no special purpose, just for
           logging and debugging.
@@ -96,17 +123,31 @@ class Executor(object):
           it is not None and it gets reached then no further workers are
           created.
         :type max_workers: int or None
+        :param scale_up_wait: Add a worker if a task waited in the queue more
+          than this number of seconds.  Used only if `max_workers` is set.
+        :type scale_up_wait: float
+        :param idle_timeout: Number of seconds after which an idle worker
+          exits, if there are more than `workers_count` workers.
+        :type idle_timeout: float
 
         """
         self._name = name
         self._workers_count = workers_count
         self._max_workers = max_workers
+        self._scale_up_wait = scale_up_wait
+        self._idle_timeout = idle_timeout
         self._worker_id = 0
-        self._tasks = TaskQueue(max_tasks)
+        self._tasks = TaskQueue(max_tasks, priorities=_PRIORITIES)
         self._scheduler = scheduler
         self._workers = set()
         self._lock = threading.Lock()
         self._running = False
+        self._stats = {
+            'tasks': 0,
+            'wait_time': 0.0,
+            'run_time': 0.0,
+            'discarded_workers': 0,
+        }
 
     @property
     def name(self):
@@ -120,32 +161,61 @@ class Executor(object):
             self._running = True
             for _ in range(self._workers_count):
                 self._add_worker()
+        with _executors_lock:
+            _executors[self._name] = self
 
     def stop(self, wait=True):
         self._log.debug('Stopping executor')
+        with _executors_lock:
+            if _executors.get(self._name) is self:
+                del _executors[self._name]
         with self._lock:
             self._running = False
             self._tasks.clear()
-            for _ in range(self._workers_count):
-                self._tasks.put(_STOP)
+            # Workers added for a busy queue need their own pill.
+            for _ in range(self._active_workers):
+                self._tasks.put(_STOP, PRIORITY_HIGH, force=True)
             workers = tuple(self._workers) if wait else ()
         for worker in workers:
             worker.join()
 
-    def dispatch(self, callable, timeout=None):
+    def dispatch(self, callable, timeout=None, priority=PRIORITY_NORMAL):
         """
         Dispatches a new task to the executor.
 
         The task may be any callable.
         The task will be executed as soon as possible
-        in one of the active workers of the executor.
+        in one of the active workers of the executor,
+        after waiting tasks with higher priority.
 
         The timeout is measured from the time the callable
         is called.
         """
         if not self._running:
             raise NotRunning()
-        self._tasks.put(Task(callable, timeout))
+        self._tasks.put(Task(callable, timeout, utils.monotonic_time()),
+                        priority)
+        self._may_scale_up(self._tasks.peek())
+
+    def stats(self):
+        """
+        Return a dict with the executor statistics:
+
+        queued              Number of tasks waiting in the queue
+        workers             Number of workers, including discarded workers
+        active_workers      Number of workers which are not discarded
+        tasks               Number of executed tasks
+        wait_time           Total time tasks waited in the queue, in seconds
+        run_time            Total time spent executing tasks, in seconds
+        discarded_workers   Number of workers discarded because a task was
+                            blocked
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['workers'] = self._total_workers
+            stats['active_workers'] = self._active_workers
+        stats['queued'] = len(self._tasks)
+        return stats
 
     # Serving workers
 
@@ -175,6 +245,7 @@ class Executor(object):
         worker_added = False
 
         with self._lock:
+            self._stats['discarded_workers'] += 1
             if not self._running:
                 return
             if self._may_add_workers():
@@ -201,7 +272,8 @@ class Executor(object):
         worker_added = False
 
         with self._lock:
-            self._workers.remove(worker)
+            # An idle worker was already removed in _next_task().
+            self._workers.discard(worker)
             if not self._running:
                 return
             if self._may_add_workers():
@@ -212,18 +284,59 @@ class Executor(object):
             self._log.debug("New worker added (%s active, %s total workers)",
                             self._active_workers, self._total_workers)
 
-    def _next_task(self):
+    def _next_task(self, worker):
         """
         Called from the worker thread to get the next task from the task queue.
-        Raises NotRunning exception if executor was stopped.
+        Raises NotRunning exception if executor was stopped, and _WorkerIdle
+        if the worker is not needed any more.
         """
-        task = self._tasks.get()
-        if task is _STOP:
-            raise NotRunning()
-        return task
+        # Without max_workers there are never extra workers to remove.
+        timeout = None if self._max_workers is None else self._idle_timeout
+        while True:
+            task = self._tasks.get(timeout=timeout)
+            if task is _STOP:
+                raise NotRunning()
+            if task is not None:
+                self._may_scale_up(task)
+                return task
+            with self._lock:
+                if self._running and \
+                        self._active_workers > self._workers_count:
+                    self._workers.discard(worker)
+                    raise _WorkerIdle()
+
+    def _task_done(self, task, started, finished):
+        """
+        Called from the worker thread after a task was executed.
+        """
+        with self._lock:
+            self._stats['tasks'] += 1
+            self._stats['wait_time'] += started - task.queued
+            self._stats['run_time'] += finished - started
 
     # Private
 
+    def _may_scale_up(self, task):
+        """
+        Add a worker if task waited too long in the queue, and the queue is
+        not empty.
+        """
+        if self._max_workers is None or task is None or task is _STOP:
+            return
+        if utils.monotonic_time() - task.queued < self._scale_up_wait:
+            return
+        with self._lock:
+            if (self._running and len(self._tasks) > 0 and
+                    self._total_workers < self._max_workers):
+                self._add_worker()
+                added = True
+            else:
+                added = False
+        if added:
+            self._log.debug("Tasks waiting in queue, worker added "
+                            "(%s active, %s total workers)",
+                            self._active_workers, self._total_workers)
+
     def _add_worker(self):
         name = "%s/%d" % (self.name, self._worker_id)
         self._worker_id += 1
@@ -238,6 +351,10 @@ class _WorkerDiscarded(Exception):
     """ Raised if worker was discarded during execution of a task """
 
 
+class _WorkerIdle(Exception):
+    """ Raised if worker was idle and is not needed any more """
+
+
 class _Worker(object):
 
     _log = logging.getLogger('Executor')
@@ -275,19 +392,23 @@ class _Worker(object):
             self._log.debug('Worker stopped')
         except _WorkerDiscarded:
             self._log.debug('Worker was discarded')
+        except _WorkerIdle:
+            self._log.debug('Worker was idle')
         finally:
             self._executor._worker_stopped(self)
 
     def _execute_task(self):
-        task = self._executor._next_task()
+        task = self._executor._next_task(self)
         discard = self._discard_after(task.timeout)
         self._task = task
+        started = utils.monotonic_time()
         try:
             task.callable()
         except Exception:
             self._log.exception("Unhandled exception in %s", task)
         finally:
             self._task = None
+            self._executor._task_done(task, started, utils.monotonic_time())
             # We want to discard workers that were too slow to disarm
             # the timer. It does not matter if the thread was still
             # blocked on callable when we discard it or it just finished.
@@ -329,7 +450,7 @@ class _Worker(object):
         )
 
 
-Task = collections.namedtuple("Task", "callable, timeout")
+Task = collections.namedtuple("Task", "callable, timeout, queued")
 
 
 class TaskQueue(object):
@@ -340,40 +461,79 @@ class TaskQueue(object):
     * Queue.Queue lacks the clear() operation, which is needed to implement
       the 'poison pill' pattern (described for example in
       http://pymotw.com/2/multiprocessing/communication.html )
+
+    Tasks are kept in one deque per priority, 0 being the highest priority.
+    max_tasks limits the total number of tasks in all priorities.
     """
 
-    def __init__(self, max_tasks):
+    def __init__(self, max_tasks, priorities=1):
         self._max_tasks = max_tasks
-        self._tasks = collections.deque()
-        # Deque supports thread-safe append and pop from both ends. We need
-        # this condition for waking up threads waiting on an empty queue and
-        # protecting other methods which are not documented as thread-safe.
-        # https://docs.python.org/2/library/collections.html#deque-objects
+        self._queues = [collections.deque() for _ in range(priorities)]
+        self._count = 0
         self._cond = threading.Condition(threading.Lock())
 
-    def put(self, task):
+    def __len__(self):
+        return self._count
+
+    def put(self, task, priority=0, force=False):
         """
         Put a new task in the queue.
-        Do not block when full, raises TooManyTasks instead.
+        Do not block when full, raises TooManyTasks instead, unless force is
+        True; then the task is added even if the queue is full.
         """
+        if not 0 <= priority < len(self._queues):
+            raise ValueError("Invalid priority: %r" % priority)
         with self._cond:
-            if len(self._tasks) == self._max_tasks:
+            if self._count >= self._max_tasks and not force:
                 raise TooManyTasks()
-            self._tasks.append(task)
+            self._queues[priority].append(task)
+            self._count += 1
             self._cond.notify()
 
-    def get(self):
+    def get(self, timeout=None):
         """
-        Get a new task. Blocks if empty.
+        Get a new task. Blocks if empty, up to timeout seconds if timeout is
+        not None. Returns None if the timeout expired.
         """
-        while True:
-            try:
-                return self._tasks.popleft()
-            except IndexError:
-                with self._cond:
-                    if not self._tasks:
-                        self._cond.wait()
+        with self._cond:
+            if timeout is not None:
+                deadline = utils.monotonic_time() + timeout
+            while self._count == 0:
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - utils.monotonic_time()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            for queue in self._queues:
+                if queue:
+                    self._count -= 1
+                    return queue.popleft()
+
+    def peek(self):
+        """
+        Return the task get() would return without removing it, or None if
+        the queue is empty.
+        """
+        with self._cond:
+            for queue in self._queues:
+                if queue:
+                    return queue[0]
+            return None
 
     def clear(self):
         with self._cond:
-            self._tasks.clear()
+            for queue in self._queues:
+                queue.clear()
+            self._count = 0
+
+
+def stats():
+    """
+    Return a dict mapping the name of every running executor to its
+    statistics, see Executor.stats().
+    """
+    with _executors_lock:
+        executors = list(_executors.values())
+    return {e.name: e.stats() for e in executors}
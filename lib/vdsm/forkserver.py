@@ -0,0 +1,683 @@
+#
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+A small helper process spawning commands on behalf of vdsm.
+
+Forking vdsm, a big multi-threaded process, is expensive, and wrapping
+commands with nice, ionice and taskset adds more processes to every command.
+The fork server is a fresh python interpreter started early by vdsm. It
+forks and execs commands from its own small address space, applying nice, io
+class, cpu affinity, session and death signal itself.
+
+vdsm and the fork server are connected by a control socket. For every command,
+vdsm creates a socket pair and sends one end to the server over the control
+socket. On this channel, vdsm sends the request, and the server replies with
+the child pid and the child stdin, stdout and stderr pipes, or with the error
+preventing the command from running. When the child terminates, the server
+sends its exit status and closes the channel.
+
+The child is not a child of vdsm; its death signal is sent when the fork
+server terminates, and the fork server terminates when vdsm closes the control
+socket or terminates.
+
+This module must import only the standard library, since it is the main
+module of the fork server.
+"""
+
+from __future__ import absolute_import
+
+import ctypes
+import errno
+import fcntl
+import logging
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:  # py3
+    import pickle
+
+log = logging.getLogger("forkserver")
+
+_MAX_MESSAGE = 256 * 1024
+
+# Used to read and write pickled messages, since messages are sent only
+# between vdsm and its fork server.
+_PICKLE_PROTOCOL = 2
+
+_PR_SET_PDEATHSIG = 1
+
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+# Used by ionice when no io class data is specified
+_IOPRIO_DEFAULT_DATA = 4
+
+# ioprio_set(2) has no wrapper in libc.
+_SYS_IOPRIO_SET = {
+    "x86_64": 251,
+    "ppc64": 273,
+    "ppc64le": 273,
+    "aarch64": 30,
+    "s390x": 282,
+}.get(os.uname()[4])
+
+# Time to wait for children killed by their death signal when stopping.
+_SHUTDOWN_TIMEOUT = 5
+
+# True if the fork server can set the io class of commands.
+IOCLASS_SUPPORTED = _SYS_IOPRIO_SET is not None
+
+_libc = ctypes.CDLL("libc.so.6", use_errno=True)
+
+_lock = threading.Lock()
+_server = None
+
+
+class Error(Exception):
+    """ Raised when the fork server cannot be used """
+
+
+def start():
+    """
+    Start the fork server. Should be called early, before starting threads,
+    so the fork server inherits a clean environment.
+    """
+    global _server
+    with _lock:
+        if _server is not None:
+            raise Error("Fork server already started")
+        _server = _Server()
+
+
+def stop():
+    """
+    Stop the fork server. Children started with a death signal receive their
+    death signal.
+    """
+    global _server
+    with _lock:
+        server, _server = _server, None
+    if server is not None:
+        server.stop()
+
+
+def running():
+    return _server is not None
+
+
+def spawn(argv, cwd=None, env=None, nice=None, ioclass=None,
+          ioclassdata=None, cpus=None, setsid=False, death_signal=None):
+    """
+    Run argv in a child of the fork server, returning a Process.
+
+    nice        Niceness increment
+    ioclass     IO scheduling class, one of utils.IOCLASS
+    ioclassdata IO scheduling priority within ioclass
+    cpus        List of cpus the child is allowed to run on; if None, the
+                child inherits the cpu affinity of the fork server
+    setsid      Run the child in a new session
+    death_signal    Signal sent to the child when the fork server terminates
+
+    Raises OSError if the command could not be executed, and Error if the
+    fork server is not running or failed.
+    """
+    server = _server
+    if server is None:
+        raise Error("Fork server is not running")
+    if ioclass is not None and not IOCLASS_SUPPORTED:
+        raise Error("Cannot set io class on this architecture")
+    request = {
+        "argv": list(argv),
+        "cwd": cwd,
+        "env": env,
+        "nice": nice,
+        "ioclass": ioclass,
+        "ioclassdata": ioclassdata,
+        "cpus": cpus,
+        "setsid": setsid,
+        "death_signal": death_signal,
+    }
+    return server.spawn(request)
+
+
+class Process(object):
+    """
+    A command spawned by the fork server, providing the subset of Popen
+    interface used by vdsm.
+    """
+
+    def __init__(self, server, pid, channel, stdin, stdout, stderr):
+        self.pid = pid
+        self._server = server
+        self.stdin = os.fdopen(stdin, "wb", 0)
+        self.stdout = os.fdopen(stdout, "rb", 0)
+        self.stderr = os.fdopen(stderr, "rb", 0)
+        self.returncode = None
+        self._channel = channel
+        self._lock = threading.Lock()
+
+    def poll(self):
+        return self._wait(block=False)
+
+    def wait(self):
+        return self._wait(block=True)
+
+    def communicate(self, data=None):
+        """
+        Write data to the process stdin and read its stdout and stderr until
+        they are closed, then wait for the process.
+        """
+        stdin = self.stdin.fileno()
+        stdout = self.stdout.fileno()
+        pending = {stdout: [], self.stderr.fileno(): []}
+        poller = select.poll()
+        for fd in pending:
+            poller.register(fd, select.POLLIN)
+        if data:
+            poller.register(stdin, select.POLLOUT)
+        else:
+            self.stdin.close()
+        offset = 0
+
+        while pending or not self.stdin.closed:
+            for fd, event in _poll(poller):
+                if fd == stdin:
+                    try:
+                        offset += os.write(fd, data[offset:offset + 4096])
+                    except OSError as e:
+                        if e.errno != errno.EPIPE:
+                            raise
+                        offset = len(data)
+                    if offset == len(data):
+                        poller.unregister(fd)
+                        self.stdin.close()
+                else:
+                    chunk = os.read(fd, 4096)
+                    if chunk:
+                        pending[fd].append(chunk)
+                    else:
+                        poller.unregister(fd)
+                        output = b"".join(pending.pop(fd))
+                        if fd == stdout:
+                            out = output
+                        else:
+                            err = output
+
+        self.stdout.close()
+        self.stderr.close()
+        self.wait()
+        return out, err
+
+    def send_signal(self, signo):
+        """
+        Ask the fork server to signal the process. The fork server reaps the
+        process, so only the fork server knows that the pid was not reused.
+
+        Raises OSError if the fork server could not signal the process, and
+        Error if the fork server failed.
+        """
+        if self.returncode is None:
+            self._server.signal(self.pid, signo)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def _wait(self, block):
+        with self._lock:
+            if self.returncode is None:
+                flags = 0 if block else socket.MSG_DONTWAIT
+                try:
+                    data = _retry(self._channel.recv, _MAX_MESSAGE, flags)
+                except socket.error as e:
+                    if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        return None
+                    raise
+                if not data:
+                    raise Error("Fork server terminated before process %d"
+                                % self.pid)
+                status = pickle.loads(data)["status"]
+                if os.WIFSIGNALED(status):
+                    self.returncode = -os.WTERMSIG(status)
+                else:
+                    self.returncode = os.WEXITSTATUS(status)
+                self._channel.close()
+            return self.returncode
+
+    def __repr__(self):
+        return "<Process pid=%d returncode=%s at 0x%x>" % (
+            self.pid, self.returncode, id(self))
+
+
+# vdsm side
+
+class _Server(object):
+
+    def __init__(self):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            _set_cloexec(ours.fileno())
+            # The server gets the control socket as stdin; using subprocess
+            # since this runs only once, before starting threads.
+            import subprocess
+            self._proc = subprocess.Popen(
+                [sys.executable, "-m", "vdsm.forkserver"],
+                stdin=theirs.fileno(), close_fds=True)
+        finally:
+            theirs.close()
+        self._control = ours
+
+    def spawn(self, request):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            try:
+                _send_fd(self._control, theirs.fileno())
+            finally:
+                theirs.close()
+            ours.sendall(pickle.dumps(request, _PICKLE_PROTOCOL))
+            data = _retry(ours.recv, _MAX_MESSAGE)
+            if not data:
+                raise Error("Fork server terminated")
+            reply = pickle.loads(data)
+            if "error" not in reply:
+                fds = [_recv_fd(ours) for _ in range(3)]
+        except socket.error as e:
+            ours.close()
+            raise Error("Error communicating with fork server: %s" % e)
+        except Exception:
+            log.exception("Error spawning %s", request["argv"])
+            ours.close()
+            raise
+        if "error" in reply:
+            ours.close()
+            raise OSError(*reply["error"])
+        _set_cloexec(ours.fileno())
+        for fd in fds:
+            _set_cloexec(fd)
+        return Process(self, reply["pid"], ours, *fds)
+
+    def signal(self, pid, signo):
+        """
+        Send signo to child pid, unless it was reaped already. Every signal
+        request uses a new channel, so the reply is not mixed with the exit
+        status sent on the process channel.
+        """
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            try:
+                _send_fd(self._control, theirs.fileno())
+            finally:
+                theirs.close()
+            ours.sendall(pickle.dumps({"signal": signo, "pid": pid},
+                                      _PICKLE_PROTOCOL))
+            data = _retry(ours.recv, _MAX_MESSAGE)
+        except socket.error as e:
+            raise Error("Error communicating with fork server: %s" % e)
+        finally:
+            ours.close()
+        if not data:
+            raise Error("Fork server terminated")
+        reply = pickle.loads(data)
+        if "error" in reply:
+            raise OSError(*reply["error"])
+
+    def stop(self):
+        self._control.close()
+        self._proc.wait()
+
+
+# Fork server side
+
+class _ForkServer(object):
+
+    def __init__(self, control):
+        self._control = control
+        self._poller = select.poll()
+        self._channels = {}  # fd -> channel socket
+        self._children = {}  # pid -> channel socket or None
+        self._death_signals = {}  # pid -> death signal
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        for fd in (self._wakeup_r, self._wakeup_w):
+            _set_cloexec(fd)
+            fl = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+
+    def run(self):
+        # vdsm is terminated by SIGTERM and SIGINT; we terminate when vdsm
+        # closes the control socket.
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, lambda signo, frame: None)
+        signal.set_wakeup_fd(self._wakeup_w)
+        self._poller.register(self._control.fileno(), select.POLLIN)
+        self._poller.register(self._wakeup_r, select.POLLIN)
+
+        while self._control is not None:
+            for fd, event in _poll(self._poller):
+                if fd == self._control.fileno():
+                    if not self._accept():
+                        self._shutdown()
+                        break
+                elif fd == self._wakeup_r:
+                    self._reap()
+                else:
+                    self._handle(fd)
+
+        # Report the status of children terminated by their death signal.
+        deadline = _monotonic_time() + _SHUTDOWN_TIMEOUT
+        while self._death_signals:
+            remaining = deadline - _monotonic_time()
+            if remaining <= 0:
+                break
+            for fd, event in _poll(self._poller, remaining * 1000):
+                if fd == self._wakeup_r:
+                    self._reap()
+                elif fd in self._channels:
+                    self._handle(fd)
+
+    def _shutdown(self):
+        self._poller.unregister(self._control.fileno())
+        self._control.close()
+        self._control = None
+        # Drop pending requests, keeping channels of running children.
+        children = set(self._children.values())
+        for channel in list(self._channels.values()):
+            if channel not in children:
+                self._close(channel)
+        for pid, signo in list(self._death_signals.items()):
+            try:
+                os.kill(pid, signo)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _accept(self):
+        try:
+            fd = _recv_fd(self._control)
+        except (socket.error, OSError, IOError, EOFError, RuntimeError):
+            # vdsm closed the control socket
+            return False
+        _set_cloexec(fd)
+        channel = socket.fromfd(fd, socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        os.close(fd)
+        self._channels[channel.fileno()] = channel
+        self._poller.register(channel.fileno(), select.POLLIN)
+        return True
+
+    def _handle(self, fd):
+        channel = self._channels[fd]
+        try:
+            data = _retry(channel.recv, _MAX_MESSAGE)
+        except socket.error:
+            data = b""
+        if not data:
+            # vdsm dropped the process; we will reap the child silently.
+            self._drop(channel)
+            return
+        try:
+            message = pickle.loads(data)
+            if "signal" in message:
+                self._signal(channel, message["pid"], message["signal"])
+            else:
+                self._spawn(channel, message)
+        except socket.error:
+            self._drop(channel)
+        except Exception:
+            # A bad request must not terminate the server and its children.
+            log.exception("Error handling request")
+            self._drop(channel)
+
+    def _signal(self, channel, pid, signo):
+        # A pid is removed when the child is reaped, so it cannot be reused
+        # while it is in our children.
+        reply = {}
+        if pid in self._children:
+            try:
+                os.kill(pid, signo)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    reply = {"error": (e.errno, e.strerror)}
+        channel.sendall(pickle.dumps(reply, _PICKLE_PROTOCOL))
+        self._close(channel)
+
+    def _drop(self, channel):
+        self._close(channel)
+        for pid, ch in self._children.items():
+            if ch is channel:
+                self._children[pid] = None
+
+    def _spawn(self, channel, request):
+        pipes = []
+        try:
+            stdin_r, stdin_w = _pipe(pipes)
+            stdout_r, stdout_w = _pipe(pipes)
+            stderr_r, stderr_w = _pipe(pipes)
+            errpipe_r, errpipe_w = _pipe(pipes)
+            pid = os.fork()
+            if pid == 0:
+                _exec_child(request, stdin_r, stdout_w, stderr_w, errpipe_w)
+
+            self._children[pid] = channel
+            if request["death_signal"]:
+                self._death_signals[pid] = request["death_signal"]
+            os.close(errpipe_w)
+            pipes.remove(errpipe_w)
+            error = _read_all(errpipe_r)
+        except EnvironmentError as e:
+            channel.sendall(pickle.dumps({"error": (e.errno, e.strerror)},
+                                         _PICKLE_PROTOCOL))
+            return
+        else:
+            if error:
+                # exec failed, the child has exited.
+                channel.sendall(error)
+                self._children[pid] = None
+                return
+            channel.sendall(pickle.dumps({"pid": pid}, _PICKLE_PROTOCOL))
+            for fd in (stdin_w, stdout_r, stderr_r):
+                _send_fd(channel, fd)
+        finally:
+            for fd in pipes:
+                os.close(fd)
+
+    def _reap(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if pid == 0:
+                return
+            self._death_signals.pop(pid, None)
+            channel = self._children.pop(pid, None)
+            if channel is not None:
+                try:
+                    channel.sendall(pickle.dumps({"status": status},
+                                                 _PICKLE_PROTOCOL))
+                except socket.error:
+                    pass
+                self._close(channel)
+
+    def _close(self, channel):
+        fd = channel.fileno()
+        if self._channels.pop(fd, None) is not None:
+            self._poller.unregister(fd)
+            channel.close()
+
+
+def _exec_child(request, stdin, stdout, stderr, errpipe):
+    """
+    Called in the child of the fork server, never returns.
+    """
+    try:
+        os.dup2(stdin, 0)
+        os.dup2(stdout, 1)
+        os.dup2(stderr, 2)
+        # Other fds are close on exec.
+        for signo in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signo, signal.SIG_DFL)
+        if request["setsid"]:
+            os.setsid()
+        if request["death_signal"]:
+            _check(_libc.prctl(_PR_SET_PDEATHSIG, request["death_signal"]))
+            if os.getppid() == 1:
+                # The fork server terminated before prctl.
+                os._exit(1)
+        if request["cpus"] is not None:
+            _set_affinity(request["cpus"])
+        if request["ioclass"] is not None:
+            _set_ioclass(request["ioclass"], request["ioclassdata"])
+        if request["nice"]:
+            os.nice(request["nice"])
+        if request["cwd"] is not None:
+            os.chdir(request["cwd"])
+        argv = request["argv"]
+        if request["env"] is None:
+            os.execvp(argv[0], argv)
+        else:
+            os.execvpe(argv[0], argv, request["env"])
+    except EnvironmentError as e:
+        error = {"error": (e.errno, e.strerror)}
+    except BaseException as e:
+        error = {"error": (errno.EINVAL, str(e))}
+    try:
+        os.write(errpipe, pickle.dumps(error, _PICKLE_PROTOCOL))
+    finally:
+        os._exit(127)
+
+
+def _set_affinity(cpus):
+    bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask = (ctypes.c_ulong * (max(cpus) // bits + 1))()
+    for cpu in cpus:
+        mask[cpu // bits] |= 1 << (cpu % bits)
+    _check(_libc.sched_setaffinity(0, ctypes.sizeof(mask), mask))
+
+
+def _set_ioclass(ioclass, ioclassdata):
+    if ioclassdata is None:
+        ioclassdata = _IOPRIO_DEFAULT_DATA
+    prio = (ioclass << _IOPRIO_CLASS_SHIFT) | ioclassdata
+    _check(_libc.syscall(_SYS_IOPRIO_SET, _IOPRIO_WHO_PROCESS, 0, prio))
+
+
+def _check(rc):
+    if rc == -1:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+
+
+def _pipe(fds):
+    r, w = os.pipe()
+    fds.extend((r, w))
+    _set_cloexec(r)
+    _set_cloexec(w)
+    return r, w
+
+
+def _read_all(fd):
+    chunks = []
+    while True:
+        chunk = _retry(os.read, fd, _MAX_MESSAGE)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def _set_cloexec(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+    fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+
+def _poll(poller, timeout=None):
+    while True:
+        try:
+            return poller.poll(timeout)
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+
+def _monotonic_time():
+    return os.times()[4]
+
+
+def _retry(func, *args):
+    while True:
+        try:
+            return func(*args)
+        except EnvironmentError as e:
+            if e.errno != errno.EINTR:
+                raise
+
+
+if sys.version_info[0] == 2:
+    import _multiprocessing
+
+    def _send_fd(sock, fd):
+        _multiprocessing.sendfd(sock.fileno(), fd)
+
+    def _recv_fd(sock):
+        return _multiprocessing.recvfd(sock.fileno())
+else:
+    _FD = struct.Struct("i")
+
+    def _send_fd(sock, fd):
+        sock.sendmsg([b"\0"], [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                                _FD.pack(fd))])
+
+    def _recv_fd(sock):
+        msg, ancdata, flags, addr = sock.recvmsg(
+            1, socket.CMSG_LEN(_FD.size))
+        if not msg:
+            raise EOFError("Socket closed")
+        level, type, data = ancdata[0]
+        return _FD.unpack(data[:_FD.size])[0]
+
+
+def main():
+    control = socket.fromfd(0, socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    _set_cloexec(control.fileno())
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    logging.basicConfig(format="forkserver: %(levelname)s %(message)s")
+    _ForkServer(control).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -24,21 +24,32 @@ import logging
 import os
 import threading
 
+import six
+
 from . config import config
 from . import concurrent
 from . import cpuarch
+from . import executor
 from . import metrics
 from . import host
+from . import jsonrpcvdscli
+from . import schedule
+from .sslcompat import sslutils
 
 _monitor = None
 
 
-def start():
+def start(stats=None):
+    """
+    Start the health monitor if enabled. stats maps a name to a function
+    returning a dict of statistics of a component outside of this package,
+    reported as <prefix>.<name>.<key>.
+    """
     global _monitor
     assert _monitor is None
     if config.getboolean("devel", "health_monitor_enable"):
         interval = config.getint("devel", "health_check_interval")
-        _monitor = Monitor(interval)
+        _monitor = Monitor(interval, stats)
         _monitor.start()
 
 
@@ -53,8 +64,9 @@ class Monitor(object):
 
     log = logging.getLogger("health")
 
-    def __init__(self, interval):
+    def __init__(self, interval, stats=None):
         self._interval = interval
+        self._sources = stats or {}
         self._thread = concurrent.thread(self._run)
         self._done = threading.Event()
         self._last = ProcStat()
@@ -130,6 +142,25 @@ class Monitor(object):
         report[prefix + '.cpu.sys_pct'] = self._stats['stime_pct']
         report[prefix + '.memory.rss'] = self._stats['rss']
         report[prefix + '.threads_count'] = self._stats['threads']
+        for name, stats in six.iteritems(executor.stats()):
+            for key, value in six.iteritems(stats):
+                report[prefix + '.executor.' + name + '.' + key] = value
+        for key, value in six.iteritems(sslutils.stats()):
+            report[prefix + '.ssl.' + key] = value
+        for peer, stats in six.iteritems(jsonrpcvdscli.pool_stats()):
+            # Dots in the address would split the metric name.
+            peer = peer.replace('.', '_')
+            for key, value in six.iteritems(stats):
+                report[prefix + '.jsonrpc.' + peer + '.' + key] = value
+        for name, sites in six.iteritems(schedule.lateness()):
+            for site, (count, avg, maximum) in six.iteritems(sites):
+                key = prefix + '.scheduler.' + name + '.' + site
+                report[key + '.count'] = count
+                report[key + '.avg_lateness'] = avg
+                report[key + '.max_lateness'] = maximum
+        for name, func in six.iteritems(self._sources):
+            for key, value in six.iteritems(func()):
+                report[prefix + '.' + name + '.' + key] = value
         metrics.send(report)
 
 
@@ -20,8 +20,11 @@
 from __future__ import absolute_import
 
 import collections
+import copy
 import functools
+import logging
 import os
+import threading
 import xml.etree.ElementTree as etree
 
 import libvirt
@@ -52,8 +55,19 @@ _LIBVIRT_DEVICE_FLAGS = {
     'scsi_generic': libvirt.VIR_CONNECT_LIST_NODE_DEVICES_CAP_SCSI_GENERIC,
 }
 
+# Node device events are available since libvirt 2.2. These are None when
+# the libvirt python bindings do not support them.
+_NODE_DEVICE_LIFECYCLE_EVENT = getattr(
+    libvirt, 'VIR_NODE_DEVICE_EVENT_ID_LIFECYCLE', None)
+_NODE_DEVICE_UPDATE_EVENT = getattr(
+    libvirt, 'VIR_NODE_DEVICE_EVENT_ID_UPDATE', None)
+
 _DATA_PROCESSORS = collections.defaultdict(list)
 
+_cache_lock = threading.Lock()
+_cache = None
+_cache_supported = True
+
 
 class PCIHeaderType:
     ENDPOINT = 0
@@ -307,8 +321,7 @@ def _process_numa(device_xml):
     return {}
 
 
-@_data_processor('scsi')
-def _process_scsi_device_params(device_xml):
+def _process_scsi_device_params(scsi_name, devices):
     """
     The information we need about SCSI device is contained within multiple
     sysfs devices:
@@ -322,35 +335,27 @@ def _process_scsi_device_params(device_xml):
     the devices are not found as the information provided is purely cosmetic.
     If the device is queried in hostdev object creation flow, vendor and
     product are still unnecessary, but udev_path becomes essential.
-    """
-    def is_parent(device, parent_name):
-        try:
-            return parent_name == device['params']['parent']
-        except KeyError:
-            return False
-
-    def find_device_by_parent(device_cap, parent_name):
-        for device in list_by_caps(device_cap).values():
-            if is_parent(device, parent_name):
-                return device
 
+    devices -- iterable of params of the devices that may be children of the
+               SCSI device.
+    """
     params = {}
 
-    scsi_name = device_xml.find('name').text
-    storage_dev_params = find_device_by_parent(['storage'], scsi_name)
-    if storage_dev_params:
-        for attr in ('vendor', 'product'):
-            try:
-                res = storage_dev_params['params'][attr]
-            except KeyError:
-                pass
-            else:
-                params[attr] = res
-
-    scsi_generic_dev_params = find_device_by_parent(['scsi_generic'],
-                                                    scsi_name)
-    if scsi_generic_dev_params:
-        params['udev_path'] = scsi_generic_dev_params['params']['udev_path']
+    storage_found = scsi_generic_found = False
+    for device_params in devices:
+        if device_params.get('parent') != scsi_name:
+            continue
+        capability = device_params['capability']
+        if capability == 'storage' and not storage_found:
+            storage_found = True
+            for attr in ('vendor', 'product'):
+                try:
+                    params[attr] = device_params[attr]
+                except KeyError:
+                    pass
+        elif capability == 'scsi_generic' and not scsi_generic_found:
+            scsi_generic_found = True
+            params['udev_path'] = device_params['udev_path']
 
     return params
 
@@ -379,17 +384,214 @@ def _process_device_params(device_xml):
 def _get_device_ref_and_params(device_name):
     libvirt_device = libvirtconnection.get().\
         nodeDeviceLookupByName(device_name)
-    return libvirt_device, _process_device_params(libvirt_device.XMLDesc(0))
+    params = _process_device_params(libvirt_device.XMLDesc(0))
+    if params['capability'] == 'scsi':
+        children = _list_devices(
+            _LIBVIRT_DEVICE_FLAGS['storage'] |
+            _LIBVIRT_DEVICE_FLAGS['scsi_generic'])
+        params.update(
+            _process_scsi_device_params(device_name, children.values()))
+    return libvirt_device, params
 
 
-def _get_devices_from_libvirt(flags=0):
+def _lookup_device_params(device_name):
     """
-    Returns all available host devices from libvirt processd to dict
+    Return the params of device_name, not including the params of its
+    children, or None if libvirt does not know the device.
     """
+    try:
+        libvirt_device = libvirtconnection.get().\
+            nodeDeviceLookupByName(device_name)
+        return _process_device_params(libvirt_device.XMLDesc(0))
+    except libvirt.libvirtError as e:
+        if e.get_error_code() != libvirt.VIR_ERR_NO_NODE_DEVICE:
+            raise
+        return None
+
+
+def _list_devices(flags=0):
     return dict((device.name(), _process_device_params(device.XMLDesc(0)))
                 for device in libvirtconnection.get().listAllDevices(flags))
 
 
+def _get_devices_from_libvirt(flags=0):
+    """
+    Returns all available host devices from libvirt processd to dict
+    """
+    devices = _list_devices(flags)
+
+    scsi_names = [name for name, params in devices.items()
+                  if params['capability'] == 'scsi']
+    if scsi_names:
+        if flags:
+            children = _list_devices(
+                _LIBVIRT_DEVICE_FLAGS['storage'] |
+                _LIBVIRT_DEVICE_FLAGS['scsi_generic'])
+        else:
+            children = devices
+        for name in scsi_names:
+            devices[name].update(
+                _process_scsi_device_params(name, children.values()))
+
+    return devices
+
+
+class _DeviceCache(object):
+    """
+    Params of all host devices, indexed by capability and by parent.
+
+    The devices are loaded once. Afterwards, only the devices reported by
+    libvirt node device events are reloaded, on the next access. libvirt
+    node device driver follows udev, so the events cover devices added,
+    removed or changed on the host.
+
+    invalidate() is called from the libvirt events thread, and must not wait
+    for a reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stale_lock = threading.Lock()
+        self._devices = {}
+        self._by_caps = collections.defaultdict(set)
+        self._children = collections.defaultdict(set)
+        # None means that all the devices must be loaded.
+        self._stale = None
+
+    def invalidate(self, device_name=None):
+        """
+        Reload device_name on the next access, or all the devices if
+        device_name is None.
+        """
+        with self._stale_lock:
+            if device_name is None:
+                self._stale = None
+            elif self._stale is not None:
+                self._stale.add(device_name)
+
+    def list_by_caps(self, caps=None):
+        with self._lock:
+            self._refresh()
+            if caps:
+                names = set()
+                for cap in caps:
+                    names.update(self._by_caps[cap])
+            else:
+                names = self._devices
+            return dict((name, copy.deepcopy(self._devices[name]))
+                        for name in names)
+
+    def get(self, device_name):
+        """
+        Return the params of device_name, or None if it is unknown.
+        """
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._devices.get(device_name))
+
+    def _refresh(self):
+        with self._stale_lock:
+            stale, self._stale = self._stale, set()
+
+        if stale is None:
+            self._load()
+            return
+
+        parents = set()
+        for name in stale:
+            for params in (self._remove(name), self._reload(name)):
+                if params is not None:
+                    parents.add(params.get('parent'))
+
+        # SCSI devices report the params of their storage and scsi_generic
+        # children, so they are stale when their children are.
+        for name in (stale | parents) & self._by_caps['scsi']:
+            if name not in stale:
+                self._remove(name)
+                self._reload(name)
+            self._add_scsi_params(name)
+
+    def _load(self):
+        self._devices = {}
+        self._by_caps.clear()
+        self._children.clear()
+        for name, params in _list_devices().items():
+            self._add(name, params)
+        for name in self._by_caps['scsi']:
+            self._add_scsi_params(name)
+
+    def _reload(self, name):
+        params = _lookup_device_params(name)
+        if params is not None:
+            self._add(name, params)
+        return params
+
+    def _add(self, name, params):
+        self._devices[name] = params
+        self._by_caps[params['capability']].add(name)
+        if 'parent' in params:
+            self._children[params['parent']].add(name)
+
+    def _remove(self, name):
+        params = self._devices.pop(name, None)
+        if params is not None:
+            self._by_caps[params['capability']].discard(name)
+            if 'parent' in params:
+                self._children[params['parent']].discard(name)
+        return params
+
+    def _add_scsi_params(self, name):
+        children = [self._devices[child] for child in self._children[name]]
+        self._devices[name].update(
+            _process_scsi_device_params(name, children))
+
+
+def _on_device_lifecycle(conn, device, event, detail, cache):
+    cache.invalidate(device.name())
+
+
+def _on_device_update(conn, device, cache):
+    cache.invalidate(device.name())
+
+
+def _device_cache():
+    """
+    Return the device cache, or None if libvirt cannot report the node device
+    events keeping it current.
+    """
+    global _cache, _cache_supported
+    with _cache_lock:
+        if _cache is None:
+            if (not _cache_supported or
+                    _NODE_DEVICE_LIFECYCLE_EVENT is None or
+                    _NODE_DEVICE_UPDATE_EVENT is None or
+                    not libvirtconnection.event_loop_running()):
+                return None
+            cache = _DeviceCache()
+            conn = libvirtconnection.get()
+            try:
+                conn.nodeDeviceEventRegisterAny(
+                    None, _NODE_DEVICE_LIFECYCLE_EVENT, _on_device_lifecycle,
+                    cache)
+                conn.nodeDeviceEventRegisterAny(
+                    None, _NODE_DEVICE_UPDATE_EVENT, _on_device_update, cache)
+            except libvirt.libvirtError:
+                logging.warning('Cannot register node device events, '
+                                'host devices will not be cached',
+                                exc_info=True)
+                _cache_supported = False
+                return None
+            _cache = cache
+        return _cache
+
+
+def _invalidate(device_name=None):
+    with _cache_lock:
+        cache = _cache
+    if cache is not None:
+        cache.invalidate(device_name)
+
+
 def list_by_caps(caps=None):
     """
     Returns devices that have specified capability in format
@@ -402,8 +604,12 @@ def list_by_caps(caps=None):
             will be returned (e.g. ['pci', 'usb'] -> pci and usb devices)
     """
     devices = {}
-    flags = sum([_LIBVIRT_DEVICE_FLAGS[cap] for cap in caps or []])
-    libvirt_devices = _get_devices_from_libvirt(flags)
+    cache = _device_cache()
+    if cache is None:
+        flags = sum([_LIBVIRT_DEVICE_FLAGS[cap] for cap in caps or []])
+        libvirt_devices = _get_devices_from_libvirt(flags)
+    else:
+        libvirt_devices = cache.list_by_caps(caps)
 
     for devName, params in libvirt_devices.items():
         devices[devName] = {'params': params}
@@ -413,6 +619,11 @@ def list_by_caps(caps=None):
 
 
 def get_device_params(device_name):
+    cache = _device_cache()
+    if cache is not None:
+        device_params = cache.get(device_name)
+        if device_params is not None:
+            return device_params
     _, device_params = _get_device_ref_and_params(device_name)
     return device_params
 
@@ -439,6 +650,7 @@ def detach_detachable(device_name):
         supervdsm.getProxy().appropriateSCSIDevice(device_name,
                                                    device_params['udev_path'])
 
+    _invalidate(device_name)
     return device_params
 
 
@@ -459,8 +671,12 @@ def reattach_detachable(device_name):
         supervdsm.getProxy().rmAppropriateSCSIDevice(
             device_name, device_params['udev_path'])
 
+    _invalidate(device_name)
+
 
 def change_numvfs(device_name, numvfs):
     net_name = physical_function_net_name(device_name)
     supervdsm.getProxy().change_numvfs(name_to_pci_path(device_name), numvfs,
                                        net_name)
+    # The virtual functions and their network devices were replaced.
+    _invalidate()
@@ -22,6 +22,8 @@ from __future__ import absolute_import
 
 from functools import partial
 from uuid import uuid4
+import logging
+import threading
 
 import six
 from yajsonrpc import stompreactor
@@ -34,6 +36,10 @@ from api import vdsmapi
 from vdsm.common import response
 from .config import config
 from . import sslutils
+from . import utils
+
+# Pooled connections without users are closed after this many seconds.
+_IDLE_TIMEOUT = 300
 
 
 _COMMAND_CONVERTER = {
@@ -232,6 +238,182 @@ def _create(requestQueue,
         lazy_start=False)
 
 
+class _PooledClient(object):
+    """
+    A JSON-RPC connection shared by all the users of a peer. Responses are
+    matched to requests by request id, so concurrent users can send requests
+    over the same connection.
+
+    A connection is replaced only when its transport fails. A call without
+    a response does not replace it, since other users may be waiting for
+    responses on the same connection. Calls are not retried, since they may
+    have reached the peer.
+    """
+
+    log = logging.getLogger('jsonrpc.PooledClient')
+
+    def __init__(self, peer, create):
+        self.peer = peer
+        self._create = create
+        self._lock = threading.Lock()
+        self._client = None
+        self._last_used = utils.monotonic_time()
+        self.users = 0
+        self._connects = 0
+        self._calls = 0
+        self._errors = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    @property
+    def idle_time(self):
+        return utils.monotonic_time() - self._last_used
+
+    def call(self, req, timeout=CALL_TIMEOUT):
+        client = self._connected_client()
+        start = utils.monotonic_time()
+        try:
+            responses = client.call(req, timeout=timeout)
+        except EnvironmentError:
+            with self._lock:
+                self._calls += 1
+                self._errors += 1
+            self.log.warning('Error sending request to %s, reconnecting',
+                             self.peer)
+            self._drop(client)
+            raise
+        end = utils.monotonic_time()
+        with self._lock:
+            self._last_used = end
+            self._calls += 1
+            if responses:
+                elapsed = end - start
+                self._total_time += elapsed
+                self._max_time = max(self._max_time, elapsed)
+            else:
+                self._errors += 1
+        if not responses and client.is_closed():
+            self.log.warning('Connection to %s was closed, reconnecting',
+                             self.peer)
+            self._drop(client)
+        return responses
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def stats(self):
+        with self._lock:
+            answered = self._calls - self._errors
+            return {
+                'users': self.users,
+                'connects': self._connects,
+                'calls': self._calls,
+                'errors': self._errors,
+                'avg_time': self._total_time / answered if answered else 0.0,
+                'max_time': self._max_time,
+            }
+
+    def _connected_client(self):
+        with self._lock:
+            client = self._client
+        if client is not None and client.is_closed():
+            self.log.info('Connection to %s was closed', self.peer)
+            self._drop(client)
+        with self._lock:
+            if self._client is None:
+                self.log.debug('Connecting to %s', self.peer)
+                self._client = self._create()
+                self._connects += 1
+                self._last_used = utils.monotonic_time()
+            return self._client
+
+    def _drop(self, client):
+        with self._lock:
+            if self._client is client:
+                self._client = None
+        client.close()
+
+
+class _ClientPool(object):
+    """
+    JSON-RPC connections shared by all the users in this process, keyed by
+    peer address, transport security and request queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+
+    def get(self, key, peer, create):
+        with self._lock:
+            idle = self._remove_idle()
+            pooled = self._clients.get(key)
+            if pooled is None:
+                pooled = _PooledClient(peer, create)
+                self._clients[key] = pooled
+            pooled.users += 1
+        for client in idle:
+            client.close()
+        return _Lease(self, pooled)
+
+    def release(self, pooled):
+        with self._lock:
+            pooled.users -= 1
+
+    def stats(self):
+        with self._lock:
+            clients = list(self._clients.values())
+        return {pooled.peer: pooled.stats() for pooled in clients}
+
+    def clear(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for pooled in clients:
+            pooled.close()
+
+    def _remove_idle(self):
+        idle = []
+        for key, pooled in list(self._clients.items()):
+            if pooled.users == 0 and pooled.idle_time > _IDLE_TIMEOUT:
+                idle.append(self._clients.pop(key))
+        return idle
+
+
+class _Lease(object):
+    """
+    A user of a pooled client. Closing the lease returns the client to the
+    pool, leaving the connection open for other users.
+    """
+
+    def __init__(self, pool, pooled):
+        self._pool = pool
+        self._pooled = pooled
+        self._closed = False
+
+    def call(self, req, timeout=CALL_TIMEOUT):
+        return self._pooled.call(req, timeout=timeout)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.release(self._pooled)
+
+
+_pool = _ClientPool()
+
+
+def pool_stats():
+    """
+    Return the usage and latency statistics of the pooled connections, keyed
+    by "host:port".
+    """
+    return _pool.stats()
+
+
 def connect(requestQueue=None, stompClient=None,
             host=None, port=None,
             useSSL=None,
@@ -252,3 +434,35 @@ def connect(requestQueue=None, stompClient=None,
         )
 
     return _Server(client, xml_compat)
+
+
+def connect_pooled(host, port, useSSL=None, requestQueue=None,
+                   stompClientFactory=None, xml_compat=True):
+    """
+    Return a server proxy sharing a connection with all the other pooled
+    proxies of the same peer. The connection is opened on the first call, and
+    kept open for a while after the last proxy was closed.
+
+    stompClientFactory is a callable returning a connected StompClient. If it
+    is not specified, a standalone client with its own reactor is created.
+    """
+    if not requestQueue:
+        request_queues = config.get("addresses", "request_queues")
+        requestQueue = request_queues.split(",")[0]
+
+    if useSSL is None:
+        useSSL = config.getboolean('vars', 'ssl')
+
+    if stompClientFactory is None:
+        create = partial(_create, requestQueue, host, port, useSSL)
+    else:
+        def create():
+            return stompreactor.StompRpcClient(
+                stompClientFactory(),
+                requestQueue,
+                str(uuid4())
+            )
+
+    key = (host, port, useSSL, requestQueue)
+    client = _pool.get(key, '%s:%s' % (host, port), create)
+    return _Server(client, xml_compat)
@@ -34,6 +34,11 @@ from .tool.configurators import passwd
 
 log = logging.getLogger()
 
+# Block threshold events are available since libvirt 3.2. This is None when
+# the libvirt python bindings do not support them.
+BLOCK_THRESHOLD_EVENT = getattr(
+    libvirt, 'VIR_DOMAIN_EVENT_ID_BLOCK_THRESHOLD', None)
+
 
 class _EventLoop:
     def __init__(self):
@@ -75,6 +80,10 @@ def stop_event_loop(wait=True):
     __event_loop.stop(wait)
 
 
+def event_loop_running():
+    return __event_loop.run
+
+
 __connections = {}
 __connectionLock = threading.Lock()
 
@@ -170,13 +179,16 @@ def get(target=None, killOnFailure=True):
                     setattr(conn, name,
                             wrapMethod(utils.weakmethod(method)))
             if target is not None:
-                for ev in (libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
-                           libvirt.VIR_DOMAIN_EVENT_ID_REBOOT,
-                           libvirt.VIR_DOMAIN_EVENT_ID_RTC_CHANGE,
-                           libvirt.VIR_DOMAIN_EVENT_ID_IO_ERROR_REASON,
-                           libvirt.VIR_DOMAIN_EVENT_ID_GRAPHICS,
-                           libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_JOB,
-                           libvirt.VIR_DOMAIN_EVENT_ID_WATCHDOG):
+                events = [libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+                          libvirt.VIR_DOMAIN_EVENT_ID_REBOOT,
+                          libvirt.VIR_DOMAIN_EVENT_ID_RTC_CHANGE,
+                          libvirt.VIR_DOMAIN_EVENT_ID_IO_ERROR_REASON,
+                          libvirt.VIR_DOMAIN_EVENT_ID_GRAPHICS,
+                          libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_JOB,
+                          libvirt.VIR_DOMAIN_EVENT_ID_WATCHDOG]
+                if BLOCK_THRESHOLD_EVENT is not None:
+                    events.append(BLOCK_THRESHOLD_EVENT)
+                for ev in events:
                     conn.domainEventRegisterAny(None,
                                                 ev,
                                                 target.dispatchLibvirtEvents,
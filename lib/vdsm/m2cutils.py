@@ -37,6 +37,15 @@ from M2Crypto.SSL import SSLError
 DEFAULT_ACCEPT_TIMEOUT = 5
 SOCKET_DEFAULT_TIMEOUT = socket._GLOBAL_DEFAULT_TIMEOUT
 
+# OpenSSL options disabling protocols older than TLS 1.2, not exported by
+# all M2Crypto versions.
+_NO_LEGACY_PROTOCOLS = (
+    0x01000000 |  # SSL_OP_NO_SSLv2
+    0x02000000 |  # SSL_OP_NO_SSLv3
+    0x04000000 |  # SSL_OP_NO_TLSv1
+    0x10000000    # SSL_OP_NO_TLSv1_1
+)
+
 # M2Crypto.threading needs initialization.
 # See https://bugzilla.redhat.com/482420
 threading.init()
@@ -147,12 +156,13 @@ class SSLServerSocket(SSLSocket):
 
 class SSLContext(object):
     def __init__(self, cert_file, key_file, ca_cert=None, session_id="SSL",
-                 protocol="tlsv1"):
+                 protocol="tlsv1", options=0):
         self.cert_file = cert_file
         self.key_file = key_file
         self.ca_certs = ca_cert
         self.session_id = session_id
         self.protocol = protocol
+        self.options = options
         self._initContext()
 
     def _loadCertChain(self):
@@ -176,6 +186,8 @@ class SSLContext(object):
 
     def _initContext(self):
         self.context = context = SSL.Context(self.protocol)
+        if self.options:
+            context.set_options(self.options)
         if config.getboolean('devel', 'm2c_debug_enable'):
             self.context.set_info_callback()
         context.set_session_id_ctx(self.session_id)
@@ -308,8 +320,21 @@ class SSLHandshakeDispatcher(object):
 def create_ssl_context():
     if config.getboolean('vars', 'ssl'):
         protocol = config.get('vars', 'ssl_protocol')
+        options = 0
+        if protocol == 'tls':
+            # TLS 1.2 or later, negotiated by the sslv23 method.
+            protocol = 'sslv23'
+            options = _NO_LEGACY_PROTOCOLS
         sslctx = SSLContext(constants.CERT_FILE, constants.KEY_FILE,
-                            ca_cert=constants.CA_FILE, protocol=protocol)
+                            ca_cert=constants.CA_FILE, protocol=protocol,
+                            options=options)
         return sslctx
     else:
         return None
+
+
+def stats():
+    """
+    M2Crypto does not report handshake counters.
+    """
+    return {}
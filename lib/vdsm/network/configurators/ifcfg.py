@@ -18,6 +18,7 @@
 #
 from __future__ import absolute_import
 
+from collections import OrderedDict
 from contextlib import contextmanager
 import copy
 import errno
@@ -26,12 +27,14 @@ import logging
 import os
 import pipes
 import pwd
-import re
 import selinux
+import shlex
 import shutil
+import threading
 import uuid
 
 import six
+from six.moves import queue
 
 from libvirt import libvirtError, VIR_ERR_NO_NETWORK
 
@@ -802,7 +805,7 @@ class ConfigWriter(object):
 
 
 def stop_devices(device_ifcfgs):
-    for dev in reversed(_sort_device_ifcfgs(device_ifcfgs)):
+    def stop(dev):
         ifdown(dev)
         if os.path.exists('/sys/class/net/%s/bridge' % dev):
             # ifdown is not enough to remove nicless bridges
@@ -812,9 +815,13 @@ def stop_devices(device_ifcfgs):
                 with open(netinfo_bonding.BONDING_MASTERS, 'w') as f:
                     f.write("-%s\n" % dev)
 
+    devices = _read_device_ifcfgs(device_ifcfgs)
+    _run_ordered(stop, _dependencies(devices, reverse=True), 'ifdown',
+                 list(reversed(_serial_order(devices))))
+
 
 def start_devices(device_ifcfgs):
-    for dev in _sort_device_ifcfgs(device_ifcfgs):
+    def start(dev):
         try:
             # this is an ugly way to check if this is a bond but picking into
             # the ifcfg files is even worse.
@@ -822,11 +829,19 @@ def start_devices(device_ifcfgs):
                 if not _is_running_bond(dev):
                     with open(netinfo_bonding.BONDING_MASTERS, 'w') as masters:
                         masters.write('+%s\n' % dev)
-            _exec_ifup_by_name(dev)
+            # Only dhclient has to outlive vdsm, other devices do not need a
+            # systemd scope.
+            cgroup = dhclient.DHCLIENT_CGROUP if _is_dhcp(devices[dev]) \
+                else None
+            _exec_ifup_by_name(dev, cgroup=cgroup)
         except ConfigNetworkError:
             logging.error('Failed to ifup device %s during rollback.', dev,
                           exc_info=True)
 
+    devices = _read_device_ifcfgs(device_ifcfgs)
+    _run_ordered(start, _dependencies(devices), 'ifup',
+                 _serial_order(devices))
+
 
 def _is_bond_name(dev):
     return dev.startswith('bond') and '.' not in dev
@@ -838,11 +853,17 @@ def _is_running_bond(bond):
     return bond in names
 
 
-def _sort_device_ifcfgs(device_ifcfgs):
-    devices = {'Bridge': [],
-               'Vlan': [],
-               'Slave': [],
-               'Other': []}
+def _is_dhcp(conf):
+    return conf.get('BOOTPROTO') == 'dhcp' or conf.get('DHCPV6C') == 'yes'
+
+
+def _read_device_ifcfgs(device_ifcfgs):
+    """
+    Return an OrderedDict mapping device names to the values of their ifcfg
+    files, reading each file once. Missing files are skipped, and so are bond
+    slaves, which are brought up and down with their bond.
+    """
+    devices = OrderedDict()
     for conf_file in device_ifcfgs:
         if not conf_file.startswith(NET_CONF_PREF):
             continue
@@ -854,22 +875,157 @@ def _sort_device_ifcfgs(device_ifcfgs):
                 continue
             else:
                 raise
-        dev = conf_file[len(NET_CONF_PREF):]
+        conf = _parse_ifcfg(content)
+        if conf.get('SLAVE') == 'yes':
+            continue
+        devices[conf_file[len(NET_CONF_PREF):]] = conf
+    return devices
 
-        devices[_dev_type(content)].append(dev)
 
-    return devices['Other'] + devices['Vlan'] + devices['Bridge']
+def _parse_ifcfg(content):
+    conf = {}
+    try:
+        words = shlex.split(content, comments=True)
+    except ValueError:
+        # Not an ifcfg file we can read, handle it as a plain device.
+        return conf
+    for word in words:
+        if '=' in word:
+            key, value = word.split('=', 1)
+            conf[key] = value
+    return conf
+
+
+def _dependencies(devices, reverse=False):
+    """
+    Return a dict mapping every device to the devices that must be brought up
+    before it: a vlan after its base device, and a bridge after its ports.
+    If reverse is set, return the order for bringing the devices down.
+    """
+    deps = {dev: set() for dev in devices}
+    for dev, conf in six.iteritems(devices):
+        if conf.get('VLAN') == 'yes':
+            base = conf.get('PHYSDEV', dev.rsplit('.', 1)[0])
+            if base in deps and base != dev:
+                deps[dev].add(base)
+        bridge = conf.get('BRIDGE')
+        if bridge in deps and bridge != dev:
+            deps[bridge].add(dev)
+
+    if not reverse:
+        return deps
+    reversed_deps = {dev: set() for dev in devices}
+    for dev, before in six.iteritems(deps):
+        for other in before:
+            reversed_deps[other].add(dev)
+    return reversed_deps
+
+
+def _serial_order(devices):
+    """
+    Return the devices in the order used for bringing them up one by one:
+    bridges after vlans, and vlans after all other devices.
+    """
+    def rank(dev):
+        conf = devices[dev]
+        if conf.get('TYPE') == 'Bridge':
+            return 2
+        elif conf.get('VLAN') == 'yes':
+            return 1
+        return 0
+
+    return sorted(devices, key=rank)
+
+
+def _is_acyclic(pending, dependents):
+    counts = {dev: len(deps) for dev, deps in six.iteritems(pending)}
+    ready = [dev for dev, count in six.iteritems(counts) if count == 0]
+    handled = 0
+    while ready:
+        dev = ready.pop()
+        handled += 1
+        for other in dependents[dev]:
+            counts[other] -= 1
+            if counts[other] == 0:
+                ready.append(other)
+    return handled == len(counts)
+
+
+def _run_ordered(func, dependencies, action, serial_order):
+    """
+    Run func(dev) for all devices, running at most net_device_workers devices
+    concurrently, and starting every device after its dependencies. Devices
+    are handled even if a dependency failed. The first unexpected error is
+    raised after all devices were handled.
 
+    If the dependencies have a cycle, the devices are handled one by one in
+    serial_order.
+    """
+    if not dependencies:
+        return
+    pending = {dev: set(deps) for dev, deps in six.iteritems(dependencies)}
+    dependents = {dev: [] for dev in pending}
+    for dev, deps in six.iteritems(pending):
+        for dep in deps:
+            dependents[dep].append(dev)
+
+    errors = []
+
+    def run(dev):
+        start = utils.monotonic_time()
+        try:
+            func(dev)
+        except Exception as e:
+            logging.exception('Failed to %s device %s', action, dev)
+            errors.append(e)
+        logging.debug('%s %s took %.2f seconds', action, dev,
+                      utils.monotonic_time() - start)
+
+    if not _is_acyclic(pending, dependents):
+        logging.warning('Devices dependencies have a cycle, running %s on '
+                        'devices one by one: %s', action, dependencies)
+        for dev in serial_order:
+            run(dev)
+        if errors:
+            raise errors[0]
+        return
+
+    workers = min(config.getint('vars', 'net_device_workers'), len(pending))
+    ready = queue.Queue()
+    lock = threading.Lock()
+    remaining = [len(pending)]
+
+    for dev, deps in six.iteritems(pending):
+        if not deps:
+            ready.put(dev)
+
+    def worker():
+        for dev in iter(ready.get, None):
+            try:
+                run(dev)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    for other in dependents[dev]:
+                        pending[other].discard(dev)
+                        if not pending[other]:
+                            ready.put(other)
+                    if remaining[0] == 0:
+                        for i in range(workers):
+                            ready.put(None)
+
+    start = utils.monotonic_time()
+    threads = [concurrent.thread(worker, name='%s/%d' % (action, i))
+               for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logging.info('%s of %d devices took %.2f seconds', action,
+                 len(dependencies), utils.monotonic_time() - start)
 
-def _dev_type(content):
-    if re.search('^TYPE=Bridge$', content, re.MULTILINE):
-        return "Bridge"
-    elif re.search('^VLAN=yes$', content, re.MULTILINE):
-        return "Vlan"
-    elif re.search('^SLAVE=yes$', content, re.MULTILINE):
-        return "Slave"
-    else:
-        return "Other"
+    if errors:
+        raise errors[0]
 
 
 def ifup(iface):
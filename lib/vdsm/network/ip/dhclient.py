@@ -110,7 +110,24 @@ def is_active(device_name, family):
     return False
 
 
+def dhcp_status():
+    """
+    Return a mapping of (device_name, family) to the (pid, pid_file) of the
+    dhclient serving it. Unlike is_active(), the whole mapping is built with
+    a single pass over /proc, so it should be preferred when the status of
+    many devices is needed.
+    """
+    return dict(((device_name, family), (pid, pid_file))
+                for pid, device_name, family, pid_file in _dhclients())
+
+
 def _pid_lookup(device_name, family):
+    for pid, running_device, running_family, pid_file in _dhclients():
+        if running_device == device_name and running_family == family:
+            yield pid, pid_file
+
+
+def _dhclients():
     for pid in pgrep('dhclient'):
         try:
             with open('/proc/%s/cmdline' % pid) as cmdline:
@@ -118,8 +135,7 @@ def _pid_lookup(device_name, family):
         except IOError as ioe:
             if ioe.errno == errno.ENOENT:  # exited before we read cmdline
                 continue
-        if args[-1] != device_name:  # dhclient of another device
-            continue
+            raise
         tokens = iter(args)
         pid_file = '/var/run/dhclient.pid'  # Default client pid location
         running_family = 4
@@ -131,10 +147,7 @@ def _pid_lookup(device_name, family):
             elif token == '-6':
                 running_family = 6
 
-        if running_family != family:
-            continue
-
-        yield pid, pid_file
+        yield pid, args[-1], running_family, pid_file
 
 
 @memoized
@@ -266,18 +266,19 @@ def _bondExists(bondName):
     return os.path.exists('/sys/class/net/%s/bonding' % bondName)
 
 
-def getLinks():
-    """Return an iterator of Link objects, each per a link in the system."""
-    for data in link.iter_links():
+def getLinks(stats=False):
+    """Return an iterator of Link objects, each per a link in the system. If
+    stats is set, each Link has a stats attribute with its counters."""
+    for data in link.iter_links(stats=stats):
         try:
             yield Link.fromDict(data)
         except IOError:  # If a link goes missing we just don't report it
             continue
 
 
-def getLink(dev):
+def getLink(dev, stats=False):
     """Returns the Link object for the specified dev."""
-    return Link.fromDict(link.get_link(dev))
+    return Link.fromDict(link.get_link(dev, stats=stats))
 
 
 @equals
@@ -41,7 +41,8 @@ from .dns import get_host_nameservers
 from .mtus import getMtu
 from . import nics
 from . import vlans
-from .routes import get_routes, get_gateway, is_default_route
+from .routes import (get_routes, get_gateway, getDefaultGateway,
+                     is_default_gateway)
 from .qos import report_network_qos
 
 
@@ -62,13 +63,12 @@ def _get(vdsmnets=None):
     networking = {'bondings': {}, 'bridges': {}, 'networks': {}, 'nics': {},
                   'vlans': {}, 'nameservers': get_host_nameservers()}
     paddr = bonding.permanent_address()
-    ipaddrs = getIpAddrs()
-    routes = get_routes()
+    collector = _Collector()
 
     if vdsmnets is None:
         libvirt_nets = libvirt.networks()
-        networking['networks'] = libvirtNets2vdsm(libvirt_nets, routes,
-                                                  ipaddrs)
+        networking['networks'] = _libvirt_nets_to_vdsm(libvirt_nets,
+                                                       collector)
     else:
         networking['networks'] = vdsmnets
 
@@ -86,7 +86,7 @@ def _get(vdsmnets=None):
             devinfo = networking['vlans'][dev.name] = vlans.info(dev)
         else:
             continue
-        devinfo.update(_devinfo(dev, routes, ipaddrs))
+        devinfo.update(_devinfo(dev, collector))
 
     for network_name, network_info in six.iteritems(networking['networks']):
         set_netdev_dhcp_info(network_info, networking)
@@ -115,44 +115,70 @@ def _stringify_mtus(netinfo_data):
     return netinfo_data
 
 
+class _Collector(object):
+    """
+    Host networking state shared by all the devices of a single report.
+
+    Addresses and routes are each read with one netlink dump and running
+    dhclients are indexed with one pass over /proc, instead of querying the
+    system again for every reported device.
+    """
+    def __init__(self, routes=None, ipaddrs=None):
+        self.routes = get_routes() if routes is None else routes
+        self.ipaddrs = getIpAddrs() if ipaddrs is None else ipaddrs
+        self._dhcp = dhclient.dhcp_status()
+        self._default_gateway = None
+        self._default_gateway_fetched = False
+
+    @property
+    def default_gateway(self):
+        if not self._default_gateway_fetched:
+            self._default_gateway = getDefaultGateway()
+            self._default_gateway_fetched = True
+        return self._default_gateway
+
+    def ip_info(self, iface):
+        gateway = get_gateway(self.routes, iface)
+        ipv4addr, ipv4netmask, ipv4addrs, ipv6addrs = getIpInfo(
+            iface, self.ipaddrs, gateway)
+        is_default = (bool(gateway) and
+                      is_default_gateway(gateway, self.default_gateway))
+
+        return {'addr': ipv4addr,
+                'ipv4addrs': ipv4addrs,
+                'ipv6addrs': ipv6addrs,
+                'ipv6autoconf': is_ipv6_local_auto(iface),
+                'gateway': gateway,
+                'ipv6gateway': get_gateway(self.routes, iface, family=6),
+                'dhcpv4': (iface, 4) in self._dhcp,
+                'dhcpv6': (iface, 6) in self._dhcp,
+                'netmask': ipv4netmask,
+                'ipv4defaultroute': is_default}
+
+
 def libvirtNets2vdsm(nets, routes=None, ipAddrs=None):
+    return _libvirt_nets_to_vdsm(nets, _Collector(routes, ipAddrs))
+
+
+def _libvirt_nets_to_vdsm(nets, collector):
     running_config = RunningConfig()
-    if routes is None:
-        routes = get_routes()
-    if ipAddrs is None:
-        ipAddrs = getIpAddrs()
 
     d = {}
     for net, netAttr in six.iteritems(nets):
         try:
             # Pass the iface if the net is _not_ bridged, the bridge otherwise
             d[net] = _getNetInfo(netAttr.get('iface', net), netAttr['bridged'],
-                                 routes, ipAddrs,
+                                 collector,
                                  running_config.networks.get(net, None))
         except KeyError:
             continue  # Do not report missing libvirt networks.
     return d
 
 
-def _devinfo(link, routes, ipaddrs):
-    gateway = get_gateway(routes, link.name)
-    ipv4addr, ipv4netmask, ipv4addrs, ipv6addrs = getIpInfo(
-        link.name, ipaddrs, gateway)
-
-    is_dhcpv4 = dhclient.is_active(link.name, family=4)
-    is_dhcpv6 = dhclient.is_active(link.name, family=6)
-
-    return {'addr': ipv4addr,
-            'ipv4addrs': ipv4addrs,
-            'ipv6addrs': ipv6addrs,
-            'ipv6autoconf': is_ipv6_local_auto(link.name),
-            'gateway': gateway,
-            'ipv6gateway': get_gateway(routes, link.name, family=6),
-            'dhcpv4': is_dhcpv4,
-            'dhcpv6': is_dhcpv6,
-            'mtu': link.mtu,
-            'netmask': ipv4netmask,
-            'ipv4defaultroute': is_default_route(gateway)}
+def _devinfo(link, collector):
+    info = collector.ip_info(link.name)
+    info['mtu'] = link.mtu
+    return info
 
 
 def ifaceUsed(iface):
@@ -171,7 +197,7 @@ def ifaceUsed(iface):
     return False
 
 
-def _getNetInfo(iface, bridged, routes, ipaddrs, net_attrs):
+def _getNetInfo(iface, bridged, collector, net_attrs):
     """Returns a dictionary of properties about the network's interface status.
     Raises a KeyError if the iface does not exist."""
     data = {}
@@ -185,23 +211,8 @@ def _getNetInfo(iface, bridged, routes, ipaddrs, net_attrs):
             # comment when the version is no longer supported.
             data['interface'] = iface
 
-        gateway = get_gateway(routes, iface)
-        ipv4addr, ipv4netmask, ipv4addrs, ipv6addrs = getIpInfo(
-            iface, ipaddrs, gateway)
-
-        is_dhcpv4 = dhclient.is_active(iface, family=4)
-        is_dhcpv6 = dhclient.is_active(iface, family=6)
-
+        data.update(collector.ip_info(iface))
         data.update({'iface': iface, 'bridged': bridged,
-                     'addr': ipv4addr, 'netmask': ipv4netmask,
-                     'dhcpv4': is_dhcpv4,
-                     'dhcpv6': is_dhcpv6,
-                     'ipv4addrs': ipv4addrs,
-                     'ipv6addrs': ipv6addrs,
-                     'ipv6autoconf': is_ipv6_local_auto(iface),
-                     'gateway': gateway,
-                     'ipv6gateway': get_gateway(routes, iface, family=6),
-                     'ipv4defaultroute': is_default_route(gateway),
                      'mtu': getMtu(iface)})
     except (IOError, OSError) as e:
         if e.errno == errno.ENOENT:
@@ -50,8 +50,17 @@ def is_default_route(gateway):
     if not gateway:
         return False
 
-    dg = getDefaultGateway()
-    return (gateway == dg.via) if dg else False
+    return is_default_gateway(gateway, getDefaultGateway())
+
+
+def is_default_gateway(gateway, default_gateway):
+    """
+    Like is_default_route(), but compares against an already fetched default
+    gateway Route (or None), for reports that check many devices at once.
+    """
+    if not gateway or default_gateway is None:
+        return False
+    return gateway == default_gateway.via
 
 
 def get_gateway(routes_by_dev, dev, family=4, table=nl_route._RT_TABLE_UNSPEC):
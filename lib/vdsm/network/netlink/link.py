@@ -18,8 +18,8 @@
 #
 from __future__ import absolute_import
 from contextlib import contextmanager
-from ctypes import (CFUNCTYPE, byref, c_char, c_char_p, c_int, c_void_p,
-                    c_size_t, sizeof)
+from ctypes import (CFUNCTYPE, byref, c_char, c_char_p, c_int, c_uint64,
+                    c_void_p, c_size_t, sizeof)
 from functools import partial
 from socket import AF_UNSPEC
 import errno
@@ -49,26 +49,47 @@ IFF_LOWER_UP = 1 << 16
 IFF_DORMANT = 1 << 17
 IFF_ECHO = 1 << 18
 
-
-def get_link(name):
-    """Returns the information dictionary of the name specified link."""
+# libnl/include/netlink/route/link.h rtnl_link_stat_id_t
+_RX_PACKETS = 0
+_TX_PACKETS = 1
+_RX_BYTES = 2
+_TX_BYTES = 3
+_RX_ERRORS = 4
+_TX_ERRORS = 5
+_RX_DROPPED = 6
+_TX_DROPPED = 7
+
+_STATS = (
+    ('rx_bytes', _RX_BYTES),
+    ('tx_bytes', _TX_BYTES),
+    ('rx_dropped', _RX_DROPPED),
+    ('tx_dropped', _TX_DROPPED),
+    ('rx_errors', _RX_ERRORS),
+    ('tx_errors', _TX_ERRORS),
+)
+
+
+def get_link(name, stats=False):
+    """Returns the information dictionary of the name specified link. If stats
+    is set, the link counters are reported under the 'stats' key."""
     with _pool.socket() as sock:
         with _get_link(name=name, sock=sock) as link:
             if not link:
                 raise IOError(errno.ENODEV, '%s is not present in the system' %
                               name)
-            link_info = _link_info(link)
+            link_info = _link_info(link, stats=stats)
         return link_info
 
 
-def iter_links():
+def iter_links(stats=False):
     """Generator that yields an information dictionary for each link of the
-    system."""
+    system. If stats is set, the link counters taken from the same dump are
+    reported under the 'stats' key."""
     with _pool.socket() as sock:
         with _nl_link_cache(sock) as cache:
             link = _nl_cache_get_first(cache)
             while link:
-                yield _link_info(link, cache=cache)
+                yield _link_info(link, cache=cache, stats=stats)
                 link = _nl_cache_get_next(link)
 
 
@@ -86,7 +107,7 @@ def is_link_up(link_flags, check_oper_status):
     return bool(iface_up)
 
 
-def _link_info(link, cache=None):
+def _link_info(link, cache=None, stats=False):
     """Returns a dictionary with the information of the link object."""
     info = {}
     info['address'] = _addr_to_str(_rtnl_link_get_addr(link))
@@ -124,9 +145,18 @@ def _link_info(link, cache=None):
     if vlanid >= 0:
         info['vlanid'] = vlanid
 
+    if stats:
+        info['stats'] = _link_stats(link)
+
     return info
 
 
+def _link_stats(link):
+    """Returns a dictionary with the counters of the link object."""
+    return dict((name, _rtnl_link_get_stat(link, stat_id))
+                for name, stat_id in _STATS)
+
+
 def _link_index_to_name(link_index, cache=None):
     """Returns the textual name of the link with index equal to link_index."""
     name = (c_char * CHARBUFFSIZE)()
@@ -217,6 +247,8 @@ _rtnl_link_get_master = _int_proto(('rtnl_link_get_master', LIBNL_ROUTE))
 _rtnl_link_get_mtu = _int_proto(('rtnl_link_get_mtu', LIBNL_ROUTE))
 _rtnl_link_get_name = _char_proto(('rtnl_link_get_name', LIBNL_ROUTE))
 _rtnl_link_get_operstate = _int_proto(('rtnl_link_get_operstate', LIBNL_ROUTE))
+_rtnl_link_get_stat = CFUNCTYPE(c_uint64, c_void_p, c_int)((
+    'rtnl_link_get_stat', LIBNL_ROUTE))
 _rtnl_link_get_qdisc = _char_proto(('rtnl_link_get_qdisc', LIBNL_ROUTE))
 _rtnl_link_get_by_name = CFUNCTYPE(c_void_p, c_void_p, c_char_p)((
     'rtnl_link_get_by_name', LIBNL_ROUTE))
@@ -0,0 +1,215 @@
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+In memory copy of the OVS database tables used by vdsm.
+
+The tables are loaded once and then kept current by following the updates
+reported by a long lived "ovsdb-client monitor" process. Changes are still
+done by ovs-vsctl transactions, which wait until the cache has seen them.
+"""
+from __future__ import absolute_import
+
+import json
+import logging
+import threading
+import uuid
+
+from vdsm.commands import execCmd
+from vdsm.utils import CommandPath, memoized, monotonic_time
+
+from .driver import vsctl
+
+# Monitoring only the columns vdsm uses avoids an update for every change of
+# the interfaces statistics.
+#
+# ovsdb-client prints the tables of an update in this order. Open_vSwitch
+# must be last, so when next_cfg changes, the other tables of the same update
+# were already handled.
+_MONITORED_TABLES = (
+    ('Bridge', ('name', 'ports', 'stp_enable')),
+    ('Port', ('name', 'interfaces', 'tag', 'other_config')),
+    ('Interface', ('name', 'mac_in_use')),
+    ('Open_vSwitch', ('next_cfg',)),
+)
+
+_START_TIMEOUT = 10
+_WAIT_TIMEOUT = 10
+
+_lock = threading.Lock()
+_cache = None
+
+
+class MonitorError(Exception):
+    pass
+
+
+class OvsDBCache(object):
+    """
+    Rows of the monitored tables, in the format reported by vsctl list
+    commands. The rows are replaced on updates, and must not be modified.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._tables = {table: {} for table, _ in _MONITORED_TABLES}
+        self._next_cfg = None
+        self._proc = None
+
+    def start(self, timeout=_START_TIMEOUT):
+        self._proc = execCmd(_monitor_command(), sync=False)
+        self._proc.add_line_handler('stdout', self.update)
+        if not self.wait_for_cfg(0, timeout):
+            self.stop()
+            raise MonitorError('Timeout loading the OVS database')
+
+    def stop(self):
+        if self._proc is None:
+            return
+        if self.running:
+            self._proc.kill()
+        self._proc.wait()
+
+    @property
+    def running(self):
+        return self._proc is not None and self._proc.returncode is None
+
+    @property
+    def next_cfg(self):
+        with self._cond:
+            return self._next_cfg
+
+    def tables(self, *names):
+        """Return a consistent snapshot of the rows of the named tables."""
+        with self._cond:
+            return [list(self._tables[name].values()) for name in names]
+
+    def update(self, line):
+        """Apply a json table update printed by ovsdb-client monitor."""
+        try:
+            update = json.loads(line)
+            # The caption is "<table> table".
+            table = update['caption'].rsplit(' ', 1)[0]
+            headings = update['headings']
+            data = update['data']
+        except (ValueError, KeyError):
+            logging.warning('Unexpected OVS database monitor output: %r', line)
+            return
+
+        with self._cond:
+            rows = self._tables[table]
+            for record in data:
+                row_uuid, action = record[0], record[1]
+                if action == 'delete':
+                    rows.pop(row_uuid, None)
+                elif action != 'old':
+                    # "initial", "insert" or "new", with all columns.
+                    row = vsctl.parse_db_record(headings[2:], record[2:])
+                    row['_uuid'] = uuid.UUID(row_uuid)
+                    rows[row_uuid] = row
+            if table == 'Open_vSwitch':
+                for row in rows.values():
+                    self._next_cfg = row['next_cfg']
+                self._cond.notify_all()
+
+    def wait_for_cfg(self, next_cfg, timeout):
+        """
+        Wait until the cache includes the changes committed with next_cfg.
+        Return True if it does, False on timeout or if the monitor exited.
+        """
+        deadline = monotonic_time() + timeout
+        with self._cond:
+            while self._next_cfg is None or self._next_cfg < next_cfg:
+                remaining = deadline - monotonic_time()
+                if remaining <= 0 or not self.running:
+                    return False
+                # Wake up periodically to detect monitor exit.
+                self._cond.wait(min(remaining, 1.0))
+            return True
+
+
+def get():
+    """
+    Return the running cache, starting it if needed. Return None if the OVS
+    database cannot be monitored; callers should use vsctl instead.
+    """
+    global _cache
+    with _lock:
+        if _cache is not None and not _cache.running:
+            logging.warning('OVS database monitor exited, restarting it')
+            _cache = None
+        if _cache is None:
+            cache = OvsDBCache()
+            try:
+                cache.start()
+            except (OSError, MonitorError):
+                logging.warning('Cannot monitor the OVS database',
+                                exc_info=True)
+                return None
+            _cache = cache
+        return _cache
+
+
+def wait_for(next_cfg, timeout=_WAIT_TIMEOUT):
+    """
+    Wait until the running cache has seen the transaction committed with
+    next_cfg. If it does not catch up, the cache is dropped, and reloaded on
+    the next get().
+    """
+    with _lock:
+        cache = _cache
+    if cache is None:
+        return
+    if not cache.wait_for_cfg(next_cfg, timeout):
+        logging.warning('OVS database cache did not see next_cfg %s '
+                        '(cache next_cfg %s), dropping it',
+                        next_cfg, cache.next_cfg)
+        _drop(cache)
+
+
+def invalidate():
+    """
+    Drop the running cache, when a transaction cannot be waited for. The
+    cache is reloaded on the next get().
+    """
+    with _lock:
+        cache = _cache
+    if cache is not None:
+        _drop(cache)
+
+
+def _drop(cache):
+    global _cache
+    with _lock:
+        if _cache is cache:
+            _cache = None
+    cache.stop()
+
+
+def _monitor_command():
+    cmd = [_ovsdb_client_cmd(), 'monitor', '--format=json', 'Open_vSwitch']
+    for table, columns in _MONITORED_TABLES:
+        cmd += [table, ','.join(columns)]
+    return cmd
+
+
+@memoized
+def _ovsdb_client_cmd():
+    return CommandPath('ovsdb-client',
+                       '/usr/sbin/ovsdb-client',
+                       '/usr/bin/ovsdb-client').cmd
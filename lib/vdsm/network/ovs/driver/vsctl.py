@@ -40,11 +40,15 @@ _DB_ENTRIES_WHICH_SHOULD_BE_LIST = {'ports', 'interfaces'}
 _DB_ENTRIES_WHICH_SHOULD_NOT_BE_LIST = {
     'tag', 'bond_active_slave', 'bond_mode', 'lacp', 'mac_in_use'}
 
+# Commands which do not change the database.
+_READ_ONLY_COMMANDS = {'get', 'list', 'list-br', 'list-ports'}
+
 
 class Transaction(DriverTransaction):
 
     def __init__(self):
         self.commands = []
+        self.next_cfg = None
 
     def commit(self):
         if not self.commands:
@@ -53,6 +57,7 @@ class Transaction(DriverTransaction):
         args = []
         for command in self.commands:
             args += ['--'] + command.cmd
+        changes_db = any(command.changes_db for command in self.commands)
         exec_line = [_ovs_vsctl_cmd()] + ['--oneline', '--format=json'] + args
         logging.debug('Executing commands: %s' % ' '.join(exec_line))
 
@@ -66,6 +71,16 @@ class Transaction(DriverTransaction):
 
         for i, line in enumerate(out):
             self.commands[i].set_raw_result(line)
+
+        if changes_db:
+            # The cache depends on this module, import it late.
+            from vdsm.network.ovs import cache
+            self.next_cfg = _current_next_cfg()
+            if self.next_cfg is None:
+                cache.invalidate()
+            else:
+                cache.wait_for(self.next_cfg)
+
         return [cmd.result for cmd in self.commands]
 
     def add(self, *commands):
@@ -87,6 +102,11 @@ class Command(DriverCommand):
     def result(self):
         return self._result
 
+    @property
+    def changes_db(self):
+        words = [arg for arg in self.cmd if not arg.startswith('--')]
+        return bool(words) and words[0] not in _READ_ONLY_COMMANDS
+
     def set_raw_result(self, data):
         self._result = data.split(r'\n') if data else []
 
@@ -106,13 +126,7 @@ class DBResultCommand(Command):
 
         headings = jdata['headings']
         data = jdata['data']
-        results = []
-        for record in data:
-            obj = {}
-            for pos, heading in enumerate(headings):
-                obj[heading] = _normalize(heading, _val_to_py(record[pos]))
-            results.append(obj)
-        self._result = results
+        self._result = [parse_db_record(headings, record) for record in data]
 
 
 def create():
@@ -212,6 +226,35 @@ class Vsctl(DriverAPI):
         return Command([])
 
 
+def parse_db_record(headings, record):
+    """Convert a json ovsdb table row to a dict of native Python objects."""
+    obj = {}
+    for pos, heading in enumerate(headings):
+        obj[heading] = _normalize(heading, _val_to_py(record[pos]))
+    return obj
+
+
+def _current_next_cfg():
+    """
+    Return the Open_vSwitch next_cfg after a transaction changing the
+    database, or None if it cannot be read.
+
+    ovs-vsctl increments next_cfg in every transaction changing the
+    database, so the configuration including the transaction changes is
+    next_cfg or a later one.
+    """
+    rc, out, err = execCmd([_ovs_vsctl_cmd(), '--no-wait', 'get',
+                            'Open_vSwitch', '.', 'next_cfg'])
+    try:
+        if rc == 0:
+            return int(out[0])
+    except (IndexError, ValueError):
+        pass
+    logging.warning('Cannot read OVS next_cfg: rc=%s out=%s err=%s',
+                    rc, out, err)
+    return None
+
+
 def _escape_value(value):
     """
     \"foobar\" escaping is needed in order to be able to to pass strings which
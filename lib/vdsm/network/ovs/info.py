@@ -27,6 +27,7 @@ from vdsm.network.netinfo.addresses import (
 from vdsm.network.netinfo.mtus import getMtu
 from vdsm.network.netinfo.routes import (get_routes, get_gateway,
                                          is_default_route)
+from . import cache
 from . import driver
 
 
@@ -54,6 +55,12 @@ SHARED_NETWORK_ATTRIBUTES = [
 
 class OvsDB(object):
     def __init__(self, ovsdb):
+        ovsdb_cache = cache.get()
+        if ovsdb_cache is not None:
+            self.bridges, self.ports, self.ifaces = ovsdb_cache.tables(
+                'Bridge', 'Port', 'Interface')
+            return
+
         bridges_command = ovsdb.list_bridge_info()
         ports_command = ovsdb.list_port_info()
         ifaces_command = ovsdb.list_interface_info()
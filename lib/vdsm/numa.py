@@ -89,6 +89,15 @@ def cpu_topology(capabilities=None):
     return _numa(capabilities).cpu_topology
 
 
+def invalidate_topology():
+    '''
+    Drop the cached host topology, so it is read again from libvirt on next
+    use, e.g. after cpu or numa node hotplug.
+    '''
+    _numa.invalidate()
+    _get_mapping_pcpu_to_pnode.invalidate()
+
+
 @utils.memoized
 def autonuma_status():
     '''
@@ -248,41 +257,68 @@ def getVmNumaNodeRuntimeInfo(vm):
     '<vm numa node index>': [<host numa node index>, ...]
     """
 
-    vmNumaNodeRuntimeMap = {}
-
     vcpu_to_pcpu = _get_mapping_vcpu_to_pcpu(
         _get_vcpu_positioning(vm))
-    if vcpu_to_pcpu:
-        vm_numa_placement = defaultdict(set)
-
-        vcpu_to_pnode = supervdsm.getProxy().getVcpuNumaMemoryMapping(
-            vm.conf['vmName'].encode('utf-8'))
-        pcpu_to_pnode = _get_mapping_pcpu_to_pnode()
-        vcpu_to_vnode = _get_mapping_vcpu_to_vnode(vm)
-
-        for vcpu_id, pcpu_id in vcpu_to_pcpu.iteritems():
-            try:
-                vnode_index = str(vcpu_to_vnode[vcpu_id])
-            except KeyError:
-                # Not all CPUs are mapped to NUMA nodes, e.g.:
-                # - We don't assign hotplugged CPUs to NUMA nodes.
-                # - When Engine assigns equal number of CPUs to each of the
-                #   NUMA nodes, the contingent remaining CPUs are left
-                #   unassigned.
-                # We simply skip the unassigned CPUs here.
-                log = logging.getLogger('NUMA')
-                log.debug("Virtual CPU #%s not assigned to any virtual "
-                          "NUMA node",
-                          vcpu_id)
-                continue
-            vm_numa_placement[vnode_index].add(pcpu_to_pnode[pcpu_id])
-            vm_numa_placement[vnode_index].update(
-                vcpu_to_pnode.get(vcpu_id, ()))
-
-        vmNumaNodeRuntimeMap = dict((k, list(v)) for k, v in
-                                    vm_numa_placement.iteritems())
-
-    return vmNumaNodeRuntimeMap
+    if not vcpu_to_pcpu:
+        return {}
+
+    vcpu_to_pnode = supervdsm.getProxy().getVcpuNumaMemoryMapping(
+        vm.conf['vmName'].encode('utf-8'))
+    return _get_vm_numa_placement(vm, vcpu_to_pcpu, vcpu_to_pnode)
+
+
+def getVmsNumaNodeRuntimeInfo(vms):
+    """
+    Collect the same information as getVmNumaNodeRuntimeInfo for many vms
+    in one pass, with a single supervdsm call. Instead of asking libvirt,
+    the physical cpu each vcpu runs on is read by supervdsm from
+    /proc/<vm_pid>/task/<vcpu_pid>/stat, with the numa_maps.
+
+    Returns a map vm id -> vm numa node runtime map. Vms which are not
+    running are not reported.
+    """
+    names = dict((vm.conf['vmName'].encode('utf-8'), vm) for vm in vms)
+    vms_vcpus_info = supervdsm.getProxy().getVcpusNumaInfo(list(names))
+
+    vms_info = {}
+    for name, vcpus_info in vms_vcpus_info.iteritems():
+        vcpu_to_pcpu = {}
+        vcpu_to_pnode = {}
+        for vcpu_id, (pcpu_id, pnodes) in vcpus_info.iteritems():
+            vcpu_to_pcpu[vcpu_id] = pcpu_id
+            vcpu_to_pnode[vcpu_id] = pnodes
+        vm = names[name]
+        vms_info[vm.id] = _get_vm_numa_placement(
+            vm, vcpu_to_pcpu, vcpu_to_pnode)
+    return vms_info
+
+
+def _get_vm_numa_placement(vm, vcpu_to_pcpu, vcpu_to_pnode):
+    vm_numa_placement = defaultdict(set)
+
+    pcpu_to_pnode = _get_mapping_pcpu_to_pnode()
+    vcpu_to_vnode = _get_mapping_vcpu_to_vnode(vm)
+
+    for vcpu_id, pcpu_id in vcpu_to_pcpu.iteritems():
+        try:
+            vnode_index = str(vcpu_to_vnode[vcpu_id])
+        except KeyError:
+            # Not all CPUs are mapped to NUMA nodes, e.g.:
+            # - We don't assign hotplugged CPUs to NUMA nodes.
+            # - When Engine assigns equal number of CPUs to each of the
+            #   NUMA nodes, the contingent remaining CPUs are left
+            #   unassigned.
+            # We simply skip the unassigned CPUs here.
+            log = logging.getLogger('NUMA')
+            log.debug("Virtual CPU #%s not assigned to any virtual "
+                      "NUMA node",
+                      vcpu_id)
+            continue
+        vm_numa_placement[vnode_index].add(pcpu_to_pnode[pcpu_id])
+        vm_numa_placement[vnode_index].update(
+            vcpu_to_pnode.get(vcpu_id, ()))
+
+    return dict((k, list(v)) for k, v in vm_numa_placement.iteritems())
 
 
 def _get_vcpu_positioning(vm):
@@ -304,6 +340,7 @@ def _get_mapping_vcpu_to_pcpu(sample):
     return vcpu_to_pcpu
 
 
+@utils.memoized
 def _get_mapping_pcpu_to_pnode():
     pcpu_to_pnode = {}
     for node_index, numa_node in topology().iteritems():
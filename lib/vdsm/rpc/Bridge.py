@@ -426,6 +426,7 @@ command_info = {
     'Volume_getSize': {'ret': Volume_getsize_Ret},
     'Volume_extendSize': {'ret': 'uuid'},
     'Host_getAllTasks': {'ret': 'tasks'},
+    'Host_getResourceLockStats': {'ret': 'lockStats'},
     'Host_getJobs': {'ret': 'jobs'},
 }
 
@@ -56,15 +56,31 @@ Finally, when the scheduler is not needed any more:
     scheduler.stop()
 
 This will cancel any pending calls and terminate the scheduler thread.
+
+Calls are kept in a hierarchical timer wheel. Time is divided into ticks
+(default 10 milliseconds); a call is due at the first tick at or after its
+deadline, and all calls due at the same tick are dispatched together.
+Scheduling and canceling a call take constant time regardless of the number of
+scheduled calls. To coalesce more calls into the same tick, use a larger tick:
+
+    scheduler = schedule.Scheduler(tick=0.1)
+
+The scheduler keeps lateness statistics for each call site, the qualified name
+of the scheduled callable, available using Scheduler.lateness(). The
+statistics of all running schedulers are available using lateness().
 """
 
-import heapq
 import logging
+import math
 import threading
 import time
 
 from . import concurrent
 
+# Running schedulers, keyed by name, for reporting their statistics.
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
 
 class Scheduler(object):
     """
@@ -75,22 +91,27 @@ class Scheduler(object):
     """
 
     DEFAULT_DELAY = 30.0  # Used if no call are scheduled
+    DEFAULT_TICK = 0.01
 
     _log = logging.getLogger("Scheduler")
 
-    def __init__(self, name="Scheduler", clock=time.time):
+    def __init__(self, name="Scheduler", clock=time.time, tick=DEFAULT_TICK):
         """
         Initialize a scheduler.
 
         Arguments:
           name      Used as sheculer thread name
           clock     Callable returning current time (defualt time.time)
+          tick      Granularity of deadlines in seconds (default 0.01)
         """
         self._name = name
         self._clock = clock
+        self._tick = tick
         self._cond = threading.Condition(threading.Lock())
         self._running = False
-        self._calls = []
+        self._wheel = _TimerWheel(self._current_tick())
+        self._wakeup = None
+        self._lateness = {}
         self._thread = concurrent.thread(self._run, name=self._name,
                                          logger=self._log.name)
 
@@ -101,6 +122,8 @@ class Scheduler(object):
                 raise AssertionError("Scheduler already running")
             self._running = True
             self._thread.start()
+        with _schedulers_lock:
+            _schedulers[self._name] = self
 
     def stop(self, wait=False):
         """
@@ -108,6 +131,9 @@ class Scheduler(object):
         after the scheduler was stopped will raise AssertionError.
         """
         self._log.debug("Stopping scheduler %s", self._name)
+        with _schedulers_lock:
+            if _schedulers.get(self._name) is self:
+                del _schedulers[self._name]
         with self._cond:
             self._running = False
             self._cond.notify()
@@ -128,14 +154,24 @@ class Scheduler(object):
         """
         deadline = self._clock() + delay
         call = ScheduledCall(deadline, callable)
+        expires = int(math.ceil(deadline / self._tick))
         with self._cond:
             if not self._running:
                 raise AssertionError("Scheduler not running")
-            heapq.heappush(self._calls, call)
-            if self._calls[0] is call:
+            self._wheel.add(expires, call)
+            if self._wakeup is None or expires < self._wakeup:
                 self._cond.notify()
         return call
 
+    def lateness(self):
+        """
+        Return a dict mapping call sites to a (count, average, maximum) tuple,
+        describing how late calls were executed after their deadline, in
+        seconds.
+        """
+        return {site: (count, total / count, maximum)
+                for site, (count, total, maximum) in self._lateness.items()}
+
     def _run(self):
         self._log.debug("started")
         try:
@@ -149,39 +185,206 @@ class Scheduler(object):
             with self._cond:
                 if not self._running:
                     return
-                delay = self._time_until_deadline()
-                if delay > 0.0:
-                    self._cond.wait(delay)
-                    if not self._running:
-                        return
-                expired = self._pop_expired_calls()
-            for call in expired:
-                call._execute()
-
-    def _time_until_deadline(self):
-        if len(self._calls) > 0:
-            return self._calls[0]._deadline - self._clock()
-        return self.DEFAULT_DELAY
+                expired = self._wheel.advance(self._current_tick())
+                if not expired:
+                    self._wait()
+                    continue
+            self._dispatch(expired)
 
-    def _pop_expired_calls(self):
+    def _current_tick(self):
         now = self._clock()
-        expired = []
-        while len(self._calls) > 0:
-            call = self._calls[0]
-            if call._deadline > now:
-                break
-            heapq.heappop(self._calls)
+        tick = int(math.floor(now / self._tick))
+        # Do not let rounding errors delay a tick which is due.
+        if (tick + 1) * self._tick <= now:
+            tick += 1
+        return tick
+
+    def _wait(self):
+        expires = self._wheel.next_expiration()
+        if expires is None:
+            delay = self.DEFAULT_DELAY
+        else:
+            delay = expires * self._tick - self._clock()
+        if delay > 0.0:
+            self._wakeup = expires
+            self._cond.wait(delay)
+            self._wakeup = None
+
+    def _dispatch(self, expired):
+        for call in expired:
             if call.valid():
-                expired.append(call)
-        return expired
+                site = _call_site(call._callable)
+                self._record_lateness(site, self._clock() - call._deadline)
+                call._execute()
+
+    def _record_lateness(self, site, lateness):
+        # Called only from the scheduler thread; replacing the value keeps
+        # lateness() consistent without locking.
+        count, total, maximum = self._lateness.get(site, (0, 0.0, 0.0))
+        self._lateness[site] = (count + 1, total + lateness,
+                                max(maximum, lateness))
 
     def _cancel_calls(self):
         # Help the garbage collector by breaking reference cycles
         with self._cond:
-            for call in self._calls:
+            for call in self._wheel.clear():
                 call.cancel()
 
 
+def lateness():
+    """
+    Return a dict mapping the name of every running scheduler to its
+    lateness statistics, see Scheduler.lateness().
+    """
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {s._name: s.lateness() for s in schedulers}
+
+
+# Each level of the wheel has 256 slots, each slot in level n spanning 256**n
+# ticks. With the default tick, the levels span 2.56 seconds, 11 minutes,
+# 46 hours and 497 days.
+_SLOT_BITS = 8
+_SLOTS = 1 << _SLOT_BITS
+_SLOT_MASK = _SLOTS - 1
+_LEVELS = 4
+_MAX_DELTA = (1 << (_SLOT_BITS * _LEVELS)) - 1
+
+
+class _TimerWheel(object):
+    """
+    Hierarchical timer wheel keeping calls by expiration tick.
+
+    Calls expiring in the next 256 ticks are kept in level 0, one slot per
+    tick. Calls expiring later are kept in higher levels, and are moved to
+    lower levels when the wheel reaches the range of ticks spanned by their
+    slot. Calls expiring after the range of the last level are kept at the
+    end of its range, and are inserted again when reaching it.
+
+    This class is not thread safe.
+    """
+
+    def __init__(self, now):
+        self._current = now  # Next tick to expire
+        self._levels = [[[] for i in range(_SLOTS)] for n in range(_LEVELS)]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, expires, call):
+        self._insert(expires, call)
+        self._count += 1
+
+    def advance(self, now):
+        """
+        Advance the wheel to tick now, returning a list of the calls expired
+        in this range, in expiration order.
+        """
+        expired = []
+        while self._current <= now:
+            # Skip ticks with nothing to expire or to move.
+            next_tick = self.next_expiration()
+            if next_tick is None or next_tick > now:
+                self._current = now + 1
+                break
+            self._current = next_tick
+            if self._current & _SLOT_MASK == 0:
+                self._cascade(1)
+            index = self._current & _SLOT_MASK
+            slot = self._levels[0][index]
+            if slot:
+                self._levels[0][index] = []
+                self._count -= len(slot)
+                expired.extend(call for expires, call in slot)
+            self._current += 1
+        return expired
+
+    def next_expiration(self):
+        """
+        Return the next tick when calls expire or move to a lower level, or
+        None if the wheel is empty.
+        """
+        if self._count == 0:
+            return None
+        # Slots starting at the current tick were not moved yet.
+        for level in range(1, _LEVELS):
+            shift = _SLOT_BITS * level
+            if self._current & ((1 << shift) - 1):
+                break
+            if self._levels[level][(self._current >> shift) & _SLOT_MASK]:
+                return self._current
+        for level, slots in enumerate(self._levels):
+            shift = _SLOT_BITS * level
+            base = self._current >> shift
+            index = base & _SLOT_MASK
+            # At higher levels, the current slot was already moved.
+            start = index if level == 0 else index + 1
+            for i in range(start, _SLOTS):
+                if slots[i]:
+                    return (base + i - index) << shift
+            if any(slots[:start]):
+                # These calls will be reached after the next round.
+                return (base + _SLOTS - index) << shift
+        return None
+
+    def clear(self):
+        """
+        Remove all calls, returning them.
+        """
+        calls = []
+        for level in self._levels:
+            for index, slot in enumerate(level):
+                if slot:
+                    level[index] = []
+                    calls.extend(call for expires, call in slot)
+        self._count = 0
+        return calls
+
+    def _insert(self, expires, call):
+        tick = min(max(expires, self._current), self._current + _MAX_DELTA)
+        delta = tick - self._current
+        level = 0
+        while delta >= 1 << (_SLOT_BITS * (level + 1)):
+            level += 1
+        index = (tick >> (_SLOT_BITS * level)) & _SLOT_MASK
+        self._levels[level][index].append((expires, call))
+
+    def _cascade(self, level):
+        if level == _LEVELS:
+            return
+        index = (self._current >> (_SLOT_BITS * level)) & _SLOT_MASK
+        if index == 0:
+            self._cascade(level + 1)
+        slot = self._levels[level][index]
+        self._levels[level][index] = []
+        self._reinsert(slot)
+
+    def _reinsert(self, entries):
+        for expires, call in entries:
+            if call.valid():
+                self._insert(expires, call)
+            else:
+                # Drop canceled calls early.
+                self._count -= 1
+
+
+def _call_site(callable):
+    """
+    Return the qualified name of callable, used to group lateness
+    statistics.
+    """
+    func = getattr(callable, "func", callable)  # functools.partial
+    owner = getattr(func, "__self__", None)
+    name = getattr(func, "__name__", None)
+    if name is None:
+        return "%s.%s" % (type(func).__module__, type(func).__name__)
+    if owner is not None:
+        return "%s.%s.%s" % (type(owner).__module__, type(owner).__name__,
+                             name)
+    return "%s.%s" % (getattr(func, "__module__", None), name)
+
+
 class ScheduledCall(object):
     """
     Returned when a callable is scheduled. The caller may cancel the call if it
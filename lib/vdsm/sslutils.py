@@ -18,11 +18,14 @@
 # Refer to the README and COPYING files for full details of the license
 #
 from __future__ import absolute_import
+import collections
 import logging
+import os
 from six.moves import xmlrpc_client as xmlrpclib
 from six.moves import http_client as httplib
 import socket
 import ssl
+import threading
 
 from ssl import SSLError
 from vdsm import constants
@@ -34,10 +37,29 @@ DEFAULT_ACCEPT_TIMEOUT = 5
 SOCKET_DEFAULT_TIMEOUT = socket._GLOBAL_DEFAULT_TIMEOUT
 
 
+# TLS 1.2 or later, see create_ssl_context() for the legacy protocols.
+_NO_LEGACY_PROTOCOLS = ssl.OP_NO_TLSv1 | getattr(ssl, 'OP_NO_TLSv1_1', 0)
+
+# Forward secrecy and AEAD first, no weak or anonymous ciphers.
+DEFAULT_CIPHERS = (
+    'ECDH+AESGCM:DH+AESGCM:ECDH+CHACHA20:ECDH+AES256:DH+AES256:'
+    'ECDH+AES128:DH+AES:RSA+AESGCM:RSA+AES:'
+    '!aNULL:!eNULL:!MD5:!DSS:!RC4:!3DES'
+)
+
+# ssl.SSLSocket.session was added in Python 3.6.
+_CLIENT_SESSIONS = hasattr(ssl.SSLSocket, 'session')
+
+# Number of client sessions kept for resumption.
+_MAX_SESSIONS = 64
+
+
 class SSLSocket(object):
-    def __init__(self, sock):
+    def __init__(self, sock, sslctx=None):
         self.sock = sock
-        self._data = ''
+        self._sslctx = sslctx
+        self._address = None
+        self._data = bytearray()
 
     # ssl do not accept flag other than 0
     def read(self, size=4096, flag=None):
@@ -47,11 +69,11 @@ class SSLSocket(object):
                 bytes_left = size - len(self._data)
                 if bytes_left > 0:
                     self._data += self.sock.read(bytes_left)
-                result = self._data
+                result = bytes(self._data)
             else:
                 if self._data:
-                    result = self._data
-                    self._data = ''
+                    result = bytes(self._data)
+                    del self._data[:]
                 else:
                     result = self.sock.read(size)
         except SSLError as e:
@@ -67,6 +89,20 @@ class SSLSocket(object):
             pending = pending + len(self._data)
         return pending
 
+    def connect(self, address):
+        if self._sslctx is not None:
+            self._sslctx._restore_session(self.sock, address)
+            self._address = address
+        self.sock.connect(address)
+
+    def close(self):
+        # Session tickets may be received after the handshake, so the
+        # session is saved when the connection is done.
+        if self._address is not None:
+            self._sslctx._save_session(self.sock, self._address)
+            self._address = None
+        self.sock.close()
+
     def __getattr__(self, name):
         return getattr(self.sock, name)
 
@@ -78,23 +114,107 @@ class SSLSocket(object):
 
 
 class SSLContext(object):
+    """
+    Wraps sockets using ssl contexts created once, so the certificates are
+    loaded once and sessions can be resumed. The contexts are created again
+    when the certificate or key files are modified, so renewed certificates
+    are used by new connections.
+
+    The server side context resumes sessions using its session cache and
+    session tickets. The client side context resumes the last session used
+    with each peer when the ssl module supports it.
+    """
+    log = logging.getLogger("sslutils.SSLContext")
+
     def __init__(self, cert_file, key_file, ca_certs=None,
-                 protocol=ssl.PROTOCOL_TLSv1):
+                 protocol=ssl.PROTOCOL_SSLv23, ciphers=DEFAULT_CIPHERS,
+                 options=_NO_LEGACY_PROTOCOLS):
         self.cert_file = cert_file
         self.key_file = key_file
         self.ca_certs = ca_certs
         self.protocol = protocol
-
-    def wrapSocket(self, sock):
-        return SSLSocket(
-            ssl.wrap_socket(sock,
-                            keyfile=self.key_file,
-                            certfile=self.cert_file,
-                            server_side=False,
-                            cert_reqs=ssl.CERT_REQUIRED,
-                            ssl_version=self.protocol,
-                            ca_certs=self.ca_certs)
-        )
+        self._ciphers = ciphers
+        self._options = options
+        self._lock = threading.Lock()
+        self._sessions = collections.OrderedDict()
+        self._mtimes = self._files_mtimes()
+        self._client_context = self._create_context()
+        self._server_context = self._create_context()
+
+    def _files_mtimes(self):
+        try:
+            return tuple(os.stat(path).st_mtime
+                         for path in (self.cert_file, self.key_file))
+        except OSError:
+            return None
+
+    def _contexts(self):
+        """
+        Return the client and server contexts, creating them again if the
+        certificate or key files were modified.
+        """
+        mtimes = self._files_mtimes()
+        with self._lock:
+            if mtimes is not None and mtimes != self._mtimes:
+                self.log.info("Reloading certificate %s", self.cert_file)
+                self._client_context = self._create_context()
+                self._server_context = self._create_context()
+                self._sessions.clear()
+                self._mtimes = mtimes
+            return self._client_context, self._server_context
+
+    def _create_context(self):
+        context = ssl.SSLContext(self.protocol)
+        context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | self._options
+        context.set_ciphers(self._ciphers)
+        context.load_cert_chain(self.cert_file, self.key_file)
+        if self.ca_certs:
+            context.load_verify_locations(self.ca_certs)
+        context.verify_mode = ssl.CERT_REQUIRED
+        return context
+
+    def wrapSocket(self, sock, server_side=False):
+        """
+        Wrap sock for client side or server side usage. Server side sockets
+        are wrapped without doing the handshake.
+        """
+        client_context, server_context = self._contexts()
+        if server_side:
+            sslsock = server_context.wrap_socket(
+                sock, server_side=True, do_handshake_on_connect=False)
+        else:
+            sslsock = client_context.wrap_socket(sock)
+        return SSLSocket(sslsock, self)
+
+    def _restore_session(self, sslsock, address):
+        if _CLIENT_SESSIONS:
+            with self._lock:
+                session = self._sessions.get(address)
+            if session is not None:
+                sslsock.session = session
+
+    def _save_session(self, sslsock, address):
+        if _CLIENT_SESSIONS and sslsock.session is not None:
+            with self._lock:
+                self._sessions.pop(address, None)
+                self._sessions[address] = sslsock.session
+                if len(self._sessions) > _MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+
+    def stats(self):
+        """
+        Return the number of full and resumed handshakes completed by the
+        client and server sides.
+        """
+        with self._lock:
+            client = self._client_context.session_stats()
+            server = self._server_context.session_stats()
+        return {
+            'client.full_handshakes': client['connect_good'] - client['hits'],
+            'client.resumed_handshakes': client['hits'],
+            'server.full_handshakes': server['accept_good'] - server['hits'],
+            'server.resumed_handshakes': server['hits'],
+        }
 
 
 class VerifyingHTTPSConnection(httplib.HTTPSConnection):
@@ -169,18 +289,8 @@ class SSLHandshakeDispatcher(object):
         self._handshake_finished_handler = handshake_finished_handler
 
     def _set_up_socket(self, dispatcher):
-        client_socket = dispatcher.socket
-        client_socket = SSLSocket(
-            ssl.wrap_socket(client_socket,
-                            keyfile=self._sslctx.key_file,
-                            certfile=self._sslctx.cert_file,
-                            server_side=True,
-                            cert_reqs=ssl.CERT_REQUIRED,
-                            ssl_version=self._sslctx.protocol,
-                            ca_certs=self._sslctx.ca_certs,
-                            do_handshake_on_connect=False))
-
-        dispatcher.socket = client_socket
+        dispatcher.socket = self._sslctx.wrapSocket(dispatcher.socket,
+                                                    server_side=True)
         self._has_been_set_up = True
 
     def next_check_interval(self):
@@ -261,15 +371,40 @@ class SSLHandshakeDispatcher(object):
         dispatcher.close()
 
 
+_context = None
+_context_lock = threading.Lock()
+
+
 def create_ssl_context():
-        sslctx = None
-        if config.getboolean('vars', 'ssl'):
-            protocol = (
-                ssl.PROTOCOL_SSLv23
-                if config.get('vars', 'ssl_protocol') == 'sslv23'
-                else ssl.PROTOCOL_TLSv1
-            )
-            sslctx = SSLContext(key_file=constants.KEY_FILE,
-                                cert_file=constants.CERT_FILE,
-                                ca_certs=constants.CA_FILE, protocol=protocol)
-        return sslctx
+    """
+    Return the ssl context shared by vdsm connections, or None if ssl is
+    disabled.
+    """
+    global _context
+    if not config.getboolean('vars', 'ssl'):
+        return None
+
+    with _context_lock:
+        if _context is None:
+            # sslv23 and tlsv1 allow also TLS 1.0 and 1.1 for old peers, so
+            # hosts configured explicitly for TLS 1.0 keep working.
+            if config.get('vars', 'ssl_protocol') == 'tls':
+                options = _NO_LEGACY_PROTOCOLS
+            else:
+                options = 0
+            _context = SSLContext(key_file=constants.KEY_FILE,
+                                  cert_file=constants.CERT_FILE,
+                                  ca_certs=constants.CA_FILE,
+                                  options=options)
+        return _context
+
+
+def stats():
+    """
+    Return the handshake counters of the shared ssl context.
+    """
+    with _context_lock:
+        context = _context
+    if context is None:
+        return {}
+    return context.stats()
@@ -32,7 +32,6 @@ from vdsm import commands
 from vdsm import constants
 from vdsm import supervdsm
 from vdsm.config import config
-from vdsm.common import zombiereaper
 from vdsm.storage import misc
 
 log = logging.getLogger("storage.HBA")
@@ -76,7 +75,7 @@ def _rescan():
         proc.wait(timeout)
     finally:
         if proc.returncode is None:
-            zombiereaper.autoReapPID(proc.pid)
+            proc.auto_reap()
             raise Error("Timeout scanning (pid=%s)" % proc.pid)
         elif proc.returncode != 0:
             stderr = proc.stderr.read(512)
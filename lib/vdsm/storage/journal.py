@@ -0,0 +1,211 @@
+#
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+A journal of keyed records.
+
+Records committed concurrently by put() or remove() are written together by
+a writer thread, and callers return once their record is durable.
+
+The journal is kept on shared storage, so all file operations are done by an
+out of process helper (see outOfProcess.getProcessPool()), and callers wait
+for the writer only up to a timeout. The helper can write whole files but
+cannot append, so each batch rewrites the journal: the live records are
+written as a json object to a temporary file, which is renamed over the
+journal. A crash leaves either the old or the new journal, never a partial
+one, so there is nothing to recover when loading.
+
+The cost of a batch is proportional to the number of live records, not to
+the number of records committed, with 2 fsyncs and a rename per batch.
+This is cheap for a journal of the running tasks, but the journal is not
+suitable for keeping many or large records.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import json
+import logging
+import os
+import threading
+
+import six
+
+from vdsm import concurrent
+
+# Seconds to wait for a record to be written, or for the writer to stop.
+WRITE_TIMEOUT = 60
+
+_TEMP_EXT = ".tmp"
+
+log = logging.getLogger("storage.journal")
+
+
+class ClosedError(Exception):
+    """ Raised when committing to a closed journal """
+
+
+class Timeout(Exception):
+    """
+    Raised when a record was not written in time. The record may still be
+    written later.
+    """
+
+
+class _Batch(object):
+
+    def __init__(self):
+        self.records = []
+        self.done = threading.Event()
+        self.error = None
+
+
+class Journal(object):
+
+    def __init__(self, path, oop, timeout=WRITE_TIMEOUT):
+        """
+        path is the journal file, and oop an out of process helper used for
+        all file operations.
+        """
+        self._path = path
+        self._oop = oop
+        self._timeout = timeout
+        self._cond = threading.Condition(threading.Lock())
+        self._batch = _Batch()
+        self._running = False
+        self._thread = None
+        self._live = {}
+        self._load()
+
+    @property
+    def path(self):
+        return self._path
+
+    def start(self):
+        with self._cond:
+            self._running = True
+        self._thread = concurrent.thread(
+            self._run, name="journal/" + os.path.basename(self._path))
+        self._thread.start()
+
+    def close(self):
+        """
+        Write the pending records and stop the writer thread.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(self._timeout)
+            if self._thread.is_alive():
+                log.warning("Timeout stopping journal %s writer",
+                            self._path)
+            self._thread = None
+
+    def items(self):
+        """
+        Return a list of (key, value) tuples for all live keys.
+        """
+        with self._cond:
+            return list(self._live.items())
+
+    def put(self, key, value):
+        """
+        Commit a record setting key to value, and wait until it is durable.
+        value must be serializable to json.
+        """
+        self._commit(key, value)
+
+    def remove(self, key):
+        """
+        Commit a record removing key, and wait until it is durable.
+        """
+        self._commit(key, None)
+
+    # Private
+
+    def _commit(self, key, value):
+        with self._cond:
+            if not self._running:
+                raise ClosedError(self._path)
+            batch = self._batch
+            batch.records.append((key, value))
+            self._cond.notify()
+        if not batch.done.wait(self._timeout):
+            raise Timeout("Timeout writing journal %s" % self._path)
+        if batch.error is not None:
+            raise batch.error
+
+    def _run(self):
+        log.debug("Journal %s writer started", self._path)
+        while True:
+            with self._cond:
+                while self._running and not self._batch.records:
+                    self._cond.wait()
+                if not self._batch.records:
+                    break
+                batch = self._batch
+                self._batch = _Batch()
+            self._write(batch)
+        log.debug("Journal %s writer stopped", self._path)
+
+    def _write(self, batch):
+        with self._cond:
+            live = dict(self._live)
+        _apply(live, batch.records)
+        try:
+            self._replace(live)
+        except Exception as e:
+            log.error("Error writing journal %s", self._path, exc_info=True)
+            batch.error = e
+        else:
+            with self._cond:
+                self._live = live
+        finally:
+            batch.done.set()
+
+    def _replace(self, live):
+        tmp_path = self._path + _TEMP_EXT
+        data = json.dumps(live)
+        if isinstance(data, six.text_type):
+            data = data.encode("utf8")
+        self._oop.writeFile(tmp_path, data)
+        self._oop.fileUtils.fsyncPath(tmp_path)
+        self._oop.os.rename(tmp_path, self._path)
+        self._oop.fileUtils.fsyncPath(os.path.dirname(self._path))
+
+    def _load(self):
+        try:
+            data = self._oop.readFile(self._path)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        self._live = json.loads(data.decode("utf8"))
+        log.debug("Loaded journal %s (%d records)",
+                  self._path, len(self._live))
+
+
+def _apply(live, changes):
+    for key, value in changes:
+        if value is None:
+            live.pop(key, None)
+        else:
+            live[key] = value
@@ -24,7 +24,9 @@ import errno
 import logging
 import os
 import re
+import select
 import stat
+import threading
 
 from collections import namedtuple
 
@@ -116,14 +118,14 @@ def _resolveLoopDevice(path):
     return path
 
 
-def _iterKnownMounts():
-    with open(_PROC_MOUNTS_PATH, "r") as f:
+def _iterKnownMounts(path):
+    with open(path, "r") as f:
         for line in f:
             yield _parseFstabLine(line)
 
 
-def _iterMountRecords():
-    for rec in _iterKnownMounts():
+def _iterMountRecords(path):
+    for rec in _iterKnownMounts(path):
         realSpec = _resolveLoopDevice(rec.fs_spec)
         if rec.fs_spec == realSpec:
             yield rec
@@ -133,31 +135,123 @@ def _iterMountRecords():
                           rec.fs_mntops, rec.fs_freq, rec.fs_passno)
 
 
+class _MountTable(object):
+    """
+    Cache of the mount records in path, indexed by mount point and by
+    (source, mount point).
+
+    The kernel reports a change in the mount table of the process by
+    signaling POLLPRI and POLLERR on open mounts files. The cache keeps such
+    file open, and reloads the records only when poll() reports a change, or
+    after the table was invalidated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+        self._poller = None
+        self._stale = True
+        self._records = ()
+        self._by_file = {}
+        self._by_key = {}
+
+    def records(self):
+        self._refresh()
+        return self._records
+
+    def lookup_target(self, fs_file):
+        """
+        Return the first record mounted at fs_file, or None.
+        """
+        self._refresh()
+        return self._by_file.get(fs_file)
+
+    def lookup(self, fs_spec, fs_file):
+        """
+        Return the record mounting fs_spec at fs_file, or None.
+        """
+        self._refresh()
+        return self._by_key.get((fs_spec, fs_file))
+
+    def invalidate(self):
+        self._stale = True
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                self._poller = None
+            self._stale = True
+
+    def _refresh(self):
+        with self._lock:
+            if self._fd is None:
+                self._open()
+            # Check for a change before reading; a change during the read
+            # will be reported by the next poll.
+            if self._poller.poll(0):
+                self._stale = True
+            if not self._stale:
+                return
+            self._stale = False
+            try:
+                self._load()
+            except Exception:
+                self._stale = True
+                raise
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDONLY)
+        self._poller = select.poll()
+        self._poller.register(self._fd, select.POLLPRI)
+        self._stale = True
+
+    def _load(self):
+        records = tuple(_iterMountRecords(self.path))
+        by_file = {}
+        by_key = {}
+        for rec in records:
+            by_file.setdefault(rec.fs_file, rec)
+            by_key.setdefault((rec.fs_spec, rec.fs_file), rec)
+        self._records = records
+        self._by_file = by_file
+        self._by_key = by_key
+
+
+_mount_table = None
+_mount_table_lock = threading.Lock()
+
+
+def _mountTable():
+    global _mount_table
+    with _mount_table_lock:
+        if _mount_table is None or _mount_table.path != _PROC_MOUNTS_PATH:
+            if _mount_table is not None:
+                _mount_table.close()
+            _mount_table = _MountTable(_PROC_MOUNTS_PATH)
+        return _mount_table
+
+
 def iterMounts():
-    for record in _iterMountRecords():
+    for record in _mountTable().records():
         yield Mount(record.fs_spec, record.fs_file)
 
 
 def isMounted(target):
     """Checks if a target is mounted at least once"""
-    try:
-        getMountFromTarget(target)
-        return True
-    except OSError as ex:
-        if ex.errno == errno.ENOENT:
-            return False
-        raise
+    return _mountTable().lookup_target(target) is not None
 
 
 def getMountFromTarget(target):
     """
     The given target should be normalized.
     """
-    for rec in _iterMountRecords():
-        if rec.fs_file == target:
-            return Mount(rec.fs_spec, rec.fs_file)
-
-    raise OSError(errno.ENOENT, 'Mount target %s not found' % target)
+    rec = _mountTable().lookup_target(target)
+    if rec is None:
+        raise OSError(errno.ENOENT, 'Mount target %s not found' % target)
+    return Mount(rec.fs_spec, rec.fs_file)
 
 
 class Mount(object):
@@ -186,16 +280,22 @@ class Mount(object):
         mount = supervdsm.getProxy().mount if os.geteuid() != 0 else _mount
         self.log.info("mounting %s at %s", self.fs_spec, self.fs_file)
         with utils.stopwatch("%s mounted" % self.fs_file, log=self.log):
-            mount(self.fs_spec, self.fs_file, mntOpts=mntOpts, vfstype=vfstype,
-                  timeout=timeout, cgroup=cgroup)
+            try:
+                mount(self.fs_spec, self.fs_file, mntOpts=mntOpts,
+                      vfstype=vfstype, timeout=timeout, cgroup=cgroup)
+            finally:
+                _mountTable().invalidate()
         self._wait_for_events()
 
     def umount(self, force=False, lazy=False, freeloop=False, timeout=None):
         umount = supervdsm.getProxy().umount if os.geteuid() != 0 else _umount
         self.log.info("unmounting %s", self.fs_file)
         with utils.stopwatch("%s unmounted" % self.fs_file, log=self.log):
-            umount(self.fs_file, force=force, lazy=lazy, freeloop=freeloop,
-                   timeout=timeout)
+            try:
+                umount(self.fs_file, force=force, lazy=lazy,
+                       freeloop=freeloop, timeout=timeout)
+            finally:
+                _mountTable().invalidate()
         self._wait_for_events()
 
     def _wait_for_events(self):
@@ -228,8 +328,10 @@ class Mount(object):
         else:
             fs_specs = self.fs_spec, None
 
-        for record in _iterMountRecords():
-            if self.fs_file == record.fs_file and record.fs_spec in fs_specs:
+        table = _mountTable()
+        for fs_spec in fs_specs:
+            record = table.lookup(fs_spec, self.fs_file)
+            if record is not None:
                 return record
 
         raise OSError(errno.ENOENT,
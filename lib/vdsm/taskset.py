@@ -20,60 +20,89 @@
 
 from __future__ import absolute_import
 
-from . import cmdutils
-from . import constants
-from . import commands
+import ctypes
+import errno
+import os
 
 
 AUTOMATIC = "auto"
 
 _SYS_ONLINE_CPUS = "/sys/devices/system/cpu/online"
+_PROC_TASKS = "/proc/%d/task"
+
+_MASK_BITS = 8 * ctypes.sizeof(ctypes.c_ulong)
+# Enough for the kernel default NR_CPUS (8192). The mask is grown if the
+# kernel reports a larger cpu set.
+_MASK_WORDS = 8192 // _MASK_BITS
+
+_libc = ctypes.CDLL("libc.so.6", use_errno=True)
+
+# (raw content of _SYS_ONLINE_CPUS, parsed frozenset)
+_online_cpus = (None, None)
 
 
 def get(pid):
     """
-    Get the affinity of a process, by its <pid>, using taskset command.
+    Get the affinity of a process, by its <pid>, using sched_getaffinity.
     We assume all threads of the process have the same affinity, because
     this is the only usecase VDSM cares about - and requires.
     Return a frozenset of ints, each one being a cpu indices on which the
     process can run.
     Example: frozenset([0, 1, 2, 3])
-    Raise cmdutils.Error on failure.
+    Raise OSError on failure.
     """
-    command = [constants.EXT_TASKSET, '--pid', str(pid)]
+    pid = int(pid)
+    if hasattr(os, 'sched_getaffinity'):
+        return frozenset(os.sched_getaffinity(pid))
 
-    rc, out, err = commands.execCmd(command, resetCpuAffinity=False)
+    words = _MASK_WORDS
+    while True:
+        mask = (ctypes.c_ulong * words)()
+        if _libc.sched_getaffinity(pid, ctypes.sizeof(mask), mask) == 0:
+            break
+        e = ctypes.get_errno()
+        if e != errno.EINVAL:
+            raise OSError(e, os.strerror(e))
+        # The kernel cpu set is larger than the mask.
+        words *= 2
 
-    if rc != 0:
-        raise cmdutils.Error(command, rc, out, err)
-
-    return _cpu_set_from_output(out[-1])
+    return frozenset(cpu for cpu in range(words * _MASK_BITS)
+                     if mask[cpu // _MASK_BITS] & (1 << (cpu % _MASK_BITS)))
 
 
 def set(pid, cpu_set, all_tasks=False):
     """
-    Set the affinity of a process, by its <pid>, using taskset command.
+    Set the affinity of a process, by its <pid>, using sched_setaffinity.
     if all_tasks evaluates to True, set the affinity for all threads of
     the target process.
     <cpu_set> must be an iterable whose items are ints which represent
     cpu indices, on which the process will be allowed to run; the format
     is the same as what the get() function returns.
-    Raise cmdutils.Error on failure.
+    Raise OSError on failure.
     """
-    command = [constants.EXT_TASKSET]
-    if all_tasks:
-        command.append("--all-tasks")
-
-    command.extend((
-                   '--pid',
-                   '--cpu-list', ','.join(str(i) for i in cpu_set),
-                   str(pid)
-                   ))
-
-    rc, out, err = commands.execCmd(command, resetCpuAffinity=False)
-
-    if rc != 0:
-        raise cmdutils.Error(command, rc, out, err)
+    pid = int(pid)
+    cpus = frozenset(int(cpu) for cpu in cpu_set)
+
+    if not all_tasks:
+        _set_affinity(pid, cpus)
+        return
+
+    # Threads started while we set the affinity may inherit the old one
+    # from their creator, so repeat until there are no new threads.
+    done = frozenset()
+    while True:
+        tids = frozenset(int(tid) for tid in
+                         os.listdir(_PROC_TASKS % pid)) - done
+        if not tids:
+            break
+        for tid in tids:
+            try:
+                _set_affinity(tid, cpus)
+            except OSError as e:
+                # The thread has exited.
+                if e.errno != errno.ESRCH or tid == pid:
+                    raise
+        done |= tids
 
 
 def online_cpus():
@@ -81,8 +110,16 @@ def online_cpus():
     Return a frozenset which contains identifiers of online CPUs,
     as non-negative integers.
     """
+    global _online_cpus
     with open(_SYS_ONLINE_CPUS, 'r') as src:
-        return _cpulist_parse(src.readline())
+        raw = src.readline()
+    # The content is parsed again only when cpus are brought online or
+    # offline.
+    last_raw, cpus = _online_cpus
+    if raw != last_raw:
+        cpus = _cpulist_parse(raw)
+        _online_cpus = (raw, cpus)
+    return cpus
 
 
 def pick_cpu(cpu_set):
@@ -95,15 +132,17 @@ def pick_cpu(cpu_set):
     return cpu_list[:2][-1]
 
 
-def _cpu_set_from_output(line):
-    """
-    Parse the output of taskset, in the format
-    pid ${PID}'s current affinity mask: ${HEXMASK}
-    and return a list of strings, each one being is a cpu index.
-    """
-    hexmask = line.decode().rsplit(":", 1)[1].strip()
-    mask = int(hexmask, 16)
-    return frozenset(i for i in range(mask.bit_length()) if mask & (1 << i))
+def _set_affinity(tid, cpus):
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(tid, cpus)
+        return
+
+    mask = (ctypes.c_ulong * (max(cpus) // _MASK_BITS + 1))()
+    for cpu in cpus:
+        mask[cpu // _MASK_BITS] |= 1 << (cpu % _MASK_BITS)
+    if _libc.sched_setaffinity(tid, ctypes.sizeof(mask), mask) == -1:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
 
 
 def _cpulist_parse(cpu_range):
@@ -52,7 +52,6 @@ import threading
 import time
 import weakref
 
-from vdsm.common import zombiereaper
 
 try:
     from ovirt.node.utils.fs import Config
@@ -594,7 +593,7 @@ class AsyncProcessOperation(object):
 
     def __del__(self):
         if self._proc.returncode is None:
-            zombiereaper.autoReapPID(self._proc.pid)
+            self._proc.auto_reap()
 
 
 @memoized
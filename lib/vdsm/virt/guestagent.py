@@ -85,19 +85,21 @@ def _filterXmlChars(u):
     return _filter_chars_re.sub(_REPLACEMENT_CHAR, u)
 
 
-def _filterObject(obj):
+def _filterValue(value):
+    if isinstance(value, unicode):
+        return _filterXmlChars(value)
+    elif isinstance(value, list):
+        return [_filterValue(item) for item in value]
+    return value
+
+
+def _filterPairs(pairs):
     """
-    Apply _filterXmlChars on every string in the json response object
+    json object_pairs_hook applying _filterXmlChars on every string in the
+    object while it is decoded. Nested objects were already filtered when
+    they were decoded.
     """
-    def filt(o):
-        if isinstance(o, dict):
-            return {filt(k): filt(v) for k, v in o.iteritems()}
-        elif isinstance(o, list):
-            return [filt(i) for i in o]
-        elif isinstance(o, basestring):
-            return _filterXmlChars(o)
-        return o
-    return filt(obj)
+    return {_filterXmlChars(k): _filterValue(v) for k, v in pairs}
 
 
 def _create_socket():
@@ -176,6 +178,7 @@ class GuestAgent(object):
             'disksUsage': [],
             'netIfaces': [],
             'memoryStats': {}}
+        self._updateGuestInfoSnapshot()
         self._agentTimestamp = 0
         self._channelListener = channelListener
         self._messageState = MessageState.NORMAL
@@ -425,6 +428,7 @@ class GuestAgent(object):
             self._on_completion(args.pop('reply_id', None))
         else:
             self.log.error('Unknown message type %s', message)
+        self._updateGuestInfoSnapshot()
 
     def stop(self):
         self.log.info("Stopping connection")
@@ -447,23 +451,32 @@ class GuestAgent(object):
         return self.guestStatus
 
     def getGuestInfo(self):
+        """
+        Return the guest info snapshot shared by all callers. The snapshot is
+        replaced when the guest info is updated, and must not be modified.
+        """
         if self.isResponsive():
-            return utils.picklecopy(self.guestInfo)
+            return self._guestInfoSnapshot
         else:
             return {
                 'username': 'Unknown',
                 'session': 'Unknown',
                 'memUsage': 0,
                 'guestCPUCount': -1,
-                'appsList': self.guestInfo['appsList'],
-                'guestIPs': self.guestInfo['guestIPs'],
-                'guestFQDN': self.guestInfo['guestFQDN']}
+                'appsList': self._guestInfoSnapshot['appsList'],
+                'guestIPs': self._guestInfoSnapshot['guestIPs'],
+                'guestFQDN': self._guestInfoSnapshot['guestFQDN']}
+
+    def _updateGuestInfoSnapshot(self):
+        # Copied once per update instead of once per getGuestInfo() call.
+        self._guestInfoSnapshot = utils.picklecopy(self.guestInfo)
 
     def onReboot(self):
         self.guestStatus = vmstatus.REBOOT_IN_PROGRESS
         self.guestInfo['lastUser'] = '' + self.guestInfo['username']
         self.guestInfo['username'] = 'Unknown'
         self.guestInfo['lastLogout'] = time.time()
+        self._updateGuestInfoSnapshot()
 
     def desktopLock(self):
         try:
@@ -528,6 +541,7 @@ class GuestAgent(object):
 
     def _onChannelTimeout(self):
         self.guestInfo['memUsage'] = 0
+        self._updateGuestInfoSnapshot()
         if self.guestStatus not in (vmstatus.POWERING_DOWN,
                                     vmstatus.REBOOT_IN_PROGRESS):
             self.log.log(logging.TRACE, "Guest connection timed out")
@@ -546,19 +560,28 @@ class GuestAgent(object):
             self.log.error("%s: %s" % (err, repr(line)))
 
     def _handleData(self, data):
-        while (not self._stopped) and '\n' in data:
-            line, data = data.split('\n', 1)
-            line = ''.join(self._buffer) + line
-            self._clearReadBuffer()
+        # Only the new data is scanned for the end of a message; the data of
+        # an incomplete message is kept in the buffer until its end arrives.
+        start = 0
+        end = data.find('\n')
+        while (not self._stopped) and end != -1:
+            line = data[start:end]
+            if self._buffer:
+                line = ''.join(self._buffer) + line
+                self._clearReadBuffer()
             if self._messageState is MessageState.TOO_BIG:
                 self._messageState = MessageState.NORMAL
                 self.log.warning("Not processing current message because it "
                                  "was too big")
             else:
                 self._processMessage(line)
+            start = end + 1
+            end = data.find('\n', start)
 
-        self._buffer.append(data)
-        self._bufferSize += len(data)
+        if start < len(data):
+            data = data[start:]
+            self._buffer.append(data)
+            self._bufferSize += len(data)
 
         if self._bufferSize >= self.MAX_MESSAGE_SIZE:
             self.log.warning("Discarding buffer with size: %d because the "
@@ -591,12 +614,11 @@ class GuestAgent(object):
         # Deal with any bad UTF8 encoding from the (untrusted) guest,
         # by replacing them with the Unicode replacement character
         uniline = line.decode('utf8', 'replace')
-        args = json.loads(uniline)
         # Filter out any characters in the untrusted guest response
-        # that aren't permitted in XML.  This must be done _after_ the
+        # that aren't permitted in XML.  This must be done _while_
         # JSON decoding, since otherwise JSON's \u escape decoding
         # could be used to generate the bad characters
-        args = _filterObject(args)
+        args = json.loads(uniline, object_pairs_hook=_filterPairs)
         name = args['__name__']
         del args['__name__']
         return (name, args)
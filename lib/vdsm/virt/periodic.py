@@ -31,6 +31,7 @@ import libvirt
 from vdsm import executor
 from vdsm import host
 from vdsm import libvirtconnection
+from vdsm import numa
 from vdsm.config import config
 from vdsm.virt import sampling
 from vdsm.virt import virdomain
@@ -67,27 +68,32 @@ def start(cif, scheduler):
                                   max_workers=_MAX_WORKERS)
     _executor.start()
 
-    def per_vm_operation(func, period):
+    def per_vm_operation(func, period, priority=executor.PRIORITY_NORMAL):
         disp = VmDispatcher(
-            cif.getVMs, _executor, func, _timeout_from(period))
+            cif.getVMs, _executor, func, _timeout_from(period), priority)
         return Operation(disp, period, scheduler)
 
     _operations = [
         # Needs dispatching because updating the volume stats needs
-        # access to the storage, thus can block.
+        # access to the storage, thus can block. Low priority since it is
+        # slow and nothing urgent depends on it.
         per_vm_operation(
             UpdateVolumes,
-            config.getint('irs', 'vol_size_sample_interval')),
+            config.getint('irs', 'vol_size_sample_interval'),
+            executor.PRIORITY_LOW),
 
-        # Needs dispatching because it accesses FS and libvirt data.
-        per_vm_operation(
-            NumaInfoMonitor,
-            config.getint('vars', 'vm_sample_numa_interval')),
+        # Accesses only FS data, using a single supervdsm call for all the
+        # VMs, thus does not need dispatching.
+        Operation(
+            NumaInfoMonitor(cif.getVMs),
+            config.getint('vars', 'vm_sample_numa_interval'),
+            scheduler),
 
         # Job monitoring need QEMU monitor access.
         per_vm_operation(
             BlockjobMonitor,
-            config.getint('vars', 'vm_sample_jobs_interval')),
+            config.getint('vars', 'vm_sample_jobs_interval'),
+            executor.PRIORITY_HIGH),
 
         # libvirt sampling using bulk stats can block, but unresponsive
         # domains are handled inside VMBulkSampler for performance reasons;
@@ -100,12 +106,14 @@ def start(cif, scheduler):
             config.getint('vars', 'vm_sample_interval'),
             scheduler),
 
-        # We do this only until we get high water mark notifications
-        # from QEMU. It accesses storage and/or QEMU monitor, so can block,
-        # thus we need dispatching.
+        # When libvirt reports block threshold events, this checks only
+        # drives which exceeded their threshold or have no threshold set,
+        # and all drives once in vm_watermark_safety_interval. It accesses
+        # storage and/or QEMU monitor, so can block, thus we need dispatching.
         per_vm_operation(
             DriveWatermarkMonitor,
-            config.getint('vars', 'vm_watermark_interval')),
+            config.getint('vars', 'vm_watermark_interval'),
+            executor.PRIORITY_HIGH),
 
         Operation(
             sampling.HostMonitor(cif=cif),
@@ -127,6 +135,22 @@ def stop():
     _executor.stop(wait=False)
 
 
+def monitor_drives(vm):
+    """
+    Check the drives of vm as soon as possible, instead of waiting for the
+    next periodic cycle.
+    """
+    if _executor is None:
+        return
+    op = DriveWatermarkMonitor(vm)
+    timeout = _timeout_from(config.getint('vars', 'vm_watermark_interval'))
+    try:
+        _executor.dispatch(op, timeout, executor.PRIORITY_HIGH)
+    except (executor.TooManyTasks, executor.NotRunning):
+        # The next periodic cycle will check the drives.
+        vm.log.warning("could not dispatch drive monitoring")
+
+
 class Operation(object):
     """
     Operation runs a callable with a given period until
@@ -226,7 +250,8 @@ class VmDispatcher(object):
 
     _log = logging.getLogger("virt.periodic.VmDispatcher")
 
-    def __init__(self, get_vms, executor, create, timeout):
+    def __init__(self, get_vms, executor, create, timeout,
+                 priority=executor.PRIORITY_NORMAL):
         """
         get_vms: callable which will return a dict which maps
                  vm_ids to vm_instances
@@ -235,11 +260,13 @@ class VmDispatcher(object):
                 dispatch, with its timeout
         timeout: per-vm operation timeout, in seconds
                  (fractions allowed).
+        priority: per-vm operation priority, see Executor.dispatch
         """
         self._get_vms = get_vms
         self._executor = executor
         self._create = create
         self._timeout = timeout
+        self._priority = priority
 
     def __call__(self):
         vms = self._get_vms()
@@ -267,7 +294,8 @@ class VmDispatcher(object):
                 self._log.exception("while dispatching %s", op)
             else:
                 try:
-                    self._executor.dispatch(op, self._timeout)
+                    self._executor.dispatch(op, self._timeout,
+                                            self._priority)
                 except executor.TooManyTasks:
                     skipped.append(vm_id)
 
@@ -341,21 +369,26 @@ class UpdateVolumes(_RunnableOnVm):
             self._vm.updateDriveVolume(drive)
 
 
-class NumaInfoMonitor(_RunnableOnVm):
+class NumaInfoMonitor(object):
+    """
+    Update the NUMA runtime info of all the VMs with guest NUMA nodes in one
+    pass.
+    """
 
-    @property
-    def required(self):
-        return (super(NumaInfoMonitor, self).required and
-                self._vm.hasGuestNumaNode)
+    def __init__(self, get_vms):
+        self._get_vms = get_vms
 
-    @property
-    def runnable(self):
-        # NUMA operations don't require QEMU monitor access
-        # (inspected libvirt sources v1.2.17)
-        return True
+    def __call__(self):
+        vms = [vm for vm in self._get_vms().itervalues()
+               if vm.monitorable and vm.hasGuestNumaNode]
+        if not vms:
+            return
+        vms_info = numa.getVmsNumaNodeRuntimeInfo(vms)
+        for vm in vms:
+            vm.updateNumaInfo(vms_info.get(vm.id, {}))
 
-    def _execute(self):
-        self._vm.updateNumaInfo()
+    def __repr__(self):
+        return '<%s at 0x%x>' % (self.__class__.__name__, id(self))
 
 
 class BlockjobMonitor(_RunnableOnVm):
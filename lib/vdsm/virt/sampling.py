@@ -39,6 +39,7 @@ from vdsm.constants import P_VDSM_RUN, P_VDSM_CLIENT_LOG
 from vdsm.host import api as hostapi
 from vdsm.network import ipwrapper
 from vdsm.network.netinfo import nics, bonding, vlans
+from vdsm.network.netlink import link as nl_link
 from vdsm.virt import vmstats
 from vdsm.virt.utils import ExpiringCache
 
@@ -53,55 +54,20 @@ class InterfaceSample(object):
     """
     A network interface sample.
 
-    The sample is set at the time of initialization and can't be updated.
+    The sample is set at the time of initialization and can't be updated. The
+    link must be taken with its stats, see ipwrapper.getLinks().
     """
-    def readIfaceStat(self, ifid, stat):
-        """
-        Get and interface's stat.
-
-        .. note::
-            Really ugly implementation; from time to time, Linux returns an
-            empty line. TODO: understand why this happens and fix it!
-
-        :param ifid: The ID of the interface you want to query.
-        :param stat: The type of statistic you want get.
-
-        :returns: The value of the statistic you asked for.
-        :type: int
-        """
-        f = '/sys/class/net/%s/statistics/%s' % (ifid, stat)
-        tries = 5
-        while tries:
-            tries -= 1
-            try:
-                with open(f) as fi:
-                    s = fi.read()
-            except IOError as e:
-                # silently ignore missing wifi stats
-                if e.errno != errno.ENOENT:
-                    logging.debug("Could not read %s", f, exc_info=True)
-                return 0
-            try:
-                return int(s)
-            except:
-                if s != '':
-                    logging.warning("Could not parse statistics (%s) from %s",
-                                    f, s, exc_info=True)
-                logging.debug('bad %s: (%s)', f, s)
-                if not tries:
-                    raise
-
     def __init__(self, link):
-        ifid = link.name
-        self.rx = self.readIfaceStat(ifid, 'rx_bytes')
-        self.tx = self.readIfaceStat(ifid, 'tx_bytes')
-        self.rxDropped = self.readIfaceStat(ifid, 'rx_dropped')
-        self.txDropped = self.readIfaceStat(ifid, 'tx_dropped')
-        self.rxErrors = self.readIfaceStat(ifid, 'rx_errors')
-        self.txErrors = self.readIfaceStat(ifid, 'tx_errors')
-        self.operstate = 'up' if link.oper_up else 'down'
+        stats = link.stats
+        self.rx = stats['rx_bytes']
+        self.tx = stats['tx_bytes']
+        self.rxDropped = stats['rx_dropped']
+        self.txDropped = stats['tx_dropped']
+        self.rxErrors = stats['rx_errors']
+        self.txErrors = stats['tx_errors']
+        self.operstate = 'up' if link.flags & nl_link.IFF_RUNNING else 'down'
         self.speed = _getLinkSpeed(link)
-        self.duplex = _getDuplex(ifid)
+        self.duplex = _getDuplex(link)
 
     _LOGGED_ATTRS = ('operstate', 'speed', 'duplex')
 
@@ -203,7 +169,7 @@ class TimedSample(object):
 
 def _get_interfaces_and_samples():
     links_and_samples = {}
-    for link in ipwrapper.getLinks():
+    for link in ipwrapper.getLinks(stats=True):
         try:
             links_and_samples[link.name] = InterfaceSample(link)
         except IOError as e:
@@ -625,11 +591,16 @@ def _getLinkSpeed(dev):
     return speed
 
 
-def _getDuplex(ifid):
+def _getDuplex(dev):
     """Return whether a device is connected in full-duplex. Return 'unknown' if
     duplex state is not known"""
+    # Like the speed, the duplex is not reported by netlink. Only devices
+    # reporting speed are checked, to avoid reading sysfs for every tap and
+    # bridge on every sample.
+    if not (dev.isNIC() or dev.isBOND() or dev.isVLAN()):
+        return 'unknown'
     try:
-        with open('/sys/class/net/%s/duplex' % ifid) as src:
+        with open('/sys/class/net/%s/duplex' % dev.name) as src:
             return src.read().strip()
     except IOError:
         return 'unknown'
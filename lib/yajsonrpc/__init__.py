@@ -279,7 +279,9 @@ class _JsonRpcServeRequestContext(object):
             return
 
         encodedObjects = []
+        response_ids = []
         for response in self._responses:
+            response_ids.append(response.id)
             try:
                 encodedObjects.append(response.encode())
             except:  # Error encoding data
@@ -292,7 +294,9 @@ class _JsonRpcServeRequestContext(object):
         else:
             data = '[' + ','.join(encodedObjects) + ']'
 
-        self._client.send(data.encode('utf-8'))
+        # The transport routes the reply using the response ids, so it does
+        # not have to decode it again.
+        self._client.send_response(data.encode('utf-8'), response_ids)
 
     def addResponse(self, response):
         self._responses.append(response)
@@ -448,6 +452,9 @@ class JsonRpcClient(object):
 
     stop = close
 
+    def is_closed(self):
+        return self._transport.is_closed()
+
     def registerEventCallback(self, eventcb):
         self._eventcbs.append(ref(eventcb))
 
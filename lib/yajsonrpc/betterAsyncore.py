@@ -19,11 +19,15 @@
 from __future__ import absolute_import
 import asyncore
 import errno
+import heapq
 import logging
+import select
 import socket
+import threading
 
 from vdsm.common.eventfd import EventFD
 from vdsm.sslcompat import sslutils
+from vdsm.utils import monotonic_time
 
 
 _BLOCKING_IO_ERRORS = (errno.EAGAIN, errno.EALREADY, errno.EINPROGRESS,
@@ -189,48 +193,217 @@ class AsyncoreEvent(asyncore.file_dispatcher):
         asyncore.file_dispatcher.close(self)
 
 
+class _ChannelMap(dict):
+    """
+    Dispatchers map notifying the reactor when dispatchers are added and
+    removed by asyncore.
+    """
+
+    def __init__(self, reactor):
+        dict.__init__(self)
+        self._reactor = reactor
+
+    def __setitem__(self, fd, dispatcher):
+        dict.__setitem__(self, fd, dispatcher)
+        self._reactor._channel_added(fd)
+
+    def __delitem__(self, fd):
+        dict.__delitem__(self, fd)
+        self._reactor._channel_removed(fd)
+
+    def clear(self):
+        for fd in self.keys():
+            del self[fd]
+
+
 class Reactor(object):
     """
     map dictionary maps sock.fileno() to channels to watch. We add channels to
     it by running add_dispatcher and removing by remove_dispatcher.
-    It is used by asyncore loop to know which channels events to track.
+
+    The channels are kept in a persistent epoll set. The readable and writable
+    state of a dispatcher is checked only when the dispatcher was added, had
+    an event, reached the time returned by its next_check_interval, or when
+    the reactor was woken up for it.
 
     We use eventfd as mechanism to trigger processing when needed.
     """
 
+    _MAX_TIMEOUT = 30.0
+
     def __init__(self):
-        self._map = {}
+        self._lock = threading.Lock()
+        self._poller = select.epoll()
+        # fd -> registered events mask
+        self._registered = {}
+        # fds of dispatchers that need to be checked
+        self._dirty = set()
+        # heap of (deadline, fd)
+        self._deadlines = []
+        # fd -> earliest deadline
+        self._deadline = {}
+        self._map = _ChannelMap(self)
         self._is_running = False
+        self._thread = None
         self._wakeupEvent = AsyncoreEvent(self._map)
 
     def create_dispatcher(self, sock, impl=None):
         return Dispatcher(impl=impl, sock=sock, map=self._map)
 
     def process_requests(self):
+        self._thread = threading.current_thread()
         self._is_running = True
         while self._is_running:
-            asyncore.loop(
-                timeout=self._get_timeout(self._map),
-                use_poll=True,
-                map=self._map,
-                count=1,
-            )
+            self._process_once()
 
         for dispatcher in self._map.values():
             dispatcher.close()
 
         self._map.clear()
+        self._poller.close()
+
+    def _process_once(self):
+        self._update_channels()
 
-    def _get_timeout(self, map):
-        timeout = 30.0
-        for disp in self._map.values():
-            if hasattr(disp, "next_check_interval"):
-                interval = disp.next_check_interval()
-                if interval is not None and interval >= 0:
-                    timeout = min(interval, timeout)
-        return timeout
+        try:
+            events = self._poller.poll(self._get_timeout())
+        except IOError as e:
+            if e.errno != errno.EINTR:
+                raise
+            events = ()
+
+        for fd, flags in events:
+            obj = self._map.get(fd)
+            if obj is None:
+                continue
+            asyncore.readwrite(obj, flags)
+            self._check(fd)
+
+        self._expire_deadlines()
+
+    def _get_timeout(self):
+        while self._deadlines:
+            deadline, fd = self._deadlines[0]
+            if self._deadline.get(fd) == deadline:
+                return min(max(deadline - monotonic_time(), 0),
+                           self._MAX_TIMEOUT)
+            heapq.heappop(self._deadlines)
+        return self._MAX_TIMEOUT
+
+    def _expire_deadlines(self):
+        now = monotonic_time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, fd = heapq.heappop(self._deadlines)
+            if self._deadline.get(fd) == deadline:
+                del self._deadline[fd]
+                self._check(fd)
+
+    def _update_channels(self):
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = set()
+
+        for fd in dirty:
+            obj = self._map.get(fd)
+            if obj is not None:
+                self._update_channel(fd, obj)
+
+    def _update_channel(self, fd, obj):
+        # Like asyncore.poll2. Note that readable() and writable() may close
+        # the dispatcher.
+        flags = 0
+        if obj.readable():
+            flags |= select.EPOLLIN | select.EPOLLPRI
+        if obj.writable() and not obj.accepting:
+            flags |= select.EPOLLOUT
+        if flags:
+            flags |= select.EPOLLERR | select.EPOLLHUP
+
+        interval = None
+        if hasattr(obj, "next_check_interval"):
+            interval = obj.next_check_interval()
+
+        with self._lock:
+            if self._map.get(fd) is not obj:
+                return
+
+            self._register(fd, flags)
+
+            if interval is not None and interval >= 0:
+                deadline = monotonic_time() + interval
+                # A later deadline is handled when the current one expires.
+                if fd not in self._deadline or deadline < self._deadline[fd]:
+                    self._deadline[fd] = deadline
+                    heapq.heappush(self._deadlines, (deadline, fd))
+
+    def _register(self, fd, flags):
+        """
+        Must be called when holding self._lock.
+        """
+        current = self._registered.get(fd)
+        if flags == current:
+            return
+
+        if not flags:
+            self._unregister(fd)
+            return
 
-    def wakeup(self):
+        if current is None:
+            try:
+                self._poller.register(fd, flags)
+            except IOError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                self._poller.modify(fd, flags)
+        else:
+            try:
+                self._poller.modify(fd, flags)
+            except IOError as e:
+                # The previous file using this fd was closed.
+                if e.errno != errno.ENOENT:
+                    raise
+                self._poller.register(fd, flags)
+        self._registered[fd] = flags
+
+    def _unregister(self, fd):
+        """
+        Must be called when holding self._lock.
+        """
+        if self._registered.pop(fd, None) is not None:
+            try:
+                self._poller.unregister(fd)
+            except (IOError, ValueError):
+                # Already closed
+                pass
+
+    def _check(self, fd):
+        with self._lock:
+            self._dirty.add(fd)
+
+    def _channel_added(self, fd):
+        self._check(fd)
+        # Channels added by the reactor thread are checked in the next loop
+        # iteration, others must wake up the reactor.
+        if self._is_running and threading.current_thread() is not self._thread:
+            self._wakeupEvent.set()
+
+    def _channel_removed(self, fd):
+        # Unregister now, before asyncore closes the socket.
+        with self._lock:
+            self._dirty.discard(fd)
+            self._deadline.pop(fd, None)
+            self._unregister(fd)
+
+    def wakeup(self, dispatcher=None):
+        """
+        Wake up the reactor to check dispatchers state modified from other
+        threads. If dispatcher is specified, only this dispatcher is checked.
+        """
+        if dispatcher is None:
+            for fd in self._map.keys():
+                self._check(fd)
+        elif dispatcher._fileno is not None:
+            self._check(dispatcher._fileno)
         self._wakeupEvent.set()
 
     def stop(self):
@@ -133,6 +133,52 @@ class Frame(object):
         return Frame(self.command, self.headers.copy(), self.body)
 
 
+class SharedMessage(object):
+    """
+    A MESSAGE frame sent to several subscriptions.
+
+    The common headers and the body are encoded once, only the subscription
+    header is encoded for each subscription.
+    """
+    __slots__ = ("_head", "_tail")
+
+    def __init__(self, destination, body, content_type="application/json"):
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+
+        self._head = ''.join([
+            Command.MESSAGE, '\n',
+            Headers.DESTINATION, ':', encodeValue(destination), '\n',
+            Headers.CONTENT_TYPE, ':', encodeValue(content_type), '\n',
+            Headers.CONTENT_LENGTH, ':', str(len(body)), '\n',
+            Headers.SUBSCRIPTION, ':',
+        ])
+        self._tail = ''.join(['\n\n', body, '\0'])
+
+    def frame(self, subscription_id):
+        return _SubscriptionFrame(self, subscription_id)
+
+    def encode(self, subscription_id):
+        return ''.join([self._head, encodeValue(subscription_id), self._tail])
+
+
+class _SubscriptionFrame(object):
+    __slots__ = ("_message", "_subscription_id")
+
+    command = Command.MESSAGE
+
+    def __init__(self, message, subscription_id):
+        self._message = message
+        self._subscription_id = subscription_id
+
+    def encode(self):
+        return self._message.encode(self._subscription_id)
+
+    def __repr__(self):
+        return "<StompFrame command=%s subscription=%s>" % (
+            repr(self.command), repr(self._subscription_id))
+
+
 def decodeValue(s):
     # Make sure to leave this check before decoding as ':' can appear in the
     # value after decoding using \c
@@ -277,7 +277,7 @@ class _StompConnection(object):
 
     def send_raw(self, msg):
         self._async_client.queue_frame(msg)
-        self._reactor.wakeup()
+        self._reactor.wakeup(self._dispatcher)
 
     def setTimeout(self, timeout):
         self._dispatcher.socket.settimeout(timeout)
@@ -325,16 +325,6 @@ class StompServer(object):
     Sends message to all subscribes that subscribed to destination.
     """
     def send(self, message, destination=stomp.LEGACY_SUBSCRIPTION_ID_RESPONSE):
-        resp = json.loads(message)
-        response_id = resp.get("id")
-
-        try:
-            destination = self._req_dest[response_id]
-            del self._req_dest[response_id]
-        except KeyError:
-            # we could have no reply-to or we could send events (no message id)
-            pass
-
         try:
             connections = self._sub_map[destination]
         except KeyError:
@@ -342,19 +332,31 @@ class StompServer(object):
                           destination)
             return
 
+        # The frame is encoded once for all the subscribers.
+        shared = stomp.SharedMessage(destination, message)
         for connection in connections:
-            res = stomp.Frame(
-                stomp.Command.MESSAGE,
-                {
-                    stomp.Headers.DESTINATION: destination,
-                    stomp.Headers.CONTENT_TYPE: "application/json",
-                    stomp.Headers.SUBSCRIPTION: connection.id
-                },
-                message
-            )
             # we need to check whether the channel is not closed
             if not connection.client.is_closed():
-                connection.client.send_raw(res)
+                connection.client.send_raw(shared.frame(connection.id))
+
+    def send_response(self, message, response_ids):
+        """
+        Sends a response to the destination requested by the client,
+        using the ids of the responses in message.
+        """
+        destination = stomp.LEGACY_SUBSCRIPTION_ID_RESPONSE
+        found = False
+        for response_id in response_ids:
+            try:
+                req_dest = self._req_dest.pop(response_id)
+            except KeyError:
+                # we could have no reply-to or the request had no id
+                continue
+            if not found:
+                destination = req_dest
+                found = True
+
+        self.send(message, destination)
 
 
 class StompClient(object):
@@ -401,7 +403,7 @@ class StompClient(object):
 
     def subscribe(self, *args, **kwargs):
         sub = self._aclient.subscribe(*args, **kwargs)
-        self._reactor.wakeup()
+        self._reactor.wakeup(self._stompConn._dispatcher)
         return sub
 
     def send(self, message, destination=stomp.LEGACY_SUBSCRIPTION_ID_RESPONSE,
@@ -412,13 +414,16 @@ class StompClient(object):
             message,
             headers
         )
-        self._reactor.wakeup()
+        self._reactor.wakeup(self._stompConn._dispatcher)
 
     def close(self):
         self._stompConn.close()
         if self._owns_reactor:
             self._reactor.stop()
 
+    def is_closed(self):
+        return self._stompConn.is_closed()
+
 
 def StompListener(reactor, server, acceptHandler, connected_socket):
     impl = StompListenerImpl(server, acceptHandler, connected_socket)
@@ -458,7 +463,7 @@ class StompReactor(object):
             acceptHandler,
             connected_socket
         )
-        self._reactor.wakeup()
+        self._reactor.wakeup(listener)
         return listener
 
     @property
@@ -519,6 +524,9 @@ class ServerRpcContextAdapter(object):
     def get_local_address(self, *args, **kwargs):
         return self._address
 
+    def send_response(self, data, response_ids):
+        self.send(data)
+
     def send(self, data):
         if self._reply_to:
             self._client.send(
@@ -565,6 +573,9 @@ class ClientRpcTransportAdapter(object):
         self._sub.unsubscribe()
         self._client.close()
 
+    def is_closed(self):
+        return self._client.is_closed()
+
 
 def StompRpcClient(stomp_client, request_queue, response_queue):
     return JsonRpcClient(
@@ -19,7 +19,8 @@
 # Refer to the README and COPYING files for full details of the license
 #
 import socket
-from contextlib import closing
+import time
+from contextlib import closing, contextmanager
 
 from vdsm import concurrent
 from yajsonrpc.betterAsyncore import AsyncoreEvent, Reactor
@@ -68,3 +69,131 @@ class TestReactor(TestCaseBase):
 
         self.assertTrue(disp.closing)
         self.assertFalse(reactor._wakeupEvent.closing)
+
+
+class Sender(object):
+
+    def __init__(self):
+        self.pending = b""
+
+    def readable(self, dispatcher):
+        return False
+
+    def writable(self, dispatcher):
+        return bool(self.pending)
+
+    def handle_write(self, dispatcher):
+        sent = dispatcher.send(self.pending)
+        self.pending = self.pending[sent:]
+
+
+class DelayedSender(Sender):
+
+    def __init__(self, data, delay):
+        Sender.__init__(self)
+        self._data = data
+        self._deadline = time.time() + delay
+
+    def writable(self, dispatcher):
+        if self._data and time.time() >= self._deadline:
+            self.pending, self._data = self._data, b""
+        return bool(self.pending)
+
+    def next_check_interval(self):
+        return 0.05 if self._data else None
+
+
+class Echo(object):
+
+    def __init__(self):
+        self.pending = b""
+
+    def readable(self, dispatcher):
+        return True
+
+    def writable(self, dispatcher):
+        return bool(self.pending)
+
+    def handle_read(self, dispatcher):
+        data = dispatcher.recv(4096)
+        if data:
+            self.pending += data
+
+    def handle_write(self, dispatcher):
+        sent = dispatcher.send(self.pending)
+        self.pending = self.pending[sent:]
+
+
+class TestReactorChannels(TestCaseBase):
+
+    def test_wakeup_dispatcher(self):
+        with self.running_reactor() as reactor:
+            s1, s2 = socket.socketpair()
+            with closing(s2):
+                impl = Sender()
+                disp = reactor.create_dispatcher(s1, impl=impl)
+                # Let the reactor check the idle dispatcher first.
+                time.sleep(0.1)
+                impl.pending = b"data"
+                reactor.wakeup(disp)
+                s2.settimeout(1)
+                self.assertEqual(s2.recv(4), b"data")
+
+    def test_next_check_interval(self):
+        with self.running_reactor() as reactor:
+            s1, s2 = socket.socketpair()
+            with closing(s2):
+                reactor.create_dispatcher(
+                    s1, impl=DelayedSender(b"data", 0.2))
+                s2.settimeout(1)
+                self.assertEqual(s2.recv(4), b"data")
+
+    def test_many_dispatchers(self):
+        with self.running_reactor() as reactor:
+            clients = []
+            try:
+                for i in range(20):
+                    s1, s2 = socket.socketpair()
+                    clients.append(s2)
+                    reactor.create_dispatcher(s1, impl=Echo())
+
+                for i, s in enumerate(clients):
+                    s.settimeout(1)
+                    s.sendall(b"message %02d" % i)
+
+                for i, s in enumerate(clients):
+                    self.assertEqual(s.recv(10), b"message %02d" % i)
+            finally:
+                for s in clients:
+                    s.close()
+
+    def test_closed_dispatcher(self):
+        with self.running_reactor() as reactor:
+            s1, s2 = socket.socketpair()
+            with closing(s2):
+                disp = reactor.create_dispatcher(s1, impl=Echo())
+                s2.settimeout(1)
+                s2.sendall(b"data")
+                self.assertEqual(s2.recv(4), b"data")
+                disp.close()
+                reactor.wakeup()
+
+            s3, s4 = socket.socketpair()
+            with closing(s4):
+                # The new socket may reuse the closed dispatcher fd.
+                reactor.create_dispatcher(s3, impl=Echo())
+                s4.settimeout(1)
+                s4.sendall(b"data")
+                self.assertEqual(s4.recv(4), b"data")
+
+    @contextmanager
+    def running_reactor(self):
+        reactor = Reactor()
+        thread = concurrent.thread(reactor.process_requests,
+                                   name='test reactor')
+        thread.start()
+        try:
+            yield reactor
+        finally:
+            reactor.stop()
+            thread.join(timeout=1)
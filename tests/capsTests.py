@@ -24,10 +24,13 @@ import platform
 import tempfile
 import xml.etree.ElementTree as ET
 from testlib import VdsmTestCase as TestCaseBase
+from testlib import namedTemporaryDir
 from monkeypatch import MonkeyPatch
+from monkeypatch import MonkeyPatchScope
 
 import caps
 from vdsm import commands
+from vdsm import constants
 from vdsm import cpuarch
 from vdsm import numa
 from vdsm import machinetype
@@ -349,3 +352,108 @@ class TestCaps(TestCaseBase):
         self.assertEqual(t.sockets, 1)
         self.assertEqual(t.online_cpus,
                          ['0', '1', '2', '3', '4', '5', '6', '7'])
+
+
+class Collector(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+
+class FakeMonitor(object):
+
+    def __init__(self, groups=()):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def __iter__(self):
+        return iter([{'event': 'new_link'}])
+
+
+class FakeWatcher(object):
+    generation = 1
+
+
+class TestCapsSection(TestCaseBase):
+
+    def test_cached_while_stamp_unchanged(self):
+        collect = Collector()
+        section = caps._Section('test', collect, lambda: 'stamp')
+        self.assertEqual(section.get(), {'calls': 1})
+        self.assertEqual(section.get(), {'calls': 1})
+        self.assertEqual(collect.calls, 1)
+
+    def test_collected_again_when_stamp_changes(self):
+        stamp = [1]
+        collect = Collector()
+        section = caps._Section('test', collect, lambda: stamp[0])
+        section.get()
+        stamp[0] = 2
+        self.assertEqual(section.get(), {'calls': 2})
+        self.assertEqual(section.get(), {'calls': 2})
+
+    def test_not_cached_without_stamp(self):
+        collect = Collector()
+        section = caps._Section('test', collect, lambda: None)
+        section.get()
+        self.assertEqual(section.get(), {'calls': 2})
+
+    def test_invalidate(self):
+        collect = Collector()
+        section = caps._Section('test', collect, lambda: 'stamp')
+        section.get()
+        section.invalidate()
+        self.assertEqual(section.get(), {'calls': 2})
+
+    def test_invalidate_unknown_section(self):
+        self.assertRaises(KeyError, caps.invalidate, 'no-such-section')
+
+    def test_get_merges_sections(self):
+        sections = (caps._Section('a', lambda: {'a': 1}, lambda: True),
+                    caps._Section('b', lambda: {'b': 2}, lambda: None))
+        with MonkeyPatchScope([(caps, '_sections', sections)]):
+            self.assertEqual(caps.get(), {'a': 1, 'b': 2})
+
+    def test_network_not_tracked_until_started(self):
+        watcher = caps._NetlinkWatcher()
+        self.assertIsNone(watcher.generation)
+
+    def test_network_not_tracked_after_monitor_exit(self):
+        watcher = caps._NetlinkWatcher()
+        with MonkeyPatchScope([(caps.monitor, 'Monitor', FakeMonitor)]):
+            watcher.start()
+            watcher._thread.join()
+        self.assertIsNone(watcher.generation)
+
+    def test_network_stamp_tracks_resolv_conf(self):
+        with namedTemporaryDir() as tmpdir:
+            resolv_conf = os.path.join(tmpdir, 'resolv.conf')
+            with open(resolv_conf, 'w') as f:
+                f.write('nameserver 192.0.2.1\n')
+            with MonkeyPatchScope([
+                (caps.dns, 'DNS_CONF_FILE', resolv_conf),
+                (caps, '_netlink_watcher', FakeWatcher()),
+            ]):
+                before = caps._network_stamp()
+                os.utime(resolv_conf, (0, 0))
+                self.assertNotEqual(caps._network_stamp(), before)
+
+    def test_hooks_stamp(self):
+        with namedTemporaryDir() as hooks_dir:
+            with MonkeyPatchScope([(constants, 'P_VDSM_HOOKS', hooks_dir)]):
+                before = caps._hooks_stamp()
+                self.assertEqual(caps._hooks_stamp(), before)
+                os.mkdir(os.path.join(hooks_dir, 'before_vm_start'))
+                self.assertNotEqual(caps._hooks_stamp(), before)
+
+    def test_mtimes_of_missing_file(self):
+        self.assertEqual(caps._mtimes(['/no/such/file']), (None,))
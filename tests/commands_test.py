@@ -26,7 +26,9 @@ import time
 
 from vdsm import constants
 from vdsm import commands
+from vdsm import forkserver
 
+from monkeypatch import MonkeyPatchScope
 from testlib import permutations, expandPermutations
 from testlib import VdsmTestCase as TestCaseBase
 from testValidation import checkSudo
@@ -73,6 +75,28 @@ class ExecCmdTest(TestCaseBase):
         self.assertEquals(int(out[0].split()[2]), 0)
 
 
+class ExecCmdForkServerTest(ExecCmdTest):
+
+    def setUp(self):
+        forkserver.start()
+
+    def tearDown(self):
+        forkserver.stop()
+
+    def testAsync(self):
+        p = commands.execCmd(('cat',), sync=False)
+        self.assertIsInstance(p._proc, forkserver.Process)
+        out, err = p.communicate('hello world')
+        self.assertEqual(out, 'hello world')
+        self.assertEqual(p.returncode, 0)
+
+    def testAsyncKill(self):
+        p = commands.execCmd(('sleep', '10'), sync=False)
+        p.kill()
+        self.assertTrue(p.wait(timeout=2))
+        self.assertEqual(p.returncode, -9)
+
+
 class ExecCmdStressTest(TestCaseBase):
 
     CONCURRENCY = 50
@@ -150,6 +174,58 @@ class ExecCmdStressTest(TestCaseBase):
         return out
 
 
+@expandPermutations
+class AsyncProcStreamTests(TestCaseBase):
+
+    def test_read_all(self):
+        p = commands.execCmd(["dd", "if=/dev/zero", "bs=1M", "count=4"],
+                             sync=False)
+        p.blocking = True
+        self.assertEqual(len(p.stdout.read()), 4 * 1024**2)
+        self.assertTrue(p.wait(5))
+        self.assertEqual(p.returncode, 0)
+
+    def test_bounded_buffer(self):
+        with MonkeyPatchScope([(commands, "MAX_BUFFER", 64 * 1024)]):
+            p = commands.execCmd(["dd", "if=/dev/zero", "bs=1M", "count=1"],
+                                 sync=False)
+            time.sleep(0.5)
+            # The loop stops reading when the buffer is full, blocking the
+            # child until we consume the data.
+            self.assertIsNone(p.returncode)
+            self.assertEqual(p._stdout.buffered, 64 * 1024)
+            p.blocking = True
+            self.assertEqual(len(p.stdout.read()), 1024**2)
+            self.assertTrue(p.wait(5))
+
+    @permutations([["\n", "\\n"], ["\r", "\\r"]])
+    def test_line_handler(self, separator, escaped):
+        lines = []
+        script = "printf 'a{0}b{0}'; sleep 0.2; printf 'c'".format(escaped)
+        p = commands.execCmd(["sh", "-c", script], sync=False)
+        p.add_line_handler("stdout", lines.append, separator=separator)
+        self.assertTrue(p.wait(5))
+        self.assertEqual(lines, ["a", "b", "c"])
+
+    def test_closed_reader_discards_output(self):
+        p = commands.execCmd(["dd", "if=/dev/zero", "bs=1M", "count=4"],
+                             sync=False)
+        p.stdout.close()
+        self.assertTrue(p.wait(5))
+        self.assertEqual(p.returncode, 0)
+
+    def test_shared_loop(self):
+        before = threading.active_count()
+        procs = [commands.execCmd(["sleep", "0.5"], sync=False)
+                 for i in range(20)]
+        try:
+            # At most one new thread for the event loop.
+            self.assertTrue(threading.active_count() <= before + 1)
+        finally:
+            for p in procs:
+                p.wait()
+
+
 class Worker(object):
 
     def __init__(self, resume, func, func_calls, func_delay):
@@ -185,6 +185,34 @@ class TMapTests(VdsmTestCase):
         expected = [concurrent.Result(False, error)] * 10
         self.assertEqual(results, expected)
 
+    def test_workers_results_order(self):
+        def func(x):
+            time.sleep(x)
+            return x
+        values = tuple(random.random() * 0.1 for x in range(10))
+        results = concurrent.tmap(func, values, workers=3)
+        expected = [concurrent.Result(True, x) for x in values]
+        self.assertEqual(results, expected)
+
+    def test_workers_concurrency(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def func(x):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        concurrent.tmap(func, range(10), workers=3)
+        self.assertEqual(peak[0], 3)
+
+    def test_workers_empty(self):
+        self.assertEqual(concurrent.tmap(lambda x: x, [], workers=3), [])
+
 
 class ThreadTests(VdsmTestCase):
 
@@ -77,3 +77,108 @@ class DevicesHashTests(VdsmTestCase):
         desc1 = DomainDescriptor(SOME_DEVICES)
         desc2 = DomainDescriptor(SOME_DEVICES)
         self.assertEqual(desc1.devices_hash, desc2.devices_hash)
+
+
+DEVICES_WITH_CHANNELS = """
+<domain>
+    <uuid>xyz</uuid>
+    <memory unit='KiB'>1048576</memory>
+    <devices>
+        <channel type="unix">
+            <target name="org.qemu.guest_agent.0" type="virtio"/>
+            <source mode="bind" path="/path/to/qemu-ga"/>
+        </channel>
+        <disk device="disk" type="file">
+            <source file="/path/to/disk&gt;1"/>
+            <target bus="virtio" dev="vda"/>
+        </disk>
+        <memory model="dimm"><target><size unit="KiB">524288</size></target>
+        </memory>
+        <channel type="unix">
+            <target name="com.redhat.rhevm.vdsm" type="virtio"/>
+            <source mode="bind" path="/path/to/vdsm"/>
+        </channel>
+        <graphics type="spice" passwd="a&gt;b"/>
+    </devices>
+</domain>
+"""
+
+NAMESPACED_DEVICES = """
+<domain xmlns:qemu="http://libvirt.org/schemas/domain/qemu/1.0">
+    <uuid>xyz</uuid>
+    <devices>
+        <disk device="disk" type="file"><qemu:opt/></disk>
+        <graphics type="spice"/>
+    </devices>
+</domain>
+"""
+
+
+class DeviceElementsTests(VdsmTestCase):
+
+    def test_device_elements(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        disks = desc.get_device_elements('disk')
+        self.assertEqual(len(disks), 1)
+        self.assertEqual(disks[0].getAttribute('type'), 'file')
+
+    def test_nested_elements_in_document_order(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        sources = [source.getAttribute('path') or source.getAttribute('file')
+                   for source in desc.get_device_elements('source')]
+        self.assertEqual(sources, ['/path/to/qemu-ga', '/path/to/disk>1',
+                                   '/path/to/vdsm'])
+
+    def test_same_elements(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        graphics = desc.get_device_elements('graphics')[0]
+        self.assertEqual(graphics.getAttribute('passwd'), 'a>b')
+        self.assertIs(desc.get_device_elements('graphics')[0], graphics)
+
+    def test_missing_elements(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        self.assertEqual(desc.get_device_elements('hostdev'), [])
+
+    def test_devices(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        names = [node.nodeName for node in desc.devices.childNodes
+                 if node.nodeName != '#text']
+        self.assertEqual(names, ['channel', 'disk', 'memory', 'channel',
+                                 'graphics'])
+
+    def test_no_devices(self):
+        desc = DomainDescriptor(NO_DEVICES)
+        self.assertIsNone(desc.devices)
+        self.assertEqual(desc.get_device_elements('disk'), [])
+
+    def test_namespaced_device(self):
+        desc = DomainDescriptor(NAMESPACED_DEVICES)
+        disks = desc.get_device_elements('disk')
+        self.assertEqual(len(disks), 1)
+        self.assertEqual(len(disks[0].getElementsByTagName('qemu:opt')), 1)
+        self.assertEqual(len(desc.get_device_elements('graphics')), 1)
+
+    def test_all_channels(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        self.assertEqual(list(desc.all_channels()), [
+            ('org.qemu.guest_agent.0', '/path/to/qemu-ga'),
+            ('com.redhat.rhevm.vdsm', '/path/to/vdsm'),
+        ])
+
+    def test_memory_size(self):
+        desc = DomainDescriptor(DEVICES_WITH_CHANNELS)
+        self.assertEqual(desc.get_memory_size(), 1024)
+
+    def test_no_memory_size(self):
+        desc = DomainDescriptor(NO_DEVICES)
+        self.assertIsNone(desc.get_memory_size())
+
+    def test_unicode_xml(self):
+        desc = DomainDescriptor(u"""
+<domain>
+    <uuid>xyz</uuid>
+    <description>\u05d0\u05d1</description>
+    <devices><graphics type="spice"/></devices>
+</domain>
+""")
+        self.assertEqual(len(desc.get_device_elements('graphics')), 1)
@@ -18,6 +18,7 @@
 # Refer to the README and COPYING files for full details of the license
 #
 
+import functools
 import threading
 import time
 
@@ -60,6 +61,13 @@ class ExecutorTests(TestCaseBase):
         self.assertRaises(executor.AlreadyStarted,
                           self.executor.start)
 
+    def test_stop_more_workers_than_max_tasks(self):
+        e = executor.Executor('small', workers_count=3, max_tasks=1,
+                              scheduler=self.scheduler)
+        e.start()
+        e.stop()
+        self.assertEqual(e.stats()['workers'], 0)
+
     def test_dispatch(self):
         task = Task()
         self.executor.dispatch(task)
@@ -223,6 +231,117 @@ class ExecutorTests(TestCaseBase):
             blocked.set()
 
 
+class ExecutorPriorityTests(TestCaseBase):
+
+    def setUp(self):
+        self.executor = executor.Executor('test', workers_count=1,
+                                          max_tasks=10, scheduler=None)
+        self.executor.start()
+
+    def tearDown(self):
+        self.executor.stop()
+
+    def test_priority_order(self):
+        order = []
+        blocked = threading.Event()
+        done = threading.Event()
+        self.executor.dispatch(Task(event=blocked))
+        for name, priority in [("low", executor.PRIORITY_LOW),
+                               ("normal-1", executor.PRIORITY_NORMAL),
+                               ("high", executor.PRIORITY_HIGH),
+                               ("normal-2", executor.PRIORITY_NORMAL)]:
+            self.executor.dispatch(functools.partial(order.append, name),
+                                   priority=priority)
+        self.executor.dispatch(done.set, priority=executor.PRIORITY_LOW)
+        blocked.set()
+        self.assertTrue(done.wait(1))
+        self.assertEqual(order, ["high", "normal-1", "normal-2", "low"])
+
+    def test_invalid_priority(self):
+        self.assertRaises(ValueError, self.executor.dispatch, Task(),
+                          priority=len(["high", "normal", "low"]))
+
+    def test_stats(self):
+        tasks = [Task(wait=0.1) for i in range(2)]
+        for task in tasks:
+            self.executor.dispatch(task)
+        for task in tasks:
+            self.assertTrue(task.executed.wait(1))
+        time.sleep(0.1)  # Let the worker account the last task
+        stats = self.executor.stats()
+        self.assertEqual(stats['tasks'], 2)
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['workers'], 1)
+        self.assertEqual(stats['active_workers'], 1)
+        self.assertEqual(stats['discarded_workers'], 0)
+        self.assertGreater(stats['run_time'], 0.15)
+        # The second task waited for the first one.
+        self.assertGreater(stats['wait_time'], 0.05)
+
+    def test_module_stats(self):
+        self.assertIn('test', executor.stats())
+        self.executor.stop()
+        self.assertNotIn('test', executor.stats())
+
+
+class ExecutorScalingTests(TestCaseBase):
+
+    def setUp(self):
+        self.executor = executor.Executor('test', workers_count=1,
+                                          max_tasks=10, scheduler=None,
+                                          max_workers=3, scale_up_wait=0.1,
+                                          idle_timeout=0.2)
+        self.executor.start()
+
+    def tearDown(self):
+        self.executor.stop()
+
+    @slowtest
+    def test_scale_up_and_down(self):
+        blocked = threading.Event()
+        try:
+            tasks = [Task(event=blocked) for i in range(3)]
+            self.executor.dispatch(tasks[0])
+            self.executor.dispatch(tasks[1])
+            time.sleep(0.2)
+            # Dispatching notices that tasks[1] is waiting too long.
+            self.executor.dispatch(tasks[2])
+            self.assertTrue(tasks[1].started.wait(1))
+            time.sleep(0.2)
+            self.executor.dispatch(Task())
+            self.assertTrue(tasks[2].started.wait(1))
+            self.assertEqual(self.executor.stats()['workers'], 3)
+        finally:
+            blocked.set()
+        # Idle workers exit until workers_count workers are left.
+        time.sleep(1)
+        self.assertEqual(self.executor.stats()['workers'], 1)
+
+    @slowtest
+    def test_max_workers(self):
+        blocked = threading.Event()
+        try:
+            for i in range(5):
+                self.executor.dispatch(Task(event=blocked))
+                time.sleep(0.15)
+            self.assertEqual(self.executor.stats()['workers'], 3)
+        finally:
+            blocked.set()
+
+    def test_no_scale_without_max_workers(self):
+        e = executor.Executor('noscale', workers_count=1, max_tasks=10,
+                              scheduler=None, scale_up_wait=0)
+        blocked = threading.Event()
+        with utils.running(e):
+            try:
+                for i in range(3):
+                    e.dispatch(Task(event=blocked))
+                time.sleep(0.1)
+                self.assertEqual(e.stats()['workers'], 1)
+            finally:
+                blocked.set()
+
+
 class TestWorkerSystemNames(TestCaseBase):
 
     def test_worker_thread_system_name(self):
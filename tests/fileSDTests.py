@@ -25,6 +25,7 @@ import time
 import uuid
 
 from testlib import VdsmTestCase as TestCaseBase
+from testlib import namedTemporaryDir
 
 from storage import fileSD
 from storage import sd
@@ -35,6 +36,7 @@ class TestingFileStorageDomainManifest(fileSD.FileStorageDomainManifest):
     def __init__(self, domainpath, oop):
         self.mountpoint = os.path.dirname(domainpath)
         self.sdUUID = os.path.basename(domainpath)
+        self.domaindir = domainpath
         self._oop = oop
 
     @property
@@ -66,6 +68,89 @@ class FakeOOP(object):
         self.glob = glob
 
 
+class LocalFileUtils(object):
+
+    def __init__(self):
+        self.synced = set()
+
+    def createdir(self, path):
+        os.makedirs(path)
+
+    def fsyncPath(self, path):
+        self.synced.add(path)
+
+    def rmFile(self, path):
+        os.unlink(path)
+
+
+class LocalOOP(object):
+    """
+    Out of process operations done in the current process.
+    """
+
+    def __init__(self):
+        self.os = os
+        self.fileUtils = LocalFileUtils()
+        self.utils = self.fileUtils
+
+    def writeFile(self, path, data):
+        with open(path, "w") as f:
+            f.write(data)
+
+
+class UpdateVMsTests(TestCaseBase):
+
+    SD_UUID = str(uuid.uuid4())
+
+    def test_new_vms(self):
+        ovfs = dict((str(uuid.uuid4()), "ovf %d" % i) for i in range(10))
+        with namedTemporaryDir() as mountpoint:
+            dom = self.make_domain(mountpoint)
+            dom.updateVMs(ovfs)
+            synced = dom.oop.fileUtils.synced
+            self.assertIn(dom.getVMsDir(), synced)
+            for vm_uuid in ovfs:
+                self.assertIn(os.path.join(dom.getVMsDir(), vm_uuid), synced)
+            self.assertEqual(self.read_ovfs(dom), ovfs)
+
+    def test_update_vm(self):
+        vm_uuid = str(uuid.uuid4())
+        with namedTemporaryDir() as mountpoint:
+            dom = self.make_domain(mountpoint)
+            dom.updateVMs({vm_uuid: "old"})
+            dom.oop.fileUtils.synced.clear()
+            dom.updateVMs({vm_uuid: "new"})
+            self.assertEqual(self.read_ovfs(dom), {vm_uuid: "new"})
+            vm_dir = os.path.join(dom.getVMsDir(), vm_uuid)
+            # Only the VM directory entry changed.
+            self.assertIn(vm_dir, dom.oop.fileUtils.synced)
+            self.assertNotIn(dom.getVMsDir(), dom.oop.fileUtils.synced)
+            # No temporary files are left.
+            self.assertEqual(os.listdir(vm_dir), [vm_uuid + ".ovf"])
+
+    def test_error(self):
+        vm_uuid = str(uuid.uuid4())
+        with namedTemporaryDir() as mountpoint:
+            dom = self.make_domain(mountpoint)
+            # A file where the VM directory should be.
+            open(os.path.join(dom.getVMsDir(), vm_uuid), "w").close()
+            self.assertRaises(EnvironmentError, dom.updateVMs,
+                              {vm_uuid: "ovf"})
+
+    def make_domain(self, mountpoint):
+        dom = TestingFileStorageDomain(self.SD_UUID, mountpoint, LocalOOP())
+        os.makedirs(dom.getVMsDir())
+        return dom
+
+    def read_ovfs(self, dom):
+        ovfs = {}
+        for vm_uuid in os.listdir(dom.getVMsDir()):
+            path = os.path.join(dom.getVMsDir(), vm_uuid, vm_uuid + ".ovf")
+            with open(path) as f:
+                ovfs[vm_uuid] = f.read()
+        return ovfs
+
+
 class GetAllVolumesTests(TestCaseBase):
 
     MOUNTPOINT = "/rhev/data-center/%s" % uuid.uuid4()
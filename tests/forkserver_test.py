@@ -0,0 +1,189 @@
+#
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+
+import errno
+import os
+import pickle
+import signal
+import threading
+import time
+
+from monkeypatch import MonkeyPatchScope
+from testlib import VdsmTestCase
+from testlib import namedTemporaryDir
+
+from vdsm import forkserver
+
+
+class SpawnTests(VdsmTestCase):
+
+    def setUp(self):
+        forkserver.start()
+
+    def tearDown(self):
+        forkserver.stop()
+
+    def test_output(self):
+        p = forkserver.spawn(["sh", "-c", "echo out; echo err >&2"])
+        self.assertEqual(p.communicate(), (b"out\n", b"err\n"))
+        self.assertEqual(p.returncode, 0)
+
+    def test_input(self):
+        data = b"x" * 1024 * 1024
+        p = forkserver.spawn(["cat"])
+        out, err = p.communicate(data)
+        self.assertEqual(out, data)
+
+    def test_exit_code(self):
+        p = forkserver.spawn(["sh", "-c", "exit 3"])
+        self.assertEqual(p.wait(), 3)
+
+    def test_kill(self):
+        p = forkserver.spawn(["sleep", "10"])
+        self.assertIsNone(p.poll())
+        p.kill()
+        self.assertEqual(p.wait(), -signal.SIGKILL)
+
+    def test_terminate_while_waiting(self):
+        p = forkserver.spawn(["sleep", "10"])
+        t = threading.Thread(target=p.wait)
+        t.start()
+        try:
+            p.terminate()
+        finally:
+            t.join()
+        self.assertEqual(p.returncode, -signal.SIGTERM)
+
+    def test_kill_terminated(self):
+        p = forkserver.spawn(["true"])
+        # The fork server may have reaped the child and closed the channel.
+        time.sleep(0.2)
+        p.kill()
+        self.assertEqual(p.wait(), 0)
+        p.kill()
+
+    def test_signal_error(self):
+        p = forkserver.spawn(["sleep", "10"])
+        try:
+            # The fork server cannot send an invalid signal, and must keep
+            # serving requests.
+            with self.assertRaises(OSError) as ctx:
+                p.send_signal(-1)
+            self.assertEqual(ctx.exception.errno, errno.EINVAL)
+            self.assertIsNone(p.poll())
+        finally:
+            p.kill()
+        self.assertEqual(p.wait(), -signal.SIGKILL)
+        self.assertEqual(forkserver.spawn(["true"]).wait(), 0)
+
+    def test_no_such_command(self):
+        with self.assertRaises(OSError) as ctx:
+            forkserver.spawn(["/no/such/command"])
+        self.assertEqual(ctx.exception.errno, errno.ENOENT)
+
+    def test_cwd(self):
+        with namedTemporaryDir() as tmpdir:
+            p = forkserver.spawn(["pwd"], cwd=tmpdir)
+            out, err = p.communicate()
+        self.assertEqual(out.decode().strip(), os.path.realpath(tmpdir))
+
+    def test_env(self):
+        p = forkserver.spawn(["sh", "-c", "echo $VALUE"],
+                             env={"VALUE": "forkserver"})
+        out, err = p.communicate()
+        self.assertEqual(out, b"forkserver\n")
+
+    def test_nice(self):
+        p = forkserver.spawn(["cat", "/proc/self/stat"], nice=7)
+        out, err = p.communicate()
+        self.assertEqual(int(out.split()[18]), 7)
+
+    def test_ioclass(self):
+        if not forkserver.IOCLASS_SUPPORTED:
+            raise self.skipTest("ioprio_set not supported")
+        p = forkserver.spawn(["ionice"], ioclass=2, ioclassdata=3)
+        out, err = p.communicate()
+        self.assertEqual(out.decode().strip(), "best-effort: prio 3")
+
+    def test_cpus(self):
+        p = forkserver.spawn(["grep", "Cpus_allowed_list",
+                              "/proc/self/status"], cpus=[0])
+        out, err = p.communicate()
+        self.assertEqual(out.decode().split()[1], "0")
+
+    def test_setsid(self):
+        p = forkserver.spawn(["cat", "/proc/self/stat"], setsid=True)
+        out, err = p.communicate()
+        fields = out.split()
+        # pid and session id
+        self.assertEqual(fields[0], fields[5])
+
+    def test_death_signal(self):
+        p = forkserver.spawn(["sleep", "10"], death_signal=signal.SIGTERM)
+        forkserver.stop()
+        self.assertEqual(p.wait(), -signal.SIGTERM)
+        forkserver.start()
+
+    def test_not_running(self):
+        forkserver.stop()
+        try:
+            self.assertRaises(forkserver.Error, forkserver.spawn, ["true"])
+        finally:
+            forkserver.start()
+
+
+class FakeChannel(object):
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def fileno(self):
+        return -1
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+class SignalRequestTests(VdsmTestCase):
+
+    def test_not_permitted(self):
+        # Like signaling a setuid root child when running as a user.
+        def kill(pid, signo):
+            raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+
+        server = forkserver._ForkServer(None)
+        server._children[4242] = None
+        channel = FakeChannel()
+        with MonkeyPatchScope([(forkserver.os, 'kill', kill)]):
+            server._signal(channel, 4242, signal.SIGTERM)
+        reply = pickle.loads(channel.sent[0])
+        self.assertEqual(reply["error"][0], errno.EPERM)
+
+    def test_reaped_child(self):
+        server = forkserver._ForkServer(None)
+        channel = FakeChannel()
+        server._signal(channel, 4242, signal.SIGTERM)
+        self.assertEqual(pickle.loads(channel.sent[0]), {})
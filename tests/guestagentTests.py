@@ -125,27 +125,27 @@ class TestFiltering(TestCaseBase):
     def test_filter_object_dict(self):
         raw = {u"a\x00": u"b\x01", u"c\x02": u"d\x03"}
         filtered = {u"a\ufffd": u"b\ufffd", u"c\ufffd": u"d\ufffd"}
-        self.assertEqual(filtered, guestagent._filterObject(raw))
+        self.assertEqual(filtered, self.parse(raw))
 
     def test_filter_object_nested_dict(self):
         raw = {u"a\x00": {u"b\x01": {u"c\x02": u"d\x03"}}}
         filtered = {u"a\ufffd": {u"b\ufffd": {u"c\ufffd": u"d\ufffd"}}}
-        self.assertEqual(filtered, guestagent._filterObject(raw))
+        self.assertEqual(filtered, self.parse(raw))
 
     def test_filter_object_list(self):
         raw = [u"a\x00", u"b\x01", u"c\x02", u"d\x03"]
         filtered = [u"a\ufffd", u"b\ufffd", u"c\ufffd", u"d\ufffd"]
-        self.assertEqual(filtered, guestagent._filterObject(raw))
+        self.assertEqual(filtered, self.parse(raw))
 
     def test_filter_object_nested_lists(self):
         raw = [u"a\x00", [u"b\x01", [u"c\x02", u"d\x03"]]]
         filtered = [u"a\ufffd", [u"b\ufffd", [u"c\ufffd", u"d\ufffd"]]]
-        self.assertEqual(filtered, guestagent._filterObject(raw))
+        self.assertEqual(filtered, self.parse(raw))
 
     def test_filter_object_nested_mix(self):
         raw = {u"a\x00": [u"b\x01", {u"c\x02": u"d\x03"}]}
         filtered = {u"a\ufffd": [u"b\ufffd", {u"c\ufffd": u"d\ufffd"}]}
-        self.assertEqual(filtered, guestagent._filterObject(raw))
+        self.assertEqual(filtered, self.parse(raw))
 
     def test_filter_object_other_types(self):
         raw = {u"int": 1,
@@ -153,12 +153,19 @@ class TestFiltering(TestCaseBase):
                u"true": True,
                u"false": False,
                u"none": None}
-        self.assertEqual(raw, guestagent._filterObject(raw))
+        self.assertEqual(raw, self.parse(raw))
+
+    def test_filter_raw_chars(self):
+        line = b'{"__name__": "test", "value": "a\x7f b\xc2\x85"}'
+        agent = guestagent.GuestAgent(None, None, None, lambda: None)
+        name, args = agent._parseLine(line)
+        self.assertEqual(u"a\ufffd b\u0085", args["value"])
 
     @slowtest
     def test_filter_object_timing(self):
         setup = """
-from vdsm.virt.guestagent import _filterObject
+import json
+from vdsm.virt.guestagent import GuestAgent
 d = {u'netIfaces': [
         {
             u'hw': u'00:21:cc:68:d7:38',
@@ -179,12 +186,25 @@ d = {u'netIfaces': [
             u'inet6': []
         }
     ],
-    u'guestIPs': u'9.115.122.77 9.115.126.23 192.168.122.1'
+    u'guestIPs': u'9.115.122.77 9.115.126.23 192.168.122.1',
+    u'__name__': u'network-interfaces'
 }
+line = json.dumps(d)
+agent = GuestAgent(None, None, None, lambda: None)
 """
-        elapsed = timeit.timeit('_filterObject(d)', setup=setup, number=1000)
+        elapsed = timeit.timeit('agent._parseLine(line)', setup=setup,
+                                number=1000)
         print(elapsed, "seconds")
 
+    def parse(self, value):
+        """
+        Return value sent by the guest agent, as parsed by vdsm.
+        """
+        line = json.dumps({u"__name__": u"test", u"value": value})
+        agent = guestagent.GuestAgent(None, None, None, lambda: None)
+        name, args = agent._parseLine(line)
+        return args[u"value"]
+
 
 class TestGuestIF(TestCaseBase):
 
@@ -200,7 +220,7 @@ class TestGuestIF(TestCaseBase):
             for (k, v) in t.assertDict.iteritems():
                 self.assertEqual(fakeGuestAgent.guestInfo[k], v)
 
-    def test_guestinfo_encapsulation(self):
+    def test_guestinfo_shared(self):
         logging.TRACE = 5
         fake_guest_agent = guestagent.GuestAgent(None, None, self.log,
                                                  lambda: None)
@@ -209,18 +229,31 @@ class TestGuestIF(TestCaseBase):
                 (fake_guest_agent, 'isResponsive', lambda: True)
         ]):
             guest_info = fake_guest_agent.getGuestInfo()
-            for k in _OUTPUTS[0]:
-                value = guest_info[k]
-                if isinstance(value, list):
-                    value.append('modified')
-                elif isinstance(value, dict):
-                    value['modified'] = 'modified'
-                else:
-                    value = 'modified'
-                guest_info[k] = value
-            guest_info = fake_guest_agent.getGuestInfo()
+            # Without updates, all callers share the same snapshot.
+            self.assertIs(guest_info, fake_guest_agent.getGuestInfo())
             for (k, v) in _OUTPUTS[0].iteritems():
                 self.assertEqual(guest_info[k], v)
+            fake_guest_agent._handleMessage('heartbeat', {'free-ram': 1024})
+            self.assertIsNot(guest_info, fake_guest_agent.getGuestInfo())
+
+    def test_guestinfo_snapshot(self):
+        logging.TRACE = 5
+        fake_guest_agent = guestagent.GuestAgent(None, None, self.log,
+                                                 lambda: None)
+        fake_guest_agent._handleMessage(_MSG_TYPES[0], _INPUTS[0])
+        with MonkeyPatchScope([
+                (fake_guest_agent, 'isResponsive', lambda: True)
+        ]):
+            old_info = fake_guest_agent.getGuestInfo()
+            fake_guest_agent._handleMessage('heartbeat', {
+                'free-ram': 512000,
+                'memory-stat': {'mem_free': 1000}})
+            new_info = fake_guest_agent.getGuestInfo()
+        # Updates must not modify snapshots returned before.
+        self.assertEqual(_OUTPUTS[0]['memUsage'], old_info['memUsage'])
+        self.assertEqual(_OUTPUTS[0]['memoryStats'], old_info['memoryStats'])
+        self.assertEqual(512000, new_info['memUsage'])
+        self.assertEqual('1000', new_info['memoryStats']['mem_free'])
 
 
 class TestGuestIFHandleData(TestCaseBase):
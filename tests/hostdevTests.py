@@ -19,6 +19,8 @@
 #
 
 
+import libvirt
+
 import vmfakelib as fake
 
 from virt import vmxml
@@ -27,7 +29,7 @@ from virt.vmdevices import hostdevice, network, hwclass
 from testlib import VdsmTestCase as TestCaseBase, XMLTestCase
 from testlib import permutations, expandPermutations
 from testlib import find_xml_element
-from monkeypatch import MonkeyClass
+from monkeypatch import MonkeyClass, MonkeyPatchScope
 
 from vdsm import cpuarch
 from vdsm import hooks
@@ -483,6 +485,112 @@ class HostdevTests(TestCaseBase):
                             issubset(devices.keys()))
 
 
+class EventsConnection(Connection):
+    """
+    Connection keeping its devices between calls, reporting node device
+    lookups and registered event callbacks.
+    """
+
+    def __init__(self, *args):
+        self.removed = set()
+        self.lookups = []
+        self.callbacks = []
+        super(EventsConnection, self).__init__(*args)
+        del self.lookups[:]
+
+    def nodeDeviceLookupByName(self, name):
+        if name in self.removed:
+            raise fake.Error(libvirt.VIR_ERR_NO_NODE_DEVICE)
+        self.lookups.append(name)
+        return super(EventsConnection, self).nodeDeviceLookupByName(name)
+
+    def listAllDevices(self, flags=0):
+        return [device for device in
+                super(EventsConnection, self).listAllDevices(flags)
+                if device.name() not in self.removed]
+
+    def nodeDeviceEventRegisterAny(self, device, event_id, callback, opaque):
+        self.callbacks.append((event_id, callback, opaque))
+
+
+@MonkeyClass(hostdev, '_sriov_totalvfs', _fake_totalvfs)
+@MonkeyClass(hostdev, '_pci_header_type', lambda _: 0)
+@MonkeyClass(hooks, 'after_hostdev_list_by_caps', lambda json: json)
+class HostdevCacheTests(TestCaseBase):
+
+    def setUp(self):
+        self.conn = EventsConnection()
+        self.cache = hostdev._DeviceCache()
+
+    def test_list_by_caps(self):
+        with MonkeyPatchScope([(libvirtconnection, 'get', self.get)]):
+            self.assertEqual(self.cache.list_by_caps(), DEVICES_PROCESSED)
+            self.assertEqual(set(self.cache.list_by_caps(['pci'])),
+                             set(DEVICES_BY_CAPS['pci']))
+            self.assertEqual(set(self.cache.list_by_caps(['scsi'])),
+                             {'scsi_0_0_0_0', 'scsi_1_0_0_0',
+                              'scsi_2_0_0_0'})
+        self.assertEqual(self.conn.lookups, [])
+
+    def test_reload_stale_device(self):
+        with MonkeyPatchScope([(libvirtconnection, 'get', self.get)]):
+            self.cache.list_by_caps()
+            self.cache.invalidate('usb_1_1')
+            devices = self.cache.list_by_caps()
+        self.assertEqual(self.conn.lookups, ['usb_1_1'])
+        self.assertEqual(devices, DEVICES_PROCESSED)
+
+    def test_removed_device(self):
+        with MonkeyPatchScope([(libvirtconnection, 'get', self.get)]):
+            self.cache.list_by_caps()
+            self.conn.removed.add('scsi_generic_sg0')
+            self.cache.invalidate('scsi_generic_sg0')
+            devices = self.cache.list_by_caps()
+        self.assertNotIn('scsi_generic_sg0', devices)
+        # The SCSI parent is reloaded without the udev path of its child.
+        self.assertEqual(self.conn.lookups, ['scsi_0_0_0_0'])
+        self.assertNotIn('udev_path', devices['scsi_0_0_0_0'])
+        self.assertEqual(devices['scsi_0_0_0_0']['vendor'], 'ATA')
+
+    def test_invalidate_all(self):
+        with MonkeyPatchScope([(libvirtconnection, 'get', self.get)]):
+            self.cache.list_by_caps()
+            self.conn.removed.add('usb_1_1_4')
+            self.cache.invalidate()
+            devices = self.cache.list_by_caps()
+        self.assertNotIn('usb_1_1_4', devices)
+        self.assertEqual(self.conn.lookups, [])
+
+    def test_get_returns_copy(self):
+        with MonkeyPatchScope([(libvirtconnection, 'get', self.get)]):
+            params = self.cache.get('pci_0000_00_02_0')
+            params['address']['slot'] = 'modified'
+            self.assertEqual(self.cache.get('pci_0000_00_02_0'),
+                             DEVICES_PROCESSED['pci_0000_00_02_0'])
+            self.assertIsNone(self.cache.get('no_such_device'))
+
+    def test_events_invalidate_devices(self):
+        with MonkeyPatchScope([
+            (libvirtconnection, 'get', self.get),
+            (libvirtconnection, 'event_loop_running', lambda: True),
+            (hostdev, '_cache', None),
+        ]):
+            hostdev.list_by_caps()
+            self.assertEqual(len(self.conn.callbacks), 2)
+            device = self.conn.nodeDeviceLookupByName('usb_1_1')
+            self.conn.lookups = []
+            for event_id, callback, cache in self.conn.callbacks:
+                if callback is hostdev._on_device_update:
+                    callback(self.conn, device, cache)
+            devices = hostdev.list_by_caps()
+        self.assertEqual(self.conn.lookups, ['usb_1_1'])
+        self.assertEqual(devices['usb_1_1'],
+                         {'params': DEVICES_PROCESSED['usb_1_1']})
+
+    def get(self):
+        return self.conn
+
+
 @expandPermutations
 @MonkeyClass(libvirtconnection, 'get', Connection)
 @MonkeyClass(hostdev, '_sriov_totalvfs', _fake_totalvfs)
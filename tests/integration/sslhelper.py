@@ -23,13 +23,9 @@ DEAFAULT_SSL_CONTEXT = SSLContext(cert_file=CRT_FILE, key_file=KEY_FILE,
 
 
 def get_server_socket(key_file, cert_file, socket):
-    return ssl.wrap_socket(socket,
-                           keyfile=key_file,
-                           certfile=cert_file,
-                           server_side=False,
-                           cert_reqs=ssl.CERT_REQUIRED,
-                           ssl_version=ssl.PROTOCOL_TLSv1,
-                           ca_certs=cert_file)
+    sslctx = SSLContext(cert_file=cert_file, key_file=key_file,
+                        ca_certs=cert_file)
+    return sslctx.wrapSocket(socket, server_side=True)
 
 
 class TestServer(SimpleXMLRPCServer.SimpleXMLRPCServer):
@@ -39,12 +35,14 @@ class TestServer(SimpleXMLRPCServer.SimpleXMLRPCServer):
                                                        logRequests=False,
                                                        bind_and_activate=False)
 
+        # With TLS 1.3 a rejected client certificate is reported after the
+        # handshake, failing the client with a socket error.
         self.socket = ssl.wrap_socket(self.socket,
                                       keyfile=KEY_FILE,
                                       certfile=CRT_FILE,
                                       server_side=True,
                                       cert_reqs=ssl.CERT_REQUIRED,
-                                      ssl_version=ssl.PROTOCOL_TLSv1,
+                                      ssl_version=ssl.PROTOCOL_TLSv1_2,
                                       ca_certs=CRT_FILE,
                                       do_handshake_on_connect=False)
 
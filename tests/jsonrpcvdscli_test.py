@@ -0,0 +1,185 @@
+#
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+
+import errno
+import socket
+
+from monkeypatch import MonkeyPatchScope
+from testlib import VdsmTestCase
+
+from vdsm import jsonrpcvdscli
+from yajsonrpc import JsonRpcResponse
+
+KEY = ('host', 54321, True, 'jms.topic.vdsm_requests')
+PEER = 'host:54321'
+
+
+class FakeClient(object):
+
+    def __init__(self, responding=True):
+        self.responding = responding
+        self.closed = False
+        self.error = None
+        self.requests = []
+
+    def call(self, req, timeout=None):
+        self.requests.append(req.method)
+        if self.error is not None:
+            raise self.error
+        if not self.responding:
+            return []
+        return [JsonRpcResponse({'status': 'ok'}, None, req.id)]
+
+    def close(self):
+        self.closed = True
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeConnect(object):
+
+    def __init__(self):
+        self.clients = []
+
+    def __call__(self):
+        client = FakeClient()
+        self.clients.append(client)
+        return client
+
+
+class ClientPoolTests(VdsmTestCase):
+
+    def setUp(self):
+        self.pool = jsonrpcvdscli._ClientPool()
+        self.connect = FakeConnect()
+
+    def tearDown(self):
+        self.pool.clear()
+
+    def test_share_connection(self):
+        first = self.pool.get(KEY, PEER, self.connect)
+        second = self.pool.get(KEY, PEER, self.connect)
+        call(first, 'Host.ping')
+        call(second, 'Host.getStats')
+        self.assertEqual(len(self.connect.clients), 1)
+        self.assertEqual(self.connect.clients[0].requests,
+                         ['Host.ping', 'Host.getStats'])
+
+    def test_connect_per_key(self):
+        other_key = ('other', 54321, True, 'jms.topic.vdsm_requests')
+        call(self.pool.get(KEY, PEER, self.connect), 'Host.ping')
+        call(self.pool.get(other_key, 'other:54321', self.connect),
+             'Host.ping')
+        self.assertEqual(len(self.connect.clients), 2)
+
+    def test_release_keeps_connection(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        lease.close()
+        lease.close()
+        self.assertEqual(self.pool.stats()[PEER]['users'], 0)
+        self.assertFalse(self.connect.clients[0].closed)
+
+    def test_close_idle_connection(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        lease.close()
+        with MonkeyPatchScope([(jsonrpcvdscli, '_IDLE_TIMEOUT', -1)]):
+            self.pool.get(('other',), 'other:54321', self.connect)
+        self.assertTrue(self.connect.clients[0].closed)
+        self.assertNotIn(PEER, self.pool.stats())
+
+    def test_keep_used_connection(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        with MonkeyPatchScope([(jsonrpcvdscli, '_IDLE_TIMEOUT', -1)]):
+            self.pool.get(('other',), 'other:54321', self.connect)
+        self.assertFalse(self.connect.clients[0].closed)
+
+    def test_reconnect_closed(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        self.connect.clients[0].close()
+        call(lease, 'Host.ping')
+        self.assertEqual(len(self.connect.clients), 2)
+        self.assertEqual(self.pool.stats()[PEER]['connects'], 2)
+
+    def test_keep_not_responding(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        self.connect.clients[0].responding = False
+        self.assertEqual(call(lease, 'Host.getStats'), [])
+        # Other users may still get responses on this connection.
+        self.assertFalse(self.connect.clients[0].closed)
+        self.assertEqual(self.connect.clients[0].requests,
+                         ['Host.ping', 'Host.getStats'])
+        self.assertEqual(len(self.connect.clients), 1)
+
+    def test_reconnect_transport_error(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        self.connect.clients[0].error = socket.error(errno.EPIPE, 'EPIPE')
+        self.assertRaises(socket.error, call, lease, 'Host.getStats')
+        self.assertTrue(self.connect.clients[0].closed)
+        self.assertEqual(len(call(lease, 'Host.getStats')), 1)
+        self.assertEqual(len(self.connect.clients), 2)
+
+    def test_stats(self):
+        lease = self.pool.get(KEY, PEER, self.connect)
+        call(lease, 'Host.ping')
+        call(lease, 'Host.getStats')
+        self.connect.clients[0].responding = False
+        call(lease, 'Host.getStats')
+        stats = self.pool.stats()[PEER]
+        self.assertEqual(stats['users'], 1)
+        self.assertEqual(stats['calls'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertGreaterEqual(stats['max_time'], stats['avg_time'])
+
+
+class ConnectPooledTests(VdsmTestCase):
+
+    def test_share_connection(self):
+        connect = FakeConnect()
+        pool = jsonrpcvdscli._ClientPool()
+        with MonkeyPatchScope([
+            (jsonrpcvdscli, '_pool', pool),
+            (jsonrpcvdscli, '_create',
+             lambda *args, **kwargs: connect()),
+        ]):
+            first = jsonrpcvdscli.connect_pooled('host', 54321, useSSL=True)
+            second = jsonrpcvdscli.connect_pooled('host', 54321, useSSL=True)
+            self.assertEqual(first.ping()['status']['code'], 0)
+            self.assertEqual(second.ping()['status']['code'], 0)
+            first.close()
+            second.close()
+            stats = jsonrpcvdscli.pool_stats()
+        pool.clear()
+        self.assertEqual(len(connect.clients), 1)
+        self.assertEqual(stats[PEER]['users'], 0)
+        self.assertEqual(stats[PEER]['calls'], 2)
+
+
+def call(lease, method):
+    req = jsonrpcvdscli.JsonRpcRequest(method, {}, reqId=method)
+    return lease.call(req)
@@ -203,6 +203,59 @@ class MountTests(TestCaseBase):
                 mnt = mount.Mount(link_to_file, mountpoint)
                 self.assertTrue(mnt.isMounted())
 
+    @ValidateRunningAsRoot
+    def test_mount_table_changed(self):
+        with namedTemporaryDir() as mountpoint:
+            self.assertFalse(mount.isMounted(mountpoint))
+            # Mount without using Mount.mount(), so only the kernel
+            # notification can invalidate the mount table.
+            rc, out, err = execCmd(['mount', '-t', 'tmpfs', 'tmpfs',
+                                    mountpoint])
+            if rc != 0:
+                raise RuntimeError("Error mounting tmpfs: %s" % err)
+            try:
+                self.assertTrue(mount.isMounted(mountpoint))
+            finally:
+                execCmd(['umount', mountpoint])
+            self.assertFalse(mount.isMounted(mountpoint))
+
+
+class TestMountTable(TestCaseBase):
+
+    def test_lookup(self):
+        with fake_mounts([b"server:/a /mnt/a nfs defaults 0 0",
+                          b"server:/b /mnt/b nfs defaults 0 0"]):
+            table = mount._mountTable()
+            self.assertEqual("server:/b",
+                             table.lookup_target("/mnt/b").fs_spec)
+            self.assertEqual("/mnt/a",
+                             table.lookup("server:/a", "/mnt/a").fs_file)
+            self.assertIsNone(table.lookup("server:/a", "/mnt/b"))
+            self.assertIsNone(table.lookup_target("/mnt/c"))
+
+    def test_first_record_wins(self):
+        with fake_mounts([b"server:/a /mnt/a nfs defaults 0 0",
+                          b"server:/b /mnt/a nfs defaults 0 0"]):
+            mnt = mount.getMountFromTarget("/mnt/a")
+            self.assertEqual("server:/a", mnt.fs_spec)
+
+    def test_invalidate(self):
+        with fake_mounts([b"server:/a /mnt/a nfs defaults 0 0"]):
+            self.assertFalse(mount.isMounted("/mnt/b"))
+            with open(mount._PROC_MOUNTS_PATH, "a") as f:
+                f.write("server:/b /mnt/b nfs defaults 0 0\n")
+            # Changes in a regular file are not reported by poll().
+            self.assertFalse(mount.isMounted("/mnt/b"))
+            mount._mountTable().invalidate()
+            self.assertTrue(mount.isMounted("/mnt/b"))
+
+    def test_new_path(self):
+        with fake_mounts([b"server:/a /mnt/a nfs defaults 0 0"]):
+            self.assertTrue(mount.isMounted("/mnt/a"))
+        with fake_mounts([b"server:/b /mnt/b nfs defaults 0 0"]):
+            self.assertFalse(mount.isMounted("/mnt/a"))
+            self.assertTrue(mount.isMounted("/mnt/b"))
+
 
 @contextmanager
 def fake_mounts(mount_lines):
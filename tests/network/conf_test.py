@@ -26,6 +26,7 @@ import pwd
 import shutil
 import subprocess
 import tempfile
+import threading
 
 from vdsm.network import libvirt
 from vdsm.network.configurators import ifcfg
@@ -119,3 +120,145 @@ class ifcfgConfigWriterTests(TestCaseBase):
             self._cw.restorePersistentBackup()
 
             self._assertFilesRestored()
+
+
+class Abort(BaseException):
+    pass
+
+
+@attr(type='unit')
+class ifcfgDevicesOrderTests(TestCaseBase):
+
+    IFCFGS = {
+        'eth0': 'DEVICE=eth0\nBRIDGE=net0\nONBOOT=yes\n',
+        'eth1': 'DEVICE=eth1\nMASTER=bond0\nSLAVE=yes\nONBOOT=yes\n',
+        'bond0': 'DEVICE=bond0\nBONDING_OPTS="mode=4 miimon=100"\n',
+        'bond0.10': 'DEVICE=bond0.10\nVLAN=yes\nBRIDGE=net10\n',
+        'bond0.20': 'DEVICE=bond0.20\nVLAN=yes\nBRIDGE=net20\n',
+        'net0': 'DEVICE=net0\nTYPE=Bridge\nBOOTPROTO=dhcp\n',
+        'net10': 'DEVICE=net10\nTYPE=Bridge\nBOOTPROTO=none\n',
+        'net20': 'DEVICE=net20\nTYPE=Bridge\nIPV6INIT=yes\nDHCPV6C=yes\n',
+    }
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._prefix = os.path.join(self._tempdir, 'ifcfg-')
+        self._files = []
+        for dev, content in self.IFCFGS.items():
+            with open(self._prefix + dev, 'w') as f:
+                f.write(content)
+            self._files.append(self._prefix + dev)
+        self._files.append(self._prefix + 'missing')
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
+
+    def test_dependencies(self):
+        with MonkeyPatchScope([(ifcfg, 'NET_CONF_PREF', self._prefix)]):
+            devices = ifcfg._read_device_ifcfgs(self._files)
+        self.assertEqual(ifcfg._dependencies(devices), {
+            'eth0': set(),
+            'bond0': set(),
+            'bond0.10': {'bond0'},
+            'bond0.20': {'bond0'},
+            'net0': {'eth0'},
+            'net10': {'bond0.10'},
+            'net20': {'bond0.20'},
+        })
+        self.assertEqual(ifcfg._dependencies(devices, reverse=True), {
+            'eth0': {'net0'},
+            'bond0': {'bond0.10', 'bond0.20'},
+            'bond0.10': {'net10'},
+            'bond0.20': {'net20'},
+            'net0': set(),
+            'net10': set(),
+            'net20': set(),
+        })
+
+    def test_start_devices(self):
+        started = []
+
+        def exec_ifup_by_name(dev, cgroup):
+            started.append((dev, cgroup))
+
+        with MonkeyPatchScope([
+            (ifcfg, 'NET_CONF_PREF', self._prefix),
+            (ifcfg, '_exec_ifup_by_name', exec_ifup_by_name),
+            (ifcfg, '_is_running_bond', lambda bond: True),
+        ]):
+            ifcfg.start_devices(self._files)
+
+        order = [dev for dev, _ in started]
+        self.assertEqual(sorted(order), sorted(
+            dev for dev in self.IFCFGS if dev != 'eth1'))
+        for dev, deps in [('bond0.10', 'bond0'), ('bond0.20', 'bond0'),
+                          ('net10', 'bond0.10'), ('net20', 'bond0.20'),
+                          ('net0', 'eth0')]:
+            self.assertLess(order.index(deps), order.index(dev))
+
+        cgroups = dict(started)
+        self.assertEqual(cgroups['net0'], ifcfg.dhclient.DHCLIENT_CGROUP)
+        self.assertEqual(cgroups['net20'], ifcfg.dhclient.DHCLIENT_CGROUP)
+        self.assertIsNone(cgroups['net10'])
+        self.assertIsNone(cgroups['bond0'])
+
+    def test_start_devices_concurrently(self):
+        # eth0 branch is blocked until the bond0 branch is started.
+        bond_branch_started = threading.Event()
+
+        def exec_ifup_by_name(dev, cgroup):
+            if dev == 'eth0':
+                if not bond_branch_started.wait(5):
+                    raise ifcfg.ConfigNetworkError(
+                        ifcfg.ERR_FAILED_IFUP, 'not concurrent')
+            elif dev == 'net20':
+                bond_branch_started.set()
+
+        with MonkeyPatchScope([
+            (ifcfg, 'NET_CONF_PREF', self._prefix),
+            (ifcfg, '_exec_ifup_by_name', exec_ifup_by_name),
+            (ifcfg, '_is_running_bond', lambda bond: True),
+        ]):
+            ifcfg.start_devices(self._files)
+
+        self.assertTrue(bond_branch_started.is_set())
+
+    def test_run_ordered_cycle(self):
+        handled = []
+        dependencies = {'a': {'b'}, 'b': {'a'}, 'c': set()}
+        ifcfg._run_ordered(handled.append, dependencies, 'ifup',
+                           ['c', 'a', 'b'])
+        self.assertEqual(handled, ['c', 'a', 'b'])
+
+    def test_run_ordered_base_exception(self):
+        handled = []
+
+        def func(dev):
+            handled.append(dev)
+            if dev == 'a':
+                raise Abort()
+
+        dependencies = {'a': set(), 'b': {'a'}}
+        with MonkeyPatchScope([
+            (ifcfg.config, 'getint', lambda section, option: 1),
+        ]):
+            # Must not block waiting for the dead worker.
+            ifcfg._run_ordered(func, dependencies, 'ifup', ['a', 'b'])
+        self.assertEqual(handled, ['a'])
+
+    def test_stop_devices(self):
+        stopped = []
+
+        with MonkeyPatchScope([
+            (ifcfg, 'NET_CONF_PREF', self._prefix),
+            (ifcfg, 'ifdown', stopped.append),
+            (ifcfg, '_is_running_bond', lambda bond: False),
+        ]):
+            ifcfg.stop_devices(self._files)
+
+        self.assertEqual(sorted(stopped), sorted(
+            dev for dev in self.IFCFGS if dev != 'eth1'))
+        for dev, deps in [('bond0.10', 'bond0'), ('bond0.20', 'bond0'),
+                          ('net10', 'bond0.10'), ('net20', 'bond0.20'),
+                          ('net0', 'eth0')]:
+            self.assertLess(stopped.index(dev), stopped.index(deps))
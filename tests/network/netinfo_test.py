@@ -19,24 +19,30 @@
 # Refer to the README and COPYING files for full details of the license
 #
 from __future__ import absolute_import
+from collections import defaultdict
 import os
 import io
+import time
 
 from nose.plugins.attrib import attr
 
 from vdsm.network import ipwrapper
 from vdsm.network.netinfo import addresses, bonding, dns, misc, nics, routes
+from vdsm.network.ip import dhclient
+from vdsm.network.netinfo import cache
 from vdsm.network.netinfo.cache import get
 from vdsm.network.netlink import waitfor
 from vdsm.utils import random_iface_name
 from vdsm import sysctl
 
 from modprobe import RequireBondingMod
-from .nettestlib import dnsmasq_run, dummy_device, veth_pair, wait_for_ipv6
+from .nettestlib import dnsmasq_run, dummy_device, dummy_devices, veth_pair
+from .nettestlib import vlan_devices, wait_for_ipv6
 from testlib import mock
 from testlib import VdsmTestCase as TestCaseBase, namedTemporaryDir
 from testValidation import ValidateRunningAsRoot
 from testValidation import broken_on_ci
+from testValidation import stresstest
 
 # speeds defined in ethtool
 ETHTOOL_SPEEDS = set([10, 100, 1000, 2500, 10000])
@@ -405,6 +411,25 @@ class TestNetinfo(TestCaseBase):
         self.assertEqual(bonding.parse_bond_options('mode=4 custom=foo:bar'),
                          {'custom': {'foo': 'bar'}, 'mode': '4'})
 
+    @mock.patch.object(cache, 'is_ipv6_local_auto', lambda iface: False)
+    @mock.patch.object(dhclient, 'dhcp_status', lambda: {
+        ('eth0', 6): (1234, '/var/run/dhclient6-eth0.pid'),
+        ('eth1', 4): (1235, '/var/run/dhclient4-eth1.pid')})
+    def test_collector_reports_dhcp_from_single_lookup(self):
+        collector = cache._Collector(routes=defaultdict(list),
+                                     ipaddrs=defaultdict(list))
+        eth0 = collector.ip_info('eth0')
+        eth1 = collector.ip_info('eth1')
+        eth2 = collector.ip_info('eth2')
+        self.assertEqual((eth0['dhcpv4'], eth0['dhcpv6']), (False, True))
+        self.assertEqual((eth1['dhcpv4'], eth1['dhcpv6']), (True, False))
+        self.assertEqual((eth2['dhcpv4'], eth2['dhcpv6']), (False, False))
+        self.assertFalse(eth0['ipv4defaultroute'])
+
+    @mock.patch.object(dhclient, 'pgrep', lambda name: [])
+    def test_dhcp_status_without_dhclients(self):
+        self.assertEqual(dhclient.dhcp_status(), {})
+
 
 @attr(type='integration')
 class TestIPv6Addresses(TestCaseBase):
@@ -454,3 +479,33 @@ class TestIPv6Addresses(TestCaseBase):
                                  ip_addrs[0]['address'][:len(IPV6_NETADDRESS)])
 
                 self.assertEqual('link', ip_addrs[1]['scope'])
+
+
+@attr(type='integration')
+class TestNetinfoReportScale(TestCaseBase):
+
+    DEVICES = 100
+
+    @stresstest
+    @ValidateRunningAsRoot
+    @mock.patch.object(ipwrapper.Link, '_fakeNics', ['dummy_*'])
+    def test_report_many_devices(self):
+        with dummy_devices(self.DEVICES) as nics:
+            with vlan_devices(nics, tag=100):
+                start = time.time()
+                netinfo = get()
+                elapsed = time.time() - start
+
+                start = time.time()
+                for nic in nics:
+                    for family in (4, 6):
+                        self.assertEqual(netinfo['nics'][nic]['dhcpv%s' %
+                                                              family],
+                                         dhclient.is_active(nic, family))
+                per_device = time.time() - start
+
+                for nic in nics:
+                    self.assertIn('%s.100' % nic, netinfo['vlans'])
+                print('netinfo report of %d devices: %.3f seconds, per device '
+                      'dhclient lookup of %d devices: %.3f seconds' %
+                      (2 * len(nics), elapsed, len(nics), per_device))
@@ -141,6 +141,20 @@ def vlan_device(link, tag=16):
             pass
 
 
+@contextmanager
+def vlan_devices(links, tag=16):
+    vlans = []
+    try:
+        for link in links:
+            vlan = Vlan(link, tag)
+            vlan.addDevice()
+            vlans.append(vlan)
+        yield [v.devName for v in vlans]
+    finally:
+        for vlan in vlans:
+            vlan.delDevice()
+
+
 @contextmanager
 def network_namespace(name):
     netns_add(name)
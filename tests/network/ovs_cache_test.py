@@ -0,0 +1,214 @@
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+from __future__ import absolute_import
+
+from uuid import UUID
+
+from nose.plugins.attrib import attr
+
+from monkeypatch import MonkeyPatchScope
+from testlib import VdsmTestCase
+
+from vdsm.network.ovs import cache
+from vdsm.network.ovs import info
+
+
+BRIDGE = 'c6d7bd2b-1bf8-4cc0-8b3d-1f6e8e1e2f10'
+PORT_BRIDGE = '0d8b4e1d-4b7a-4f7c-9f47-2ef5b8c1d001'
+PORT_NIC = '0d8b4e1d-4b7a-4f7c-9f47-2ef5b8c1d002'
+PORT_NET = '0d8b4e1d-4b7a-4f7c-9f47-2ef5b8c1d003'
+PORT_NET2 = '0d8b4e1d-4b7a-4f7c-9f47-2ef5b8c1d004'
+IFACE_BRIDGE = '6a0f3c1e-9b55-4e39-8d2f-6c1b1c8e2001'
+IFACE_NIC = '6a0f3c1e-9b55-4e39-8d2f-6c1b1c8e2002'
+IFACE_NET = '6a0f3c1e-9b55-4e39-8d2f-6c1b1c8e2003'
+IFACE_NET2 = '6a0f3c1e-9b55-4e39-8d2f-6c1b1c8e2004'
+OVS = '5e4c2a17-0c8e-4a35-9e55-0d7b54e1f3a0'
+
+# Recorded with: ovsdb-client monitor --format=json Open_vSwitch \
+#   Bridge name,ports,stp_enable Port name,interfaces,tag,other_config \
+#   Interface name,mac_in_use Open_vSwitch next_cfg
+INITIAL = """\
+{"caption":"Bridge table","data":[["%(bridge)s","initial","vdsmbr_test",\
+["set",[["uuid","%(port_bridge)s"],["uuid","%(port_nic)s"],\
+["uuid","%(port_net)s"]]],false]],\
+"headings":["row","action","name","ports","stp_enable"]}
+{"caption":"Port table","data":[\
+["%(port_bridge)s","initial","vdsmbr_test",["uuid","%(iface_bridge)s"],\
+["set",[]],["map",[]]],\
+["%(port_nic)s","initial","eth0",["uuid","%(iface_nic)s"],\
+["set",[]],["map",[["vdsm_level","southbound"]]]],\
+["%(port_net)s","initial","test-network",["uuid","%(iface_net)s"],\
+10,["map",[["vdsm_level","northbound"]]]]],\
+"headings":["row","action","name","interfaces","tag","other_config"]}
+{"caption":"Interface table","data":[\
+["%(iface_bridge)s","initial","vdsmbr_test","12:5e:7d:f3:a8:44"],\
+["%(iface_nic)s","initial","eth0","52:54:00:13:7a:11"],\
+["%(iface_net)s","initial","test-network","52:54:00:13:7a:11"]],\
+"headings":["row","action","name","mac_in_use"]}
+{"caption":"Open_vSwitch table","data":[["%(ovs)s","initial",3]],\
+"headings":["row","action","next_cfg"]}
+"""
+
+ADD_NETWORK = """\
+{"caption":"Bridge table","data":[["%(bridge)s","old","",\
+["set",[["uuid","%(port_bridge)s"],["uuid","%(port_nic)s"],\
+["uuid","%(port_net)s"]]],""],\
+["%(bridge)s","new","vdsmbr_test",\
+["set",[["uuid","%(port_bridge)s"],["uuid","%(port_nic)s"],\
+["uuid","%(port_net)s"],["uuid","%(port_net2)s"]]],false]],\
+"headings":["row","action","name","ports","stp_enable"]}
+{"caption":"Port table","data":[\
+["%(port_net2)s","insert","test-network2",["uuid","%(iface_net2)s"],\
+20,["map",[["vdsm_level","northbound"]]]]],\
+"headings":["row","action","name","interfaces","tag","other_config"]}
+{"caption":"Interface table","data":[\
+["%(iface_net2)s","insert","test-network2",["set",[]]]],\
+"headings":["row","action","name","mac_in_use"]}
+{"caption":"Open_vSwitch table","data":[["%(ovs)s","old",3],\
+["%(ovs)s","new",4]],\
+"headings":["row","action","next_cfg"]}
+"""
+
+REMOVE_NETWORK = """\
+{"caption":"Bridge table","data":[["%(bridge)s","old","",\
+["set",[["uuid","%(port_bridge)s"],["uuid","%(port_nic)s"],\
+["uuid","%(port_net)s"],["uuid","%(port_net2)s"]]],""],\
+["%(bridge)s","new","vdsmbr_test",\
+["set",[["uuid","%(port_bridge)s"],["uuid","%(port_nic)s"],\
+["uuid","%(port_net2)s"]]],false]],\
+"headings":["row","action","name","ports","stp_enable"]}
+{"caption":"Port table","data":[\
+["%(port_net)s","delete","test-network",["uuid","%(iface_net)s"],\
+10,["map",[["vdsm_level","northbound"]]]]],\
+"headings":["row","action","name","interfaces","tag","other_config"]}
+{"caption":"Interface table","data":[\
+["%(iface_net)s","delete","test-network","52:54:00:13:7a:11"]],\
+"headings":["row","action","name","mac_in_use"]}
+{"caption":"Open_vSwitch table","data":[["%(ovs)s","old",4],\
+["%(ovs)s","new",5]],\
+"headings":["row","action","next_cfg"]}
+"""
+
+UUIDS = {
+    'bridge': BRIDGE,
+    'port_bridge': PORT_BRIDGE,
+    'port_nic': PORT_NIC,
+    'port_net': PORT_NET,
+    'port_net2': PORT_NET2,
+    'iface_bridge': IFACE_BRIDGE,
+    'iface_nic': IFACE_NIC,
+    'iface_net': IFACE_NET,
+    'iface_net2': IFACE_NET2,
+    'ovs': OVS,
+}
+
+
+def replay(ovsdb_cache, output):
+    for line in (output % UUIDS).splitlines():
+        ovsdb_cache.update(line)
+
+
+def by_name(rows):
+    return {row['name']: row for row in rows}
+
+
+@attr(type='unit')
+class TestOvsDBCache(VdsmTestCase):
+
+    def test_initial(self):
+        ovsdb_cache = cache.OvsDBCache()
+        replay(ovsdb_cache, INITIAL)
+        bridges, ports, ifaces = ovsdb_cache.tables(
+            'Bridge', 'Port', 'Interface')
+
+        self.assertEqual(bridges, [{
+            '_uuid': UUID(BRIDGE),
+            'name': 'vdsmbr_test',
+            'ports': [UUID(PORT_BRIDGE), UUID(PORT_NIC), UUID(PORT_NET)],
+            'stp_enable': False}])
+        ports = by_name(ports)
+        self.assertEqual(ports['vdsmbr_test'], {
+            '_uuid': UUID(PORT_BRIDGE),
+            'name': 'vdsmbr_test',
+            'interfaces': [UUID(IFACE_BRIDGE)],
+            'tag': None,
+            'other_config': {}})
+        self.assertEqual(ports['test-network']['tag'], 10)
+        self.assertEqual(by_name(ifaces)['eth0']['mac_in_use'],
+                         '52:54:00:13:7a:11')
+        self.assertEqual(ovsdb_cache.next_cfg, 3)
+
+    def test_insert_and_modify(self):
+        ovsdb_cache = cache.OvsDBCache()
+        replay(ovsdb_cache, INITIAL)
+        replay(ovsdb_cache, ADD_NETWORK)
+        bridges, ports, ifaces = ovsdb_cache.tables(
+            'Bridge', 'Port', 'Interface')
+
+        self.assertEqual(len(bridges[0]['ports']), 4)
+        self.assertEqual(by_name(ports)['test-network2']['tag'], 20)
+        self.assertIsNone(by_name(ifaces)['test-network2']['mac_in_use'])
+        self.assertEqual(ovsdb_cache.next_cfg, 4)
+
+    def test_delete(self):
+        ovsdb_cache = cache.OvsDBCache()
+        replay(ovsdb_cache, INITIAL)
+        replay(ovsdb_cache, ADD_NETWORK)
+        replay(ovsdb_cache, REMOVE_NETWORK)
+        bridges, ports, ifaces = ovsdb_cache.tables(
+            'Bridge', 'Port', 'Interface')
+
+        self.assertNotIn(UUID(PORT_NET), bridges[0]['ports'])
+        self.assertEqual(set(by_name(ports)),
+                         {'vdsmbr_test', 'eth0', 'test-network2'})
+        self.assertEqual(set(by_name(ifaces)),
+                         {'vdsmbr_test', 'eth0', 'test-network2'})
+        self.assertEqual(ovsdb_cache.next_cfg, 5)
+
+    def test_unexpected_output(self):
+        ovsdb_cache = cache.OvsDBCache()
+        ovsdb_cache.update('ovsdb-client: unexpected output')
+        self.assertIsNone(ovsdb_cache.next_cfg)
+
+    def test_wait_for_cfg(self):
+        ovsdb_cache = cache.OvsDBCache()
+        replay(ovsdb_cache, INITIAL)
+        self.assertTrue(ovsdb_cache.wait_for_cfg(3, timeout=0))
+        # The monitor is not running, so the cache will not catch up.
+        self.assertFalse(ovsdb_cache.wait_for_cfg(4, timeout=1))
+
+    def test_ovs_info(self):
+        ovsdb_cache = cache.OvsDBCache()
+        replay(ovsdb_cache, INITIAL)
+        with MonkeyPatchScope([(cache, 'get', lambda: ovsdb_cache)]):
+            ovs_info = info.OvsInfo()
+
+        self.assertEqual(ovs_info.bridges, {
+            'vdsmbr_test': {
+                'ports': {
+                    'vdsmbr_test': {'tag': None, 'level': None},
+                    'eth0': {'tag': None, 'level': info.SOUTHBOUND},
+                    'test-network': {'tag': 10, 'level': info.NORTHBOUND},
+                },
+                'stp': False,
+            }
+        })
+        self.assertEqual(ovs_info.bridges_by_sb, {'eth0': 'vdsmbr_test'})
+        self.assertEqual(ovs_info.northbounds_by_sb,
+                         {'eth0': {'test-network'}})
@@ -25,9 +25,11 @@ from nose.plugins.attrib import attr
 
 from .nettestlib import dummy_device
 from .ovsnettestlib import OvsService, TEST_BRIDGE, TEST_BOND
+from monkeypatch import MonkeyPatchScope
 from testlib import VdsmTestCase
 from testValidation import ValidateRunningAsRoot
 
+from vdsm.network.ovs import cache
 from vdsm.network.ovs.driver import create
 from vdsm.network.ovs.driver import vsctl
 
@@ -168,6 +170,76 @@ class TestOvsVsctlCommand(VdsmTestCase):
         self.assertEqual(
             TestOvsVsctlCommand.PROCESSED_VSCTL_LIST_BRIDGE_OUTPUT, cmd.result)
 
+    def test_changes_db(self):
+        ovsdb = vsctl.Vsctl()
+        self.assertTrue(ovsdb.add_br('br0', may_exist=True).changes_db)
+        self.assertTrue(ovsdb.set_port_attr('p0', 'tag', 10).changes_db)
+        self.assertFalse(ovsdb.list_bridge_info().changes_db)
+        self.assertFalse(ovsdb.list_ports('br0').changes_db)
+        self.assertFalse(ovsdb.do_nothing().changes_db)
+
+    def test_transaction_waits_for_cache(self):
+        ovsdb = vsctl.Vsctl()
+        commands = []
+        waited = []
+
+        def execCmd(cmd):
+            commands.append(cmd)
+            if 'next_cfg' in cmd:
+                return 0, ['8'], []
+            # add-br output
+            return 0, [''], []
+
+        with MonkeyPatchScope([(vsctl, 'execCmd', execCmd),
+                               (vsctl, '_ovs_vsctl_cmd', lambda: 'vsctl'),
+                               (cache, 'wait_for', waited.append)]):
+            with ovsdb.transaction() as t:
+                t.add(ovsdb.add_br('br0'))
+
+        self.assertEqual(t.result, [[]])
+        self.assertEqual(t.next_cfg, 8)
+        self.assertEqual(waited, [8])
+        # The transaction does not write to the Open_vSwitch table.
+        self.assertNotIn('Open_vSwitch', commands[0])
+        self.assertIn('--no-wait', commands[1])
+
+    def test_transaction_invalidates_cache(self):
+        ovsdb = vsctl.Vsctl()
+        invalidated = []
+
+        def execCmd(cmd):
+            if 'next_cfg' in cmd:
+                return 1, [], ['error']
+            return 0, [''], []
+
+        with MonkeyPatchScope([(vsctl, 'execCmd', execCmd),
+                               (vsctl, '_ovs_vsctl_cmd', lambda: 'vsctl'),
+                               (cache, 'wait_for', lambda next_cfg: None),
+                               (cache, 'invalidate',
+                                lambda: invalidated.append(True))]):
+            with ovsdb.transaction() as t:
+                t.add(ovsdb.add_br('br0'))
+
+        self.assertIsNone(t.next_cfg)
+        self.assertEqual(invalidated, [True])
+
+    def test_read_only_transaction(self):
+        ovsdb = vsctl.Vsctl()
+        waited = []
+
+        def execCmd(cmd):
+            return 0, ['br0'], []
+
+        with MonkeyPatchScope([(vsctl, 'execCmd', execCmd),
+                               (vsctl, '_ovs_vsctl_cmd', lambda: 'vsctl'),
+                               (cache, 'wait_for', waited.append)]):
+            with ovsdb.transaction() as t:
+                t.add(ovsdb.list_br())
+
+        self.assertEqual(t.result, [['br0']])
+        self.assertIsNone(t.next_cfg)
+        self.assertEqual(waited, [])
+
 
 @attr(type='integration')
 class TestOvsApiBase(VdsmTestCase):
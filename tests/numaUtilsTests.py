@@ -46,6 +46,12 @@ _VM_RUN_FILE_CONTENT = """
 
 class TestNumaUtils(TestCaseBase):
 
+    def setUp(self):
+        numa.invalidate_topology()
+
+    def tearDown(self):
+        numa.invalidate_topology()
+
     @MonkeyPatch(ET, 'parse',
                  lambda x: ET.fromstring(_VM_RUN_FILE_CONTENT))
     @MonkeyPatch(os.path, 'getmtime',
@@ -84,6 +90,27 @@ class TestNumaUtils(TestCaseBase):
                 vm_numa_info = numa.getVmNumaNodeRuntimeInfo(testvm)
                 self.assertEqual(expectedResult, vm_numa_info)
 
+    @MonkeyPatch(numa, 'supervdsm', fake.SuperVdsm())
+    @MonkeyPatch(numa,
+                 'topology',
+                 lambda: {'0': {'cpus': [0, 1, 2, 3],
+                                'totalMemory': '49141'},
+                          '1': {'cpus': [4, 5, 6, 7],
+                                'totalMemory': '49141'}})
+    def testVmsNumaNodeRuntimeInfo(self):
+        VM_PARAMS = {'guestNumaNodes': [{'cpus': '0,1',
+                                         'memory': '1024',
+                                         'nodeIndex': 0},
+                                        {'cpus': '2',
+                                         'memory': '1024',
+                                         'nodeIndex': 1}]}
+        with fake.VM(dict(VM_PARAMS, vmId='vm1', vmName='vm1')) as vm1, \
+                fake.VM(dict(VM_PARAMS, vmId='vm2', vmName='vm2')) as vm2:
+            vms_numa_info = numa.getVmsNumaNodeRuntimeInfo([vm1, vm2])
+        # vcpu 3 is not assigned to any vm numa node.
+        self.assertEqual(vms_numa_info, {'vm1': {'0': [0, 1], '1': [0, 1]},
+                                         'vm2': {'0': [0, 1], '1': [0, 1]}})
+
 
 class NumaUtilsHelperTests(TestCaseBase):
     """
@@ -22,15 +22,15 @@ from collections import defaultdict
 import threading
 import time
 
-import libvirt
-
 from vdsm import executor
+from vdsm import numa
 from vdsm import schedule
 from vdsm.utils import monotonic_time
 from vdsm.virt import periodic
 from vdsm.virt import vmstatus
 
 
+from monkeypatch import MonkeyPatchScope
 from testValidation import slowtest
 from testlib import expandPermutations, permutations
 from testlib import VdsmTestCase as TestCaseBase
@@ -277,40 +277,46 @@ class VmDispatcherTests(TestCaseBase):
                     vm_id, vm_id)
 
 
-@expandPermutations
 class NumaInfoMonitorTests(TestCaseBase):
 
     def setUp(self):
-        self.vm_id = _fake_vm_id(0)
-        self.vm = _FakeVM(self.vm_id, self.vm_id)
-        self.op = periodic.NumaInfoMonitor(self.vm)
-
-    @permutations([
-        # errcode, migrating, last_status
-        [libvirt.VIR_ERR_NO_DOMAIN, True, vmstatus.UP],
-        [libvirt.VIR_ERR_NO_DOMAIN, False, vmstatus.DOWN],
-    ])
-    def test_swallow_exceptions(self, errcode, migrating, last_status):
-
-        def fail(*args):
-            raise fake.Error(errcode)
-
-        self.vm.updateNumaInfo = fail
-
-        self.vm.migrating = migrating
-        self.vm.lastStatus = last_status
-        self.assertNotRaises(self.op)
-
-    def test_propagate_exceptions(self):
-
-        def fail(*args):
-            raise fake.Error(libvirt.VIR_ERR_NO_DOMAIN)
-
-        self.vm.updateNumaInfo = fail
-
-        self.vm.migrating = False
-        self.vm.lastStatus = vmstatus.UP
-        self.assertRaises(libvirt.libvirtError, self.op)
+        self.vms = {}
+        for i in range(3):
+            vm_id = _fake_vm_id(i)
+            self.vms[vm_id] = _FakeVM(vm_id, vm_id)
+        self.op = periodic.NumaInfoMonitor(lambda: self.vms)
+        self.calls = []
+
+    def test_update_vms_in_one_call(self):
+        self.vms[_fake_vm_id(1)].hasGuestNumaNode = False
+        self.vms[_fake_vm_id(2)].monitorable = False
+        with MonkeyPatchScope([(numa, 'getVmsNumaNodeRuntimeInfo',
+                                self._numa_info)]):
+            self.op()
+        self.assertEqual(self.calls, [[_fake_vm_id(0)]])
+        self.assertEqual(self.vms[_fake_vm_id(0)].numa_info,
+                         {'0': [0]})
+        self.assertIsNone(self.vms[_fake_vm_id(1)].numa_info)
+        self.assertIsNone(self.vms[_fake_vm_id(2)].numa_info)
+
+    def test_vm_not_running(self):
+        with MonkeyPatchScope([(numa, 'getVmsNumaNodeRuntimeInfo',
+                                lambda vms: {})]):
+            self.op()
+        for vm in self.vms.values():
+            self.assertEqual(vm.numa_info, {})
+
+    def test_no_numa_vms(self):
+        for vm in self.vms.values():
+            vm.hasGuestNumaNode = False
+        with MonkeyPatchScope([(numa, 'getVmsNumaNodeRuntimeInfo',
+                                self._numa_info)]):
+            self.op()
+        self.assertEqual(self.calls, [])
+
+    def _numa_info(self, vms):
+        self.calls.append([vm.id for vm in vms])
+        return {vm.id: {'0': [0]} for vm in vms}
 
 
 def _fake_vm_id(i):
@@ -359,7 +365,7 @@ class _FakeExecutor(object):
         self.attempts = 0
         self.done = threading.Event()
 
-    def dispatch(self, func, timeout):
+    def dispatch(self, func, timeout, priority=executor.PRIORITY_NORMAL):
         if (self._max_attempts is not None and
            self.attempts == self._max_attempts):
             self.done.set()
@@ -382,6 +388,8 @@ class _FakeVM(object):
         self.migrating = False
         self.lastStatus = vmstatus.UP
         self.monitorable = True
+        self.hasGuestNumaNode = True
+        self.numa_info = None
 
     def isDomainReadyForCommands(self):
         return True
@@ -389,5 +397,5 @@ class _FakeVM(object):
     def isMigrating(self):
         return self.migrating
 
-    def updateNumaInfo(self):
-        pass
+    def updateNumaInfo(self, numa_info):
+        self.numa_info = numa_info
@@ -24,15 +24,17 @@ import random
 import threading
 
 from vdsm import numa
+from vdsm import utils
 from vdsm.network import ipwrapper
 from vdsm.password import ProtectedPassword
 from vdsm.virt import sampling
 
 from testValidation import ValidateRunningAsRoot
+from testValidation import stresstest
 from testlib import permutations, expandPermutations
 from testlib import VdsmTestCase as TestCaseBase
 from monkeypatch import MonkeyPatchScope
-from network.nettestlib import dummy_device
+from network.nettestlib import Dummy, dummy_device
 
 
 @contextmanager
@@ -58,12 +60,21 @@ class InterfaceSampleTests(TestCaseBase):
         self.NEW_VLAN = 'vlan_%s' % (random.randint(0, 1000))
 
     def testDiff(self):
-        lo = ipwrapper.getLink('lo')
+        lo = ipwrapper.getLink('lo', stats=True)
         s0 = sampling.InterfaceSample(lo)
         s1 = sampling.InterfaceSample(lo)
         s1.operstate = 'x'
         self.assertEquals('operstate:x', s1.connlog_diff(s0))
 
+    def testStats(self):
+        lo = ipwrapper.getLink('lo', stats=True)
+        s = sampling.InterfaceSample(lo)
+        with open('/sys/class/net/lo/statistics/rx_errors') as f:
+            self.assertEqual(s.rxErrors, int(f.read()))
+        self.assertTrue(s.rx >= 0 and s.tx >= 0)
+        self.assertEqual(s.operstate, 'up' if lo.oper_up else 'down')
+        self.assertEqual(s.duplex, 'unknown')
+
     @ValidateRunningAsRoot
     def testHostSampleReportsNewInterface(self):
         interfaces_before = set(
@@ -79,8 +90,8 @@ class InterfaceSampleTests(TestCaseBase):
     def testHostSampleHandlesDisappearingVlanInterfaces(self):
         original_getLinks = ipwrapper.getLinks
 
-        def faultyGetLinks():
-            all_links = list(original_getLinks())
+        def faultyGetLinks(**kwargs):
+            all_links = list(original_getLinks(**kwargs))
             ipwrapper.linkDel(self.NEW_VLAN)
             return iter(all_links)
 
@@ -90,6 +101,23 @@ class InterfaceSampleTests(TestCaseBase):
                 interfaces_and_samples = sampling._get_interfaces_and_samples()
                 self.assertNotIn(self.NEW_VLAN, interfaces_and_samples)
 
+    @ValidateRunningAsRoot
+    @stresstest
+    def testHostSampleManyInterfacesBenchmark(self):
+        dummies = [Dummy() for i in range(500)]
+        try:
+            for dummy in dummies:
+                dummy.create()
+            start = utils.monotonic_time()
+            for i in range(10):
+                sampling._get_interfaces_and_samples()
+            elapsed = utils.monotonic_time() - start
+        finally:
+            for dummy in dummies:
+                dummy.remove()
+        print("10 samples of %d interfaces in %.3f seconds" %
+              (len(dummies), elapsed))
+
 
 @expandPermutations
 class SampleWindowTests(TestCaseBase):
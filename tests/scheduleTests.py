@@ -166,11 +166,39 @@ class SchedulerTests(VdsmTestCase):
             # avg latency 1 millisecond.
             self.assertTrue(max < 0.1)
 
+    @permutations(PERMUTATIONS)
+    def test_coalesce_calls_in_tick(self, clock):
+        self.create_scheduler(clock, tick=0.2)
+        task1 = Task(clock)
+        task2 = Task(clock)
+        # Start just after a tick boundary, so both deadlines are in the
+        # next tick.
+        time.sleep(0.2 - self.clock() % 0.2 + 0.005)
+        deadline = self.clock() + 0.1
+        self.scheduler.schedule(0.1, task1)
+        self.scheduler.schedule(0.15, task2)
+        task2.wait(0.4 + self.GRACETIME)
+        self.assertTrue(deadline <= task1.call_time)
+        self.assertTrue(task2.call_time - task1.call_time < 0.01)
+
+    @permutations(PERMUTATIONS)
+    def test_lateness(self, clock):
+        self.create_scheduler(clock)
+        task = Task(clock)
+        self.scheduler.schedule(0.1, task)
+        task.wait(0.1 + self.GRACETIME)
+        site = "scheduleTests.Task"
+        count, avg, max = self.scheduler.lateness()[site]
+        self.assertEqual(count, 1)
+        self.assertTrue(0 <= avg < self.GRACETIME)
+        self.assertEqual(avg, max)
+        self.assertIn(site, schedule.lateness()["Scheduler"])
+
     # Helpers
 
-    def create_scheduler(self, clock):
+    def create_scheduler(self, clock, **kw):
         self.clock = clock
-        self.scheduler = schedule.Scheduler(clock=clock)
+        self.scheduler = schedule.Scheduler(clock=clock, **kw)
         self.scheduler.start()
 
 
@@ -250,3 +278,113 @@ class TestScheduledCall(VdsmTestCase):
         call_soon = schedule.ScheduledCall(now, self.callback)
         call_later = schedule.ScheduledCall(now + 1, self.callback)
         self.assertLess(call_soon, call_later)
+
+
+class FakeCall(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.canceled = False
+
+    def valid(self):
+        return not self.canceled
+
+    def __repr__(self):
+        return self.name
+
+
+@expandPermutations
+class TimerWheelTests(VdsmTestCase):
+
+    def test_empty(self):
+        wheel = schedule._TimerWheel(0)
+        self.assertEqual(wheel.next_expiration(), None)
+        self.assertEqual(wheel.advance(1000), [])
+
+    def test_expire_at_tick(self):
+        wheel = schedule._TimerWheel(0)
+        call = FakeCall("call")
+        wheel.add(10, call)
+        self.assertEqual(wheel.next_expiration(), 10)
+        self.assertEqual(wheel.advance(9), [])
+        self.assertEqual(wheel.advance(10), [call])
+        self.assertEqual(len(wheel), 0)
+
+    def test_expire_in_order(self):
+        wheel = schedule._TimerWheel(0)
+        calls = [FakeCall(str(i)) for i in range(4)]
+        wheel.add(20, calls[2])
+        wheel.add(10, calls[0])
+        wheel.add(10, calls[1])
+        wheel.add(30, calls[3])
+        self.assertEqual(wheel.advance(30), calls)
+
+    def test_expire_past_call_now(self):
+        wheel = schedule._TimerWheel(100)
+        call = FakeCall("call")
+        wheel.add(50, call)
+        self.assertEqual(wheel.advance(100), [call])
+
+    @permutations([
+        # expires
+        (255,),
+        (256,),
+        (1000,),
+        (65535,),
+        (65536,),
+        (1000000,),
+        (2 ** 32 + 5,),
+    ])
+    def test_expire_from_higher_levels(self, expires):
+        wheel = schedule._TimerWheel(0)
+        call = FakeCall("call")
+        wheel.add(expires, call)
+        # Step like the scheduler does, waking up at each expiration.
+        now = 0
+        while True:
+            now = wheel.next_expiration()
+            expired = wheel.advance(now)
+            if expired:
+                break
+            self.assertLessEqual(now, expires)
+        self.assertEqual(expired, [call])
+        self.assertEqual(now, expires)
+
+    def test_advance_over_many_ticks(self):
+        wheel = schedule._TimerWheel(0)
+        calls = [FakeCall(str(i)) for i in range(3)]
+        wheel.add(300, calls[0])
+        wheel.add(70000, calls[1])
+        wheel.add(10 ** 7, calls[2])
+        self.assertEqual(wheel.advance(69999), [calls[0]])
+        self.assertEqual(wheel.advance(70000), [calls[1]])
+        self.assertEqual(wheel.advance(10 ** 7 - 1), [])
+        self.assertEqual(wheel.advance(10 ** 7), [calls[2]])
+
+    def test_move_at_round_start(self):
+        wheel = schedule._TimerWheel(0)
+        early = FakeCall("early")
+        late = FakeCall("late")
+        wheel.add(260, early)  # Level 1, moved at tick 256
+        self.assertEqual(wheel.advance(199), [])
+        wheel.add(300, late)  # Level 0, next round
+        self.assertEqual(wheel.advance(255), [])
+        self.assertEqual(wheel.next_expiration(), 256)
+        self.assertEqual(wheel.advance(260), [early])
+        self.assertEqual(wheel.advance(300), [late])
+
+    def test_cancel(self):
+        wheel = schedule._TimerWheel(0)
+        call = FakeCall("call")
+        wheel.add(1000, call)
+        call.canceled = True
+        self.assertEqual(wheel.advance(1000), [])
+        self.assertEqual(len(wheel), 0)
+
+    def test_clear(self):
+        wheel = schedule._TimerWheel(0)
+        calls = [FakeCall(str(i)) for i in range(3)]
+        for i, call in enumerate(calls):
+            wheel.add(10 ** (i * 3), call)
+        self.assertEqual(sorted(wheel.clear(), key=repr), calls)
+        self.assertEqual(len(wheel), 0)
@@ -22,6 +22,7 @@ from __future__ import print_function
 import errno
 import os
 import re
+import shutil
 from six.moves import xmlrpc_client as xmlrpclib
 import socket
 import ssl
@@ -30,20 +31,23 @@ import tempfile
 import threading
 
 from contextlib import contextmanager, closing
+from monkeypatch import MonkeyPatchScope
 from testlib import VdsmTestCase as TestCaseBase
-from nose.plugins.skip import SkipTest
+from testlib import expandPermutations, permutations
+from testlib import make_config
+from testlib import namedTemporaryDir
 try:
     from vdsm.m2cutils import VerifyingSafeTransport
     from integration.m2chelper import TestServer, \
         get_server_socket, KEY_FILE, \
         CRT_FILE, OTHER_KEY_FILE, OTHER_CRT_FILE
-    _m2cEnabled = True
 except ImportError:
     from vdsm.sslutils import VerifyingSafeTransport
     from integration.sslhelper import TestServer, \
         get_server_socket, KEY_FILE, \
         CRT_FILE, OTHER_KEY_FILE, OTHER_CRT_FILE
-    _m2cEnabled = False
+from vdsm import sslutils
+from vdsm.sslutils import SSLContext
 
 
 HOST = '127.0.0.1'
@@ -264,10 +268,13 @@ class SSLTests(TestCaseBase):
         command and the data generated in the standard output.
         """
 
+        # With TLS 1.3 the client certificate is verified after the
+        # handshake, and the session id is not kept when resuming.
         command = [
             "openssl",
             "s_client",
             "-connect", "%s:%d" % self.address,
+            "-tls1_2",
         ]
         if args:
             command += args
@@ -333,12 +340,6 @@ class SSLTests(TestCaseBase):
         Verify that SSL the session identifier is preserved when
         connecting two times without stopping the server.
         """
-        if not _m2cEnabled:
-            raise SkipTest(
-                'support for SSL sessions discontinued and may be reintroduced'
-                ' when we move to python 3'
-            )
-
         # Create a temporary file to store the session details:
         sessionDetailsFile = tempfile.NamedTemporaryFile(delete=False)
 
@@ -374,6 +375,110 @@ class SSLTests(TestCaseBase):
         self.assertEquals(secondSessionId, firstSessionId)
 
 
+class SSLContextTests(TestCaseBase):
+
+    def setUp(self):
+        self.sslctx = SSLContext(cert_file=CRT_FILE, key_file=KEY_FILE,
+                                 ca_certs=CRT_FILE)
+        sock = socket.socket()
+        sock.bind((HOST, 0))
+        sock.listen(5)
+        self.address = sock.getsockname()
+        self.server = self.sslctx.wrapSocket(sock, server_side=True)
+        self.thread = SSLServerThread(self.server)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.thread.shutdown()
+        self.thread.join()
+        self.server.close()
+
+    def test_echo(self):
+        with closing(self.sslctx.wrapSocket(socket.socket())) as client:
+            client.connect(self.address)
+            client.sendall(b"hello")
+            self.assertEqual(client.recv(5), b"hello")
+
+        stats = self.sslctx.stats()
+        self.assertEqual(stats['client.full_handshakes'], 1)
+        self.assertEqual(stats['server.full_handshakes'], 1)
+
+    def test_peek(self):
+        with closing(self.sslctx.wrapSocket(socket.socket())) as client:
+            client.settimeout(1)
+            client.connect(self.address)
+            client.sendall(b"hello")
+            self.assertEqual(client.recv(2, socket.MSG_PEEK), b"he")
+            self.assertEqual(client.recv(5, socket.MSG_PEEK), b"hello")
+            self.assertEqual(client.pending(), 5)
+            self.assertEqual(client.recv(5), b"hello")
+
+    def test_server_resumes_sessions(self):
+        command = [
+            "openssl",
+            "s_client",
+            "-connect", "%s:%d" % self.address,
+            "-cert", CRT_FILE,
+            "-key", KEY_FILE,
+            "-tls1_2",
+            "-reconnect",
+        ]
+        process = subprocess.Popen(command,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        process.communicate()
+        self.assertEqual(process.wait(), 0)
+
+        stats = self.sslctx.stats()
+        self.assertEqual(stats['server.full_handshakes'], 1)
+        self.assertTrue(stats['server.resumed_handshakes'] > 0)
+
+    def test_reload_modified_certificate(self):
+        with namedTemporaryDir() as tmpdir:
+            cert_file = os.path.join(tmpdir, "cert.pem")
+            key_file = os.path.join(tmpdir, "key.pem")
+            shutil.copy(CRT_FILE, cert_file)
+            shutil.copy(KEY_FILE, key_file)
+            sslctx = SSLContext(cert_file=cert_file, key_file=key_file,
+                                ca_certs=CRT_FILE)
+            contexts = sslctx._contexts()
+            self.assertEqual(sslctx._contexts(), contexts)
+
+            # A renewed certificate.
+            mtime = os.stat(cert_file).st_mtime + 1
+            os.utime(cert_file, (mtime, mtime))
+            self.assertNotEqual(sslctx._contexts(), contexts)
+
+            with closing(sslctx.wrapSocket(socket.socket())) as client:
+                client.connect(self.address)
+                client.sendall(b"hello")
+                self.assertEqual(client.recv(5), b"hello")
+
+
+@expandPermutations
+class CreateSSLContextTests(TestCaseBase):
+
+    @permutations([
+        ('tls', sslutils._NO_LEGACY_PROTOCOLS),
+        ('tlsv1', 0),
+        ('sslv23', 0),
+    ])
+    def test_protocol(self, protocol, options):
+        cfg = make_config([('vars', 'ssl', 'true'),
+                           ('vars', 'ssl_protocol', protocol)])
+        with MonkeyPatchScope([
+            (sslutils, 'config', cfg),
+            (sslutils, '_context', None),
+            (sslutils.constants, 'CERT_FILE', CRT_FILE),
+            (sslutils.constants, 'KEY_FILE', KEY_FILE),
+            (sslutils.constants, 'CA_FILE', CRT_FILE),
+        ]):
+            sslctx = sslutils.create_ssl_context()
+        self.assertEqual(sslctx._options, options)
+
+
 # The address of the tests server:
 ADDRESS = ("127.0.0.1", 8443)
 
@@ -26,8 +26,10 @@ from yajsonrpc.stomp import \
     Command, \
     Frame, \
     Headers, \
-    LEGACY_SUBSCRIPTION_ID_REQUEST
-from yajsonrpc.stompreactor import StompAdapterImpl
+    LEGACY_SUBSCRIPTION_ID_REQUEST, \
+    LEGACY_SUBSCRIPTION_ID_RESPONSE, \
+    Parser
+from yajsonrpc.stompreactor import StompAdapterImpl, StompServer
 
 
 class TestConnection(object):
@@ -338,3 +340,89 @@ class SendFrameTest(TestCaseBase):
 
         resp_frame = adapter.pop_message()
         self.assertEquals(resp_frame.command, Command.MESSAGE)
+
+
+class TestServerConnection(object):
+
+    def __init__(self, closed=False):
+        self.frames = []
+        self._closed = closed
+
+    def send_raw(self, frame):
+        self.frames.append(frame)
+
+    def is_closed(self):
+        return self._closed
+
+
+class TestServerSubscription(object):
+
+    def __init__(self, id, client):
+        self.id = id
+        self.client = client
+
+
+def decode(frame):
+    parser = Parser()
+    parser.parse(frame.encode())
+    return parser.popFrame()
+
+
+class StompServerTest(TestCaseBase):
+
+    def test_send_shared(self):
+        first = TestServerConnection()
+        second = TestServerConnection()
+        closed = TestServerConnection(closed=True)
+        subscriptions = defaultdict(list)
+        subscriptions['jms.queue.events'] = [
+            TestServerSubscription('sub-1', first),
+            TestServerSubscription('sub-2', second),
+            TestServerSubscription('sub-3', closed),
+        ]
+        server = StompServer(Reactor(), subscriptions)
+
+        server.send(u'{"jsonrpc": "2.0", "method": "event"}',
+                    'jms.queue.events')
+
+        self.assertEqual(closed.frames, [])
+        for conn, sub_id in ((first, 'sub-1'), (second, 'sub-2')):
+            frame = decode(conn.frames[0])
+            self.assertEqual(frame.command, Command.MESSAGE)
+            self.assertEqual(frame.headers[Headers.SUBSCRIPTION], sub_id)
+            self.assertEqual(frame.headers[Headers.DESTINATION],
+                             'jms.queue.events')
+            self.assertEqual(frame.headers[Headers.CONTENT_TYPE],
+                             'application/json')
+            self.assertEqual(frame.body,
+                             '{"jsonrpc": "2.0", "method": "event"}')
+
+    def test_send_response(self):
+        conn = TestServerConnection()
+        subscriptions = defaultdict(list)
+        subscriptions['jms.topic.vdsm_responses'] = [
+            TestServerSubscription('sub', conn)]
+        server = StompServer(Reactor(), subscriptions)
+        server._req_dest.update({'1': 'jms.topic.vdsm_responses',
+                                 '2': 'jms.topic.vdsm_responses'})
+
+        server.send_response('[{"id": "1"}, {"id": "2"}]', ['1', '2'])
+
+        frame = decode(conn.frames[0])
+        self.assertEqual(frame.headers[Headers.DESTINATION],
+                         'jms.topic.vdsm_responses')
+        self.assertEqual(frame.body, '[{"id": "1"}, {"id": "2"}]')
+        self.assertEqual(server._req_dest, {})
+
+    def test_send_response_legacy(self):
+        conn = TestServerConnection()
+        subscriptions = defaultdict(list)
+        subscriptions[LEGACY_SUBSCRIPTION_ID_RESPONSE] = [
+            TestServerSubscription('sub', conn)]
+        server = StompServer(Reactor(), subscriptions)
+
+        server.send_response('{"id": null}', [None])
+
+        frame = decode(conn.frames[0])
+        self.assertEqual(frame.headers[Headers.DESTINATION],
+                         LEGACY_SUBSCRIPTION_ID_RESPONSE)
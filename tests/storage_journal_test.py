@@ -0,0 +1,187 @@
+#
+# Copyright 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from testlib import VdsmTestCase
+from testlib import namedTemporaryDir
+from testValidation import stresstest
+
+from vdsm import utils
+from vdsm.storage import journal
+
+
+class LocalOop(object):
+    """
+    Run the file operations of the journal in process.
+    """
+
+    def __init__(self):
+        self.os = os
+        self.fileUtils = self
+
+    def readFile(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def writeFile(self, path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def fsyncPath(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class BlockingOop(LocalOop):
+
+    def __init__(self):
+        super(BlockingOop, self).__init__()
+        self.unblocked = threading.Event()
+
+    def writeFile(self, path, data):
+        self.unblocked.wait()
+        super(BlockingOop, self).writeFile(path, data)
+
+
+@contextmanager
+def running_journal(path, oop=None, **kw):
+    j = journal.Journal(path, oop or LocalOop(), **kw)
+    j.start()
+    try:
+        yield j
+    finally:
+        j.close()
+
+
+class JournalTests(VdsmTestCase):
+
+    def test_empty(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with running_journal(path) as j:
+                self.assertEqual([], j.items())
+            self.assertFalse(os.path.exists(path))
+
+    def test_reload(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with running_journal(path) as j:
+                j.put("a", {"state": "init"})
+                j.put("b", ["line 1", "line 2"])
+                j.put("a", {"state": "finished"})
+                j.remove("b")
+                j.remove("missing")
+            j = journal.Journal(path, LocalOop())
+            self.assertEqual([("a", {"state": "finished"})], j.items())
+
+    def test_corrupted(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with open(path, "wb") as f:
+                f.write(b'{"a": 1, "b"')
+            self.assertRaises(ValueError, journal.Journal, path, LocalOop())
+
+    def test_keep_live_records(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with running_journal(path) as j:
+                for i in range(100):
+                    j.put("a", i)
+                    j.put("b", i)
+                j.put("c", 0)
+                j.remove("c")
+            with open(path, "rb") as f:
+                data = json.loads(f.read().decode("utf8"))
+            self.assertEqual({"a": 99, "b": 99}, data)
+            self.assertFalse(os.path.exists(path + journal._TEMP_EXT))
+            j = journal.Journal(path, LocalOop())
+            self.assertEqual([("a", 99), ("b", 99)], sorted(j.items()))
+
+    def test_closed(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with running_journal(path) as j:
+                pass
+            self.assertRaises(journal.ClosedError, j.put, "a", 1)
+            self.assertRaises(journal.ClosedError, j.remove, "a")
+
+    def test_write_error(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "missing", "journal")
+            with running_journal(path) as j:
+                self.assertRaises(EnvironmentError, j.put, "a", 1)
+                self.assertEqual([], j.items())
+                os.mkdir(os.path.dirname(path))
+                j.put("b", 2)
+            j = journal.Journal(path, LocalOop())
+            self.assertEqual([("b", 2)], j.items())
+
+    def test_timeout(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            oop = BlockingOop()
+            with running_journal(path, oop, timeout=0.1) as j:
+                try:
+                    self.assertRaises(journal.Timeout, j.put, "a", 1)
+                finally:
+                    oop.unblocked.set()
+            j = journal.Journal(path, LocalOop())
+            self.assertEqual([("a", 1)], j.items())
+
+    def test_concurrent_commits(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with running_journal(path) as j:
+                self.run_writers(j, writers=10, puts=20)
+            j = journal.Journal(path, LocalOop())
+            self.assertEqual(10, len(j.items()))
+            for key, value in j.items():
+                self.assertEqual(19, value)
+
+    @stresstest
+    def test_concurrent_commits_benchmark(self):
+        with namedTemporaryDir() as tmpdir:
+            path = os.path.join(tmpdir, "journal")
+            with running_journal(path) as j:
+                start = utils.monotonic_time()
+                self.run_writers(j, writers=50, puts=100)
+                elapsed = utils.monotonic_time() - start
+            print("%d commits in %.3f seconds" % (50 * 100, elapsed))
+
+    def run_writers(self, j, writers, puts):
+        def writer(key):
+            for i in range(puts):
+                j.put(key, i)
+
+        threads = [threading.Thread(target=writer, args=("task-%d" % n,))
+                   for n in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
@@ -542,6 +542,59 @@ class ResourceManagerTests(TestCaseBase):
         self.assertTrue(exclusiveReq2.granted())
         resources.pop().release()  # exclusiveReq 2
 
+    @MonkeyPatch(rm, "_manager", manager())
+    def testUnregisterNamespaceWithResources(self):
+        with rm.acquireResource("storage", "resource", rm.EXCLUSIVE):
+            self.assertRaises(rm.ResourceManagerError,
+                              rm.unregisterNamespace, "storage")
+        rm.unregisterNamespace("storage")
+        self.assertRaises(ValueError, rm.acquireResource, "storage",
+                          "resource", rm.EXCLUSIVE)
+
+    @MonkeyPatch(rm, "_manager", manager())
+    def testLockStats(self):
+        resources = []
+
+        def callback(req, res):
+            resources.append(res)
+
+        exclusive = rm.acquireResource("storage", "resource", rm.EXCLUSIVE)
+        rm._registerResource("storage", "resource", rm.SHARED, callback)
+        canceled = rm._registerResource(
+            "storage", "resource", rm.SHARED, callback)
+        canceled.cancel()
+        rm._registerResource("storage", "resource", rm.EXCLUSIVE, callback)
+
+        stats = rm.lockStats()["storage"]
+        info = stats["resources"]["resource"]
+        self.assertEqual(info["lockType"], rm.EXCLUSIVE)
+        self.assertEqual([h["owner"] for h in info["holders"]],
+                         [threading.current_thread().name])
+        # Canceled requests are not reported.
+        self.assertEqual([w["lockType"] for w in info["waiters"]],
+                         [rm.SHARED, rm.EXCLUSIVE])
+        self.assertEqual(stats["waits"]["count"], 1)
+
+        exclusive.release()
+        resources.pop().release()
+        resources.pop().release()
+
+        stats = rm.lockStats()["storage"]
+        self.assertEqual(stats["resources"], {})
+        self.assertEqual(stats["waits"]["count"], 3)
+        self.assertEqual(sum(stats["waits"]["buckets"].values()), 3)
+
+    @MonkeyPatch(rm, "_manager", manager())
+    def testLockStatsSharedHolders(self):
+        shared1 = rm.acquireResource("storage", "resource", rm.SHARED)
+        shared2 = rm.acquireResource("storage", "resource", rm.SHARED)
+        info = rm.lockStats()["storage"]["resources"]["resource"]
+        self.assertEqual(len(info["holders"]), 2)
+        shared1.release()
+        info = rm.lockStats()["storage"]["resources"]["resource"]
+        self.assertEqual(len(info["holders"]), 1)
+        shared2.release()
+
     @MonkeyPatch(rm, "_manager", manager())
     def testCancelRequest(self):
         resources = []
@@ -701,7 +754,8 @@ class ResourceManagerLockTest(TestCaseBase):
                          {"timeout": None}))
         self.assertEqual(expected, rm._manager.__calls__)
         lock.release()
-        expected.append(('releaseResource', (lock.ns, lock.name), {}))
+        expected.append(('releaseResource', (lock.ns, lock.name),
+                         {"reqID": None}))
         self.assertEqual(expected, rm._manager.__calls__)
 
     def test_repr(self):
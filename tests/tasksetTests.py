@@ -21,10 +21,10 @@
 import multiprocessing
 import os
 import tempfile
+import threading
 
 from nose.plugins.skip import SkipTest
 
-from vdsm import cmdutils
 from vdsm import taskset
 
 from monkeypatch import MonkeyPatchScope
@@ -33,6 +33,9 @@ from testlib import permutations, expandPermutations
 import testlib
 
 
+# Larger than the default pid_max of 32768 and the maximum of 4194304.
+_NO_SUCH_PID = 2 ** 22 + 1
+
 _CPU_COMBINATIONS = (
     [frozenset((0,))],
     [frozenset((0, 3,))],
@@ -89,13 +92,31 @@ class AffinityTests(VdsmTestCase):
 
         self.assertEqual(taskset.get(self.proc.pid), cpu_set)
 
+    @permutations(_CPU_COMBINATIONS)
+    def test_set_all_tasks(self, cpu_set):
+
+        validate_running_with_enough_cpus(cpu_set)
+
+        self.proc = multiprocessing.Process(target=self._run_child_threads)
+        self.proc.start()
+        if not self.running.wait(0.5):
+            raise RuntimeError("helper child process not running!")
+
+        taskset.set(self.proc.pid, cpu_set, all_tasks=True)
+        tids = os.listdir('/proc/%d/task' % self.proc.pid)
+        self.assertEqual(len(tids), 3)
+        for tid in tids:
+            self.assertEqual(taskset.get(tid), cpu_set)
+
     def test_get_raises_on_failure(self):
         # here we just need to feed taskset with any bad input.
-        self.assertRaises(cmdutils.Error, taskset.get, '')
+        self.assertRaises(OSError, taskset.get, _NO_SUCH_PID)
 
     def test_set_raises_on_failure(self):
         # here we just need to feed taskset with any bad input.
-        self.assertRaises(cmdutils.Error, taskset.set, '', 'x')
+        self.assertRaises(OSError, taskset.set, _NO_SUCH_PID, [0])
+        self.assertRaises(OSError, taskset.set, _NO_SUCH_PID, [0],
+                          all_tasks=True)
 
     def _run_child(self, cpu_set=None):
         if cpu_set:
@@ -103,6 +124,14 @@ class AffinityTests(VdsmTestCase):
         self.running.set()
         self.stop.wait()
 
+    def _run_child_threads(self):
+        threads = [threading.Thread(target=self.stop.wait) for i in range(2)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        self.running.set()
+        self.stop.wait()
+
 
 @expandPermutations
 class OnlineCpusFunctionsTests(VdsmTestCase):
@@ -127,6 +156,17 @@ class OnlineCpusFunctionsTests(VdsmTestCase):
             with MonkeyPatchScope([(taskset, "_SYS_ONLINE_CPUS", f.name)]):
                 self.assertEqual(taskset.online_cpus(), cpu_set)
 
+    def test_online_cpus_changed(self):
+        with tempfile.NamedTemporaryFile() as f:
+            with MonkeyPatchScope([(taskset, "_SYS_ONLINE_CPUS", f.name)]):
+                f.write(b'0-3\n')
+                f.flush()
+                self.assertEqual(taskset.online_cpus(), set(range(4)))
+                f.seek(0)
+                f.write(b'0-1\n')
+                f.flush()
+                self.assertEqual(taskset.online_cpus(), set(range(2)))
+
     @permutations([
         # cpu_set, expected
         [frozenset((0,)), 0],
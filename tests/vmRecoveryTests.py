@@ -71,6 +71,46 @@ class RecoveryFileTests(TestCaseBase):
             rec.save(testvm)  # must silently fail
             self.assertEqual(os.listdir(tmpdir), [])
 
+    def test_save_coalesced(self):
+
+        with self.setup_env() as (testvm, tmpdir):
+            rec = recovery.File(testvm.id)
+            with self.writer(60) as writer:
+                for i in range(3):
+                    rec.save(testvm)
+                self.assertEqual(os.listdir(tmpdir), [])
+                self.assertEqual(writer.stats(),
+                                 {'written': 0, 'coalesced': 2})
+
+            # Pending saves are written when the writer is stopped.
+            self.assertEqual(writer.stats(), {'written': 1, 'coalesced': 2})
+            with open(os.path.join(tmpdir, rec.name), 'rb') as f:
+                self.assertTrue(pickle.load(f))
+
+    def test_save_flush(self):
+
+        with self.setup_env() as (testvm, tmpdir):
+            rec = recovery.File(testvm.id)
+            with self.writer(60) as writer:
+                rec.save(testvm)
+                rec.save(testvm, flush=True)
+
+                with open(os.path.join(tmpdir, rec.name), 'rb') as f:
+                    self.assertTrue(pickle.load(f))
+
+            # The pending save was replaced by the flush.
+            self.assertEqual(writer.stats(), {'written': 0, 'coalesced': 0})
+
+    def test_cleanup_pending_save(self):
+
+        with self.setup_env() as (testvm, tmpdir):
+            rec = recovery.File(testvm.id)
+            with self.writer(60):
+                rec.save(testvm)
+                rec.cleanup()
+
+            self.assertEqual(os.listdir(tmpdir), [])
+
     def test_load(self):
 
         with self.setup_env() as (testvm, tmpdir):
@@ -142,6 +182,16 @@ class RecoveryFileTests(TestCaseBase):
             with MonkeyPatchScope([(constants, 'P_VDSM_RUN', tmpdir + '/')]):
                 yield testvm, tmpdir
 
+    @contextlib.contextmanager
+    def writer(self, interval):
+        writer = recovery._Writer(interval)
+        writer.start()
+        try:
+            with MonkeyPatchScope([(recovery, '_writer', writer)]):
+                yield writer
+        finally:
+            writer.stop()
+
 
 @expandPermutations
 class RecoveryFunctionsTests(TestCaseBase):
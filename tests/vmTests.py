@@ -20,6 +20,7 @@
 #
 from __future__ import absolute_import
 
+from contextlib import contextmanager
 from itertools import product
 import logging
 import os.path
@@ -46,7 +47,7 @@ from virt.vmdevices import hwclass
 from virt.vmtune import io_tune_merge, io_tune_dom_to_values, io_tune_to_dom
 from virt import vmxml
 from virt.vmdevices.storage import Drive
-from virt.vmdevices.storage import DISK_TYPE
+from virt.vmdevices.storage import DISK_TYPE, BLOCK_THRESHOLD
 from virt.vmdevices.network import Interface
 from vdsm import constants
 from vdsm import cpuarch
@@ -1741,6 +1742,92 @@ class TestFilterSnappableDiskDevices(TestCaseBase):
         self.assertEqual(devices[:-1], filtered)
 
 
+@expandPermutations
+class TestDriveMonitor(TestCaseBase):
+
+    GiB = 1024 ** 3
+
+    def setUp(self):
+        self.drive = Drive({}, self.log, index=0, iface="virtio",
+                           device="disk", type=hwclass.DISK,
+                           path="/dev/dummy", format="cow",
+                           domainID="domainID", imageID="imageID",
+                           poolID="poolID", volumeID="volumeID")
+        self.drive._blockDev = True
+        self.dom = fake.Domain()
+        self.extended = []
+        self.monitored = []
+
+    @contextmanager
+    def vm(self, event=24):
+        with fake.VM() as machine, MonkeyPatchScope([
+            (libvirtconnection, 'BLOCK_THRESHOLD_EVENT', event),
+            (vm.periodic, 'monitor_drives', self.monitored.append),
+            (machine, 'extendDriveVolume',
+                lambda *args: self.extended.append(args)),
+        ]):
+            machine._dom = self.dom
+            machine._devices[hwclass.DISK].append(self.drive)
+            machine.enableDriveMonitor()
+            yield machine
+
+    def test_set_threshold(self):
+        self.dom.block_info[self.drive.path] = (
+            10 * self.GiB, 1 * self.GiB, 3 * self.GiB)
+        with self.vm() as machine:
+            self.assertTrue(machine.needsDriveMonitoring())
+            self.assertFalse(machine.extendDrivesIfNeeded())
+            self.assertEqual(
+                {"vda": 3 * self.GiB - self.drive.watermarkLimit},
+                self.dom.block_thresholds)
+            self.assertEqual(BLOCK_THRESHOLD.SET, self.drive.threshold_state)
+            # No need to poll the drive until the threshold is exceeded.
+            self.assertFalse(machine.needsDriveMonitoring())
+
+    @permutations([["vda"], ["vda[1]"]])
+    def test_threshold_exceeded(self, target):
+        self.drive.threshold_state = BLOCK_THRESHOLD.SET
+        with self.vm() as machine:
+            machine.onBlockThreshold(target, self.drive.path, 1, 1)
+            self.assertEqual(BLOCK_THRESHOLD.EXCEEDED,
+                             self.drive.threshold_state)
+            self.assertEqual([machine], self.monitored)
+            self.assertTrue(machine.needsDriveMonitoring())
+
+    def test_threshold_unknown_drive(self):
+        with self.vm() as machine:
+            machine.onBlockThreshold("vdz", "/dev/other", 1, 1)
+            self.assertEqual([], self.monitored)
+
+    def test_extend(self):
+        self.drive.threshold_state = BLOCK_THRESHOLD.EXCEEDED
+        self.dom.block_info[self.drive.path] = (
+            10 * self.GiB, 3 * self.GiB - 1, 3 * self.GiB)
+        with self.vm() as machine:
+            self.assertTrue(machine.extendDrivesIfNeeded())
+            self.assertEqual(
+                [(self.drive, "volumeID", 3 * self.GiB, 10 * self.GiB)],
+                self.extended)
+            # The threshold is set after the extension is completed.
+            self.assertEqual({}, self.dom.block_thresholds)
+            self.assertTrue(machine.needsDriveMonitoring())
+
+    def test_reset_threshold_after_extension(self):
+        self.drive.threshold_state = BLOCK_THRESHOLD.SET
+        with self.vm() as machine:
+            machine._resetDriveThreshold(self.drive.name)
+            self.assertEqual(BLOCK_THRESHOLD.UNSET,
+                             self.drive.threshold_state)
+
+    def test_events_not_supported(self):
+        self.dom.block_info[self.drive.path] = (
+            10 * self.GiB, 1 * self.GiB, 3 * self.GiB)
+        with self.vm(event=None) as machine:
+            self.assertFalse(machine.extendDrivesIfNeeded())
+            self.assertEqual({}, self.dom.block_thresholds)
+            self.assertTrue(machine.needsDriveMonitoring())
+
+
 def _load_xml(name):
     test_path = os.path.realpath(__file__)
     data_path = os.path.join(os.path.split(test_path)[0], 'devices', 'data')
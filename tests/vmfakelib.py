@@ -115,6 +115,8 @@ class Domain(object):
         self._vmId = vmId
         self._diskErrors = {}
         self._downtimes = []
+        self.block_info = {}
+        self.block_thresholds = {}
 
     @property
     def connected(self):
@@ -198,6 +200,14 @@ class Domain(object):
         self._failIfRequested()
         return 3  # thawed filesystems
 
+    def blockInfo(self, path, flags):
+        self._failIfRequested()
+        return self.block_info[path]
+
+    def setBlockThreshold(self, dev, threshold, flags=0):
+        self._failIfRequested()
+        self.block_thresholds[dev] = threshold
+
     def shutdownFlags(self, flags):
         pass
 
@@ -278,6 +288,11 @@ class SuperVdsm(object):
     def getVcpuNumaMemoryMapping(self, vmName):
         return {0: [0, 1], 1: [0, 1], 2: [0, 1], 3: [0, 1]}
 
+    def getVcpusNumaInfo(self, vmNames):
+        return dict((vmName, {0: (1, [0, 1]), 1: (1, [0, 1]),
+                              2: (0, [0, 1]), 3: (2, [0, 1])})
+                    for vmName in vmNames)
+
     def prepareVmChannel(self, path, group=None):
         self.prepared_path = path
         self.prepared_path_group = group
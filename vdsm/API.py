@@ -1532,6 +1532,7 @@ class Global(APIBase):
         except:
             raise
         finally:
+            caps.invalidate('network')
             self._cif._networkSemaphore.release()
 
     def setSafeNetworkConfig(self):
@@ -1582,6 +1583,9 @@ class Global(APIBase):
     def getAllTasks(self):
         return self._irs.getAllTasks()
 
+    def getResourceLockStats(self):
+        return self._irs.getResourceLockStats()
+
     def setMOMPolicy(self, policy):
         try:
             self._cif.mom.setPolicy(policy)
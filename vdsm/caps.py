@@ -22,13 +22,18 @@
 
 import os
 import logging
+import threading
 import xml.etree.ElementTree as ET
 
 import libvirt
 
 from vdsm.config import config
 from vdsm.host import rngsources
+from vdsm.network.netinfo import dns
+from vdsm.network.netlink import monitor
 from vdsm.storage import hba
+from vdsm import concurrent
+from vdsm import constants
 from vdsm import cpuarch
 from vdsm import cpuinfo
 from vdsm import dsaversion
@@ -136,12 +141,137 @@ def _getIscsiIniName():
     return ''
 
 
-def get():
-    caps = {}
-    cpu_topology = numa.cpu_topology()
+# Files updated by every package transaction.
+_PACKAGE_DATABASES = ('/var/lib/rpm/Packages', '/var/lib/dpkg/status')
+
+# Files changed by cpu and numa node hotplug.
+_CPU_ONLINE_FILES = ('/sys/devices/system/cpu/online',
+                     '/sys/devices/system/node/online')
+
+_NETLINK_GROUPS = ('link', 'ipv4-ifaddr', 'ipv6-ifaddr', 'ipv4-route',
+                   'ipv6-route')
 
-    caps['kvmEnabled'] = str(os.path.exists('/dev/kvm')).lower()
 
+class _Section(object):
+    """
+    A part of the capabilities report, cached until it may have changed.
+
+    stamp is a callable returning a value that changes whenever the section
+    may have changed, or None if changes cannot be tracked; such a section is
+    collected again on every call. invalidate() drops the cached value
+    explicitly.
+    """
+
+    def __init__(self, name, collect, stamp):
+        self.name = name
+        self._collect = collect
+        self._stamp = stamp
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._cached_key = None
+        self._value = None
+
+    def get(self):
+        # Read the stamp before collecting, so changes made while collecting
+        # invalidate the value we are about to cache.
+        stamp = self._stamp()
+        with self._lock:
+            key = (self._generation, stamp)
+            if stamp is None or key != self._cached_key:
+                logging.debug('Collecting capabilities section %s',
+                              self.name)
+                self._value = self._collect()
+                self._cached_key = key
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+
+class _NetlinkWatcher(object):
+    """
+    Counts netlink link, address and route events, so the networking section
+    is collected again only after the host networking has changed.
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._monitor = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def generation(self):
+        """
+        Return the number of events seen so far, or None if the watcher is
+        not running and changes cannot be tracked.
+        """
+        if not self._running:
+            return None
+        return self._generation
+
+    def start(self):
+        self._monitor = monitor.Monitor(groups=_NETLINK_GROUPS)
+        self._monitor.start()
+        self._running = True
+        self._thread = concurrent.thread(self._run, name='caps/netlink')
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._monitor.stop()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        try:
+            for _ in self._monitor:
+                self._generation += 1
+        finally:
+            if self._running:
+                logging.warning('Netlink monitor exited, networking '
+                                'capabilities will not be cached')
+                self._running = False
+
+
+def _mtimes(paths):
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+def _read_files(paths):
+    contents = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                contents.append(f.read())
+        except IOError:
+            contents.append(None)
+    return tuple(contents)
+
+
+def _hooks_stamp():
+    try:
+        hook_dirs = os.listdir(constants.P_VDSM_HOOKS)
+    except OSError:
+        return None
+    paths = [constants.P_VDSM_HOOKS]
+    paths.extend(os.path.join(constants.P_VDSM_HOOKS, hook_dir)
+                 for hook_dir in sorted(hook_dirs))
+    return tuple(hook_dirs), _mtimes(paths)
+
+
+def _cpu_caps():
+    numa.invalidate_topology()
+    cpu_topology = numa.cpu_topology()
+
+    caps = {}
     if config.getboolean('vars', 'report_host_threads_as_cores'):
         caps['cpuCores'] = str(cpu_topology.threads)
     else:
@@ -155,48 +285,56 @@ def get():
     caps['cpuFlags'] = ','.join(cpuinfo.flags() +
                                 machinetype.compatible_cpu_models())
 
-    caps.update(_getVersionInfo())
+    caps['numaNodes'] = dict(numa.topology())
+    caps['numaNodeDistance'] = dict(numa.distances())
+    caps['autoNumaBalancing'] = numa.autonuma_status()
+    return caps
+
 
-    net_caps = supervdsm.getProxy().network_caps()
-    caps.update(net_caps)
+def _network_stamp():
+    # Nameservers are read from resolv.conf, which is not tracked by netlink.
+    generation = _netlink_watcher.generation
+    if generation is None:
+        return None
+    return generation, _mtimes((dns.DNS_CONF_FILE,))
+
+
+def _network_caps():
+    return supervdsm.getProxy().network_caps()
 
+
+def _hooks_caps():
     try:
-        caps['hooks'] = hooks.installed()
+        return {'hooks': hooks.installed()}
     except:
         logging.debug('not reporting hooks', exc_info=True)
+        return {}
+
 
+def _packages_caps():
+    return {'packages2': osinfo.package_versions()}
+
+
+def _static_caps():
+    caps = {}
+    caps.update(_getVersionInfo())
     caps['operatingSystem'] = osinfo.version()
     caps['uuid'] = host.uuid()
-    caps['packages2'] = osinfo.package_versions()
     caps['realtimeKernel'] = osinfo.runtime_kernel_flags().realtime
     caps['kernelArgs'] = osinfo.kernel_args()
     caps['nestedVirtualization'] = osinfo.nested_virtualization().enabled
     caps['emulatedMachines'] = machinetype.emulated_machines(
         cpuarch.effective())
-    caps['ISCSIInitiatorName'] = _getIscsiIniName()
-    caps['HBAInventory'] = hba.HBAInventory()
     caps['vmTypes'] = ['kvm']
-
-    caps['memSize'] = str(utils.readMemInfo()['MemTotal'] / 1024)
     caps['reservedMem'] = str(config.getint('vars', 'host_mem_reserve') +
                               config.getint('vars', 'extra_mem_reserve'))
     caps['guestOverhead'] = config.get('vars', 'guest_ram_overhead')
 
-    caps['rngSources'] = rngsources.list_available()
-
-    caps['numaNodes'] = dict(numa.topology())
-    caps['numaNodeDistance'] = dict(numa.distances())
-    caps['autoNumaBalancing'] = numa.autonuma_status()
-
-    caps['selinux'] = osinfo.selinux_status()
-
     liveSnapSupported = _getLiveSnapshotSupport(cpuarch.effective())
     if liveSnapSupported is not None:
         caps['liveSnapshot'] = str(liveSnapSupported).lower()
     caps['liveMerge'] = str(getLiveMergeSupport()).lower()
-    caps['kdumpStatus'] = osinfo.kdump_status()
 
-    caps['hostdevPassthrough'] = str(hostdev.is_supported()).lower()
     caps['additionalFeatures'] = []
     if osinfo.glusterEnabled:
         from gluster.api import glusterAdditionalFeatures
@@ -204,6 +342,67 @@ def get():
     return caps
 
 
+def _volatile_caps():
+    """
+    Capabilities without a change notification source. These are cheap to
+    collect, or must not be reported stale.
+    """
+    caps = {}
+    caps['kvmEnabled'] = str(os.path.exists('/dev/kvm')).lower()
+    caps['ISCSIInitiatorName'] = _getIscsiIniName()
+    caps['HBAInventory'] = hba.HBAInventory()
+    caps['memSize'] = str(utils.readMemInfo()['MemTotal'] / 1024)
+    caps['rngSources'] = rngsources.list_available()
+    caps['selinux'] = osinfo.selinux_status()
+    caps['kdumpStatus'] = osinfo.kdump_status()
+    caps['hostdevPassthrough'] = str(hostdev.is_supported()).lower()
+    return caps
+
+
+_netlink_watcher = _NetlinkWatcher()
+
+_sections = (
+    _Section('static', _static_caps, lambda: True),
+    _Section('cpu', _cpu_caps, lambda: _read_files(_CPU_ONLINE_FILES)),
+    _Section('network', _network_caps, _network_stamp),
+    _Section('hooks', _hooks_caps, _hooks_stamp),
+    _Section('packages', _packages_caps,
+             lambda: _mtimes(_PACKAGE_DATABASES)),
+    _Section('volatile', _volatile_caps, lambda: None),
+)
+
+
+def start():
+    """
+    Start tracking networking changes. Until started, the networking section
+    is collected on every call.
+    """
+    _netlink_watcher.start()
+
+
+def stop():
+    _netlink_watcher.stop()
+
+
+def invalidate(name):
+    """
+    Drop the cached value of the named section, for changes that vdsm makes
+    itself and that may not be visible to the section invalidation source.
+    """
+    for section in _sections:
+        if section.name == name:
+            section.invalidate()
+            return
+    raise KeyError(name)
+
+
+def get():
+    caps = {}
+    for section in _sections:
+        caps.update(section.get())
+    return caps
+
+
 def _dropVersion(vstring, logMessage):
     logging.error(logMessage)
 
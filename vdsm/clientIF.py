@@ -428,10 +428,19 @@ class clientIF(object):
         return {'status': doneCode, 'alignment': aligning}
 
     def createVm(self, vmParams, vmRecover=False):
+        if vmRecover:
+            # API requests are rejected during recovery, so recovered VMs can
+            # be created concurrently, adding them when they are running.
+            vm = Vm(self, vmParams, vmRecover)
+            ret = vm.run()
+            if not response.is_error(ret):
+                with self.vmContainerLock:
+                    self.vmContainer[vmParams['vmId']] = vm
+            return ret
+
         with self.vmContainerLock:
-            if not vmRecover:
-                if vmParams['vmId'] in self.vmContainer:
-                    return errCode['exist']
+            if vmParams['vmId'] in self.vmContainer:
+                return errCode['exist']
             vm = Vm(self, vmParams, vmRecover)
             ret = vm.run()
             if not response.is_error(ret):
@@ -477,7 +486,8 @@ class clientIF(object):
             recovery.all_vms(self)
 
             # recover stage 3: waiting for domains to go up
-            self._waitForDomainsUp()
+            with recovery.phase(self.log, 'waiting for domains to go up'):
+                self._waitForDomainsUp()
 
             recovery.clean_vm_files(self)
 
@@ -534,6 +544,9 @@ class clientIF(object):
             elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_WATCHDOG:
                 action, = args[:-1]
                 v.onWatchdogEvent(action)
+            elif eventid == libvirtconnection.BLOCK_THRESHOLD_EVENT:
+                dev, path, threshold, excess = args[:-1]
+                v.onBlockThreshold(dev, path, threshold, excess)
             else:
                 v.log.warning('unknown eventid %s args %s', eventid, args)
 
@@ -559,18 +572,52 @@ class clientIF(object):
             time.sleep(5)
 
     def _preparePathsForRecoveredVMs(self):
+        # Drives on the same storage domain are prepared one after the other,
+        # drives on different storage domains are prepared concurrently.
         vm_objects = self.vmContainer.values()
-        num_vm_objects = len(vm_objects)
-        for idx, vm_obj in enumerate(vm_objects):
-            # Let's recover as much VMs as possible
+        domains = defaultdict(list)
+        prepared = []
+        for vm_obj in vm_objects:
             try:
-                # Do not prepare volumes when system goes down
-                if self._enabled:
-                    self.log.info(
-                        'recovery [%d/%d]: preparing paths for'
-                        ' domain %s',  idx+1, num_vm_objects, vm_obj.id)
-                    vm_obj.preparePaths()
+                drives = vm_obj.drivesToPrepare()
             except:
                 self.log.exception(
-                    "recovery [%d/%d]: failed for vm %s",
-                    idx+1, num_vm_objects, vm_obj.id)
+                    "recovery: failed to get drives for vm %s", vm_obj.id)
+                continue
+            for drive in drives:
+                domains[drive.get('domainID')].append((vm_obj, drive))
+            prepared.append(vm_obj)
+
+        failed = set()
+
+        def prepare(items):
+            for vm_obj, drive in items:
+                # Do not prepare volumes when system goes down
+                if not self._enabled:
+                    return
+                # Let's recover as much VMs as possible
+                if vm_obj.id in failed:
+                    continue
+                try:
+                    if not vm_obj.prepareDrivePath(drive):
+                        # A destroy request has been issued
+                        failed.add(vm_obj.id)
+                except:
+                    self.log.exception(
+                        "recovery: failed to prepare drive %s for vm %s",
+                        drive.get('volumeID'), vm_obj.id)
+                    failed.add(vm_obj.id)
+
+        with recovery.phase(
+                self.log, 'preparing paths for %d VMs on %d storage domains'
+                % (len(prepared), len(domains))):
+            concurrent.tmap(prepare, domains.values(),
+                            workers=recovery.WORKERS)
+
+        if not self._enabled:
+            return
+
+        for vm_obj in prepared:
+            if vm_obj.id not in failed:
+                # Now we got all the resources we needed
+                vm_obj.enableDriveMonitor()
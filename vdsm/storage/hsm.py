@@ -2223,6 +2223,17 @@ class HSM(object):
         ret = self.taskMng.getAllTasks()
         return dict(tasks=ret)
 
+    @public
+    def getResourceLockStats(self):
+        """
+        Get lock statistics of the storage resources, for diagnosing lock
+        contention.
+
+        :returns: A dict of lock statistics per namespace.
+        :rtype: dict
+        """
+        return dict(lockStats=rm.lockStats())
+
     @public
     def stopTask(self, taskID, spUUID=None, options=None):
         """
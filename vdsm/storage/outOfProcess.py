@@ -341,6 +341,10 @@ def readLines(ioproc, path):
     return ioproc.readlines(path)
 
 
+def readFile(ioproc, path, direct=False):
+    return ioproc.readfile(path, direct=direct)
+
+
 def writeLines(ioproc, path, lines):
     data = ''.join(lines)
     return writeFile(ioproc, path, data)
@@ -381,6 +385,7 @@ class _IOProcWrapper(types.ModuleType):
 
         self.directReadLines = partial(directReadLines, ioproc)
         self.readLines = partial(readLines, ioproc)
+        self.readFile = partial(readFile, ioproc)
         self.writeLines = partial(writeLines, ioproc)
         self.writeFile = partial(writeFile, ioproc)
         self.simpleWalk = partial(simpleWalk, ioproc)
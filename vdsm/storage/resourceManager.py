@@ -18,15 +18,21 @@
 # Refer to the README and COPYING files for full details of the license
 #
 
+import bisect
 import threading
 import logging
 import re
 import weakref
+from collections import deque
+from collections import OrderedDict
 from functools import partial
+from contextlib import contextmanager
 from contextlib import nested
 from uuid import uuid4
 from Queue import Queue
 
+import six
+
 from vdsm.logUtils import SimpleLogAdapter
 from vdsm import concurrent
 from vdsm import utils
@@ -55,6 +61,16 @@ class RequestTimedOutError(ResourceManagerError):
 SHARED = "shared"
 EXCLUSIVE = "exclusive"
 
+# Number of shards in a namespace. Requests for resources in different shards
+# do not contend on the same lock.
+_SHARDS = 16
+
+# Upper bounds (in seconds) of the request wait time histogram buckets.
+_WAIT_BUCKETS = (0.001, 0.01, 0.1, 1, 10, 60)
+
+# Maximum number of waiters reported for a resource.
+_MAX_WAITERS = 10
+
 
 class LockState:
     free = "free"
@@ -173,6 +189,9 @@ class Request(object):
         self._doneEvent = threading.Event()
         self._callback = callback
         self.reqID = str(uuid4())
+        self.owner = threading.current_thread().name
+        self.created = utils.monotonic_time()
+        self.waitTime = None
         self._log = SimpleLogAdapter(self._log, {"ResName": self.fullName,
                                                  "ReqID": self.reqID})
 
@@ -214,6 +233,7 @@ class Request(object):
                                                    "request")
 
             self._isActive = False
+            self.waitTime = utils.monotonic_time() - self.created
             self._log.debug("Granted request")
             self._doneEvent.set()
 
@@ -257,6 +277,7 @@ class ResourceRef(object):
                  resRefID=str(uuid4())):
         self._namespace = namespace
         self._name = name
+        self._resRefID = resRefID
         self._log = SimpleLogAdapter(self._log, {"ResName": self.fullName,
                                                  "ResRefID": resRefID})
 
@@ -292,7 +313,7 @@ class ResourceRef(object):
                                "ignored.")
                 return
 
-            releaseResource(self.namespace, self.name)
+            releaseResource(self.namespace, self.name, self._resRefID)
             self._isValid = False
 
     def getStatus(self):
@@ -306,7 +327,7 @@ class ResourceRef(object):
 
     def __del__(self):
         if self._isValid and self.autoRelease:
-            def release(log, namespace, name):
+            def release(log, namespace, name, resRefID):
                 log.warn("Resource reference was not properly released. "
                          "Autoreleasing.")
                 # In Python, objects are refcounted and are deleted immediately
@@ -316,10 +337,10 @@ class ResourceRef(object):
                 # might try to acquire the lock in a locked context and reach a
                 # deadlock. This is why I need to use a timer. It will defer
                 # the operation and use a different context.
-                releaseResource(namespace, name)
+                releaseResource(namespace, name, resRefID)
             t = concurrent.thread(
                 release,
-                args=(self._log, self.namespace, self.name),
+                args=(self._log, self.namespace, self.name, self._resRefID),
                 name="rm/" + self.name[:8])
             t.start()
             self._isValid = False
@@ -336,13 +357,18 @@ class _ResourceManager(object):
 
     This class is for internal usage only, clients should use the module
     interface.
+
+    Resources are kept in namespace shards selected by the resource name, so
+    only requests for resources in the same shard contend on a lock. The
+    namespace registry is modified only when registering and unregistering
+    namespaces; requests look up namespaces without locking.
     """
     _log = logging.getLogger("storage.ResourceManager")
     _namespaceValidator = re.compile(r"^[\w\d_-]+$")
     _resourceNameValidator = re.compile(r"^[^\s.]+$")
 
     def __init__(self):
-        self._syncRoot = rwlock.RWLock()
+        self._syncRoot = threading.Lock()
         self._namespaces = {}
 
     def registerNamespace(self, namespace, factory, force=False):
@@ -352,7 +378,7 @@ class _ResourceManager(object):
         if (namespace in self._namespaces) and not force:
                 raise KeyError("Namespace '%s' already exists." % namespace)
 
-        with self._syncRoot.exclusive:
+        with self._syncRoot:
             if (namespace in self._namespaces):
                 if force:
                     self._unregisterNamespaceLocked(namespace)
@@ -365,7 +391,7 @@ class _ResourceManager(object):
             self._namespaces[namespace] = Namespace(factory)
 
     def unregisterNamespace(self, namespace):
-        with self._syncRoot.exclusive:
+        with self._syncRoot:
             if namespace not in self._namespaces:
                 raise KeyError("Namespace '%s' doesn't exist" % namespace)
 
@@ -373,39 +399,72 @@ class _ResourceManager(object):
 
     def _unregisterNamespaceLocked(self, namespace):
         """
-        Must be called when holding self._syncRoot.exclusive, and namespace
-        exists in self._namespaces.
+        Must be called when holding self._syncRoot, and namespace exists in
+        self._namespaces.
         """
         self._log.debug("Unregistering namespace '%s'", namespace)
         namespaceObj = self._namespaces[namespace]
-        with namespaceObj.lock:
-            if len(namespaceObj.resources) > 0:
+        with namespaceObj.lockAll():
+            if namespaceObj.hasResources():
                 raise ResourceManagerError("Cannot unregister Resource "
                                            "Factory '%s'. It has active "
                                            "resources." % (namespace))
 
+            # Requests that looked up the namespace before it was removed
+            # will find it closed when taking the shard lock.
+            namespaceObj.closed = True
             del self._namespaces[namespace]
 
+    @contextmanager
+    def _lockShard(self, namespace, name):
+        """
+        Lock the shard keeping resource name in namespace, yielding the
+        namespace and the shard.
+        """
+        try:
+            namespaceObj = self._namespaces[namespace]
+        except KeyError:
+            raise ValueError("Namespace '%s' is not registered with this "
+                             "manager" % namespace)
+        shard = namespaceObj.shard(name)
+        with shard.lock:
+            if namespaceObj.closed:
+                raise ValueError("Namespace '%s' is not registered with this "
+                                 "manager" % namespace)
+            yield namespaceObj, shard
+
     def getResourceStatus(self, namespace, name):
         if not self._resourceNameValidator.match(name):
             raise ValueError("Invalid resource name '%s'" % name)
 
-        with self._syncRoot.shared:
-            try:
-                namespaceObj = self._namespaces[namespace]
-            except KeyError:
-                raise ValueError("Namespace '%s' is not registered with this "
-                                 "manager" % namespace)
-            resources = namespaceObj.resources
-            with namespaceObj.lock:
-                if not namespaceObj.factory.resourceExists(name):
-                    raise KeyError("No such resource '%s.%s'" % (namespace,
-                                                                 name))
+        with self._lockShard(namespace, name) as (namespaceObj, shard):
+            if not namespaceObj.factory.resourceExists(name):
+                raise KeyError("No such resource '%s.%s'" % (namespace,
+                                                             name))
 
-                if name not in resources:
-                    return LockState.free
+            if name not in shard.resources:
+                return LockState.free
 
-                return LockState.fromType(resources[name].currentLock)
+            return LockState.fromType(shard.resources[name].currentLock)
+
+    def getLockStats(self):
+        """
+        Return lock statistics for all namespaces, for diagnosing lock
+        contention. See lockStats() for the format.
+        """
+        now = utils.monotonic_time()
+        stats = {}
+        for namespace, namespaceObj in self._namespaces.items():
+            waits = WaitStats()
+            resources = {}
+            for shard in namespaceObj.shards:
+                with shard.lock:
+                    waits.merge(shard.waits)
+                    for name, resource in six.iteritems(shard.resources):
+                        resources[name] = resource.info(now)
+            stats[namespace] = {"waits": waits.info(),
+                                "resources": resources}
+        return stats
 
     def _switchLockType(self, resourceInfo, newLockType):
         switchLock = (resourceInfo.currentLock != newLockType)
@@ -491,71 +550,64 @@ class _ResourceManager(object):
         self._log.debug("Trying to register resource '%s' for lock type '%s'",
                         fullName, lockType)
         with nested(utils.RollbackContext(),
-                    self._syncRoot.shared) as (contextCleanup, lock):
+                    self._lockShard(namespace, name)) as (contextCleanup,
+                                                          (namespaceObj,
+                                                           shard)):
+            resources = shard.resources
             try:
-                namespaceObj = self._namespaces[namespace]
+                resource = resources[name]
             except KeyError:
-                raise ValueError("Namespace '%s' is not registered with this "
-                                 "manager" % namespace)
-
-            resources = namespaceObj.resources
-            with namespaceObj.lock:
-                try:
-                    resource = resources[name]
-                except KeyError:
-                    if not namespaceObj.factory.resourceExists(name):
-                        raise KeyError("No such resource '%s'" % (fullName))
-                else:
-                    if len(resource.queue) == 0 and \
-                            resource.currentLock == SHARED and \
-                            request.lockType == SHARED:
-                        resource.activeUsers += 1
-                        self._log.debug("Resource '%s' found in shared state "
-                                        "and queue is empty, Joining current "
-                                        "shared lock (%d active users)",
-                                        fullName, resource.activeUsers)
-                        request.grant()
-                        contextCleanup.defer(request.emit,
-                                             ResourceRef(namespace, name,
-                                                         resource.realObj,
-                                                         request.reqID))
-                        return RequestRef(request)
-
-                    resource.queue.insert(0, request)
-                    self._log.debug("Resource '%s' is currently locked, "
-                                    "Entering queue (%d in queue)",
-                                    fullName, len(resource.queue))
+                if not namespaceObj.factory.resourceExists(name):
+                    raise KeyError("No such resource '%s'" % (fullName))
+            else:
+                if len(resource.queue) == 0 and \
+                        resource.currentLock == SHARED and \
+                        request.lockType == SHARED:
+                    request.grant()
+                    resource.addHolder(request)
+                    shard.waits.add(request.waitTime)
+                    self._log.debug("Resource '%s' found in shared state "
+                                    "and queue is empty, Joining current "
+                                    "shared lock (%d active users)",
+                                    fullName, resource.activeUsers)
+                    contextCleanup.defer(request.emit,
+                                         ResourceRef(namespace, name,
+                                                     resource.realObj,
+                                                     request.reqID))
                     return RequestRef(request)
 
-                # TODO : Creating the object inside the namespace lock causes
-                #        the entire namespace to lock and might cause
-                #        performance issues. As this is no currently a problem
-                #        I left it as it is to keep the code simple. If there
-                #        is a bottleneck in the resource framework, its
-                #        probably here.
-                try:
-                    obj = namespaceObj.factory.createResource(name, lockType)
-                except:
-                    self._log.warn("Resource factory failed to create resource"
-                                   " '%s'. Canceling request.", fullName,
-                                   exc_info=True)
-                    contextCleanup.defer(request.cancel)
-                    return RequestRef(request)
+                resource.queue.append(request)
+                self._log.debug("Resource '%s' is currently locked, "
+                                "Entering queue (%d in queue)",
+                                fullName, len(resource.queue))
+                return RequestRef(request)
 
-                resource = resources[name] = ResourceInfo(obj, namespace, name)
-                resource.currentLock = request.lockType
-                resource.activeUsers += 1
-
-                self._log.debug("Resource '%s' is free. Now locking as '%s' "
-                                "(1 active user)", fullName, request.lockType)
-                request.grant()
-                contextCleanup.defer(request.emit,
-                                     ResourceRef(namespace, name,
-                                                 resource.realObj,
-                                                 request.reqID))
+            # Creating the object inside the shard lock blocks only requests
+            # for resources in the same shard.
+            try:
+                obj = namespaceObj.factory.createResource(name, lockType)
+            except:
+                self._log.warn("Resource factory failed to create resource"
+                               " '%s'. Canceling request.", fullName,
+                               exc_info=True)
+                contextCleanup.defer(request.cancel)
                 return RequestRef(request)
 
-    def releaseResource(self, namespace, name):
+            resource = resources[name] = ResourceInfo(obj, namespace, name)
+            resource.currentLock = request.lockType
+            request.grant()
+            resource.addHolder(request)
+            shard.waits.add(request.waitTime)
+
+            self._log.debug("Resource '%s' is free. Now locking as '%s' "
+                            "(1 active user)", fullName, request.lockType)
+            contextCleanup.defer(request.emit,
+                                 ResourceRef(namespace, name,
+                                             resource.realObj,
+                                             request.reqID))
+            return RequestRef(request)
+
+    def releaseResource(self, namespace, name, reqID=None):
         # WARN : unlike in resource acquire the user now has the request
         #        object and can CANCEL THE REQUEST at any time. Always use
         #        request.grant between try and except to properly handle such
@@ -564,119 +616,174 @@ class _ResourceManager(object):
 
         self._log.debug("Trying to release resource '%s'", fullName)
         with nested(utils.RollbackContext(),
-                    self._syncRoot.shared) as (contextCleanup, lock):
+                    self._lockShard(namespace, name)) as (contextCleanup,
+                                                          (namespaceObj,
+                                                           shard)):
+            resources = shard.resources
             try:
-                namespaceObj = self._namespaces[namespace]
+                resource = resources[name]
             except KeyError:
-                raise ValueError("Namespace '%s' is not registered with this "
-                                 "manager", namespace)
-            resources = namespaceObj.resources
+                raise ValueError("Resource '%s.%s' is not currently "
+                                 "registered" % (namespace, name))
 
-            with namespaceObj.lock:
-                try:
-                    resource = resources[name]
-                except KeyError:
-                    raise ValueError("Resource '%s.%s' is not currently "
-                                     "registered" % (namespace, name))
+            resource.removeHolder(reqID)
+            self._log.debug("Released resource '%s' (%d active users)",
+                            fullName, resource.activeUsers)
 
-                resource.activeUsers -= 1
-                self._log.debug("Released resource '%s' (%d active users)",
-                                fullName, resource.activeUsers)
-
-                # Is some one else is using the resource
-                if resource.activeUsers > 0:
-                    return
-                self._log.debug("Resource '%s' is free, finding out if anyone "
-                                "is waiting for it.", fullName)
-                # Grant a request
-                while True:
-                    # Is there someone waiting for the resource
-                    if len(resource.queue) == 0:
-                        self._freeResource(resources[name])
-                        del resources[name]
-                        self._log.debug("No one is waiting for resource '%s', "
-                                        "Clearing records.", fullName)
-                        return
-
-                    self._log.debug("Resource '%s' has %d requests in queue. "
-                                    "Handling top request.", fullName,
-                                    len(resource.queue))
-                    nextRequest = resource.queue.pop()
-                    # We lock the request to simulate a transaction. We cannot
-                    # grant the request before there is a resource switch. And
-                    # we can't do a resource switch before we can guarantee
-                    # that the request will be granted.
-                    with nextRequest.syncRoot:
-                        if nextRequest.canceled():
-                            self._log.debug("Request '%s' was canceled, "
-                                            "Ignoring it.", nextRequest)
-                            continue
-
-                        try:
-                            self._switchLockType(resource,
-                                                 nextRequest.lockType)
-                        except Exception:
-                            self._log.warn("Resource factory failed to create "
-                                           "resource '%s'. Canceling request.",
-                                           fullName, exc_info=True)
-                            nextRequest.cancel()
-                            continue
-
-                        nextRequest.grant()
-                        contextCleanup.defer(
-                            partial(nextRequest.emit,
-                                    ResourceRef(namespace, name,
-                                                resource.realObj,
-                                                nextRequest.reqID)))
-
-                        resource.activeUsers += 1
-
-                        self._log.debug("Request '%s' was granted",
-                                        nextRequest)
-                        break
-
-                # If the lock is exclusive were done
-                if resource.currentLock == EXCLUSIVE:
+            # Is some one else is using the resource
+            if resource.activeUsers > 0:
+                return
+            self._log.debug("Resource '%s' is free, finding out if anyone "
+                            "is waiting for it.", fullName)
+            # Grant a request
+            while True:
+                # Is there someone waiting for the resource
+                if len(resource.queue) == 0:
+                    self._freeResource(resources[name])
+                    del resources[name]
+                    self._log.debug("No one is waiting for resource '%s', "
+                                    "Clearing records.", fullName)
                     return
 
-                # Keep granting shared locks
-                self._log.debug("This is a shared lock. Granting all shared "
-                                "requests")
-                while len(resource.queue) > 0:
-
-                    nextRequest = resource.queue[-1]
+                self._log.debug("Resource '%s' has %d requests in queue. "
+                                "Handling top request.", fullName,
+                                len(resource.queue))
+                nextRequest = resource.queue.popleft()
+                # We lock the request to simulate a transaction. We cannot
+                # grant the request before there is a resource switch. And
+                # we can't do a resource switch before we can guarantee
+                # that the request will be granted.
+                with nextRequest.syncRoot:
                     if nextRequest.canceled():
-                        resource.queue.pop()
+                        self._log.debug("Request '%s' was canceled, "
+                                        "Ignoring it.", nextRequest)
                         continue
 
-                    if nextRequest.lockType == EXCLUSIVE:
-                        break
-
-                    nextRequest = resource.queue.pop()
                     try:
-                        nextRequest.grant()
-                        contextCleanup.defer(
-                            partial(nextRequest.emit,
-                                    ResourceRef(namespace, name,
-                                                resource.realObj,
-                                                nextRequest.reqID)))
-                    except RequestAlreadyProcessedError:
+                        self._switchLockType(resource,
+                                             nextRequest.lockType)
+                    except Exception:
+                        self._log.warn("Resource factory failed to create "
+                                       "resource '%s'. Canceling request.",
+                                       fullName, exc_info=True)
+                        nextRequest.cancel()
                         continue
 
-                    resource.activeUsers += 1
-                    self._log.debug("Request '%s' was granted (%d "
-                                    "active users)", nextRequest,
-                                    resource.activeUsers)
+                    nextRequest.grant()
+                    contextCleanup.defer(
+                        partial(nextRequest.emit,
+                                ResourceRef(namespace, name,
+                                            resource.realObj,
+                                            nextRequest.reqID)))
+
+                    resource.addHolder(nextRequest)
+                    shard.waits.add(nextRequest.waitTime)
+
+                    self._log.debug("Request '%s' was granted",
+                                    nextRequest)
+                    break
+
+            # If the lock is exclusive were done
+            if resource.currentLock == EXCLUSIVE:
+                return
+
+            # Keep granting shared locks
+            self._log.debug("This is a shared lock. Granting all shared "
+                            "requests")
+            while len(resource.queue) > 0:
+
+                nextRequest = resource.queue[0]
+                if nextRequest.canceled():
+                    resource.queue.popleft()
+                    continue
+
+                if nextRequest.lockType == EXCLUSIVE:
+                    break
+
+                nextRequest = resource.queue.popleft()
+                try:
+                    nextRequest.grant()
+                    contextCleanup.defer(
+                        partial(nextRequest.emit,
+                                ResourceRef(namespace, name,
+                                            resource.realObj,
+                                            nextRequest.reqID)))
+                except RequestAlreadyProcessedError:
+                    continue
+
+                resource.addHolder(nextRequest)
+                shard.waits.add(nextRequest.waitTime)
+                self._log.debug("Request '%s' was granted (%d "
+                                "active users)", nextRequest,
+                                resource.activeUsers)
 
 
 class Namespace(object):
     """
     Namespace struct
+
+    Resources are kept in shards selected by the hash of the resource name.
     """
-    def __init__(self, factory):
-        self.resources = {}
-        self.lock = threading.Lock()  # rwlock.RWLock()
+    def __init__(self, factory, shards=_SHARDS):
+        self.shards = [Shard() for i in range(shards)]
         self.factory = factory
+        self.closed = False
+
+    def shard(self, name):
+        return self.shards[hash(name) % len(self.shards)]
+
+    def hasResources(self):
+        return any(shard.resources for shard in self.shards)
+
+    @contextmanager
+    def lockAll(self):
+        # Shard locks are always taken in the same order, and requests never
+        # take more than one shard lock.
+        with nested(*[shard.lock for shard in self.shards]):
+            yield
+
+
+class Shard(object):
+    """
+    Shard struct
+    """
+    def __init__(self):
+        self.resources = {}
+        self.lock = threading.Lock()
+        self.waits = WaitStats()
+
+
+class WaitStats(object):
+    """
+    Histogram of the time requests waited before they were granted.
+
+    Must be modified while holding the lock of the shard keeping it.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(_WAIT_BUCKETS) + 1)
+
+    def add(self, wait):
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+        self.buckets[bisect.bisect_left(_WAIT_BUCKETS, wait)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+
+    def info(self):
+        bounds = [str(b) for b in _WAIT_BUCKETS] + ["inf"]
+        return {"count": self.count,
+                "total": self.total,
+                "max": self.max,
+                "buckets": dict(zip(bounds, self.buckets))}
 
 
 class ResourceInfo(object):
@@ -684,13 +791,49 @@ class ResourceInfo(object):
     Resource struct
     """
     def __init__(self, realObj, namespace, name):
-        self.queue = []
-        self.activeUsers = 0
+        self.queue = deque()
+        self.holders = OrderedDict()
         self.currentLock = None
         self.realObj = realObj
         self.namespace = namespace
         self.name = name
         self.fullName = "%s.%s" % (namespace, name)
+        self.waits = WaitStats()
+
+    @property
+    def activeUsers(self):
+        return len(self.holders)
+
+    def addHolder(self, request):
+        self.holders[request.reqID] = (request.owner, utils.monotonic_time())
+        self.waits.add(request.waitTime)
+
+    def removeHolder(self, reqID=None):
+        """
+        Remove the holder that acquired the resource using request reqID. If
+        the caller does not know the request, remove the oldest holder.
+        """
+        if reqID in self.holders:
+            del self.holders[reqID]
+        else:
+            self.holders.popitem(last=False)
+
+    def info(self, now):
+        holders = [{"owner": owner, "time": now - since}
+                   for owner, since in six.itervalues(self.holders)]
+        waiters = []
+        for request in self.queue:
+            if request.canceled():
+                continue
+            if len(waiters) == _MAX_WAITERS:
+                break
+            waiters.append({"owner": request.owner,
+                            "lockType": request.lockType,
+                            "time": now - request.created})
+        return {"lockType": self.currentLock,
+                "holders": holders,
+                "waiters": waiters,
+                "waits": self.waits.info()}
 
 
 class Owner(object):
@@ -1024,8 +1167,42 @@ def acquireResource(namespace, name, lockType, timeout=None):
     return _manager.acquireResource(namespace, name, lockType, timeout=timeout)
 
 
-def releaseResource(namespace, name):
-    _manager.releaseResource(namespace, name)
+def releaseResource(namespace, name, reqID=None):
+    _manager.releaseResource(namespace, name, reqID=reqID)
+
+
+def lockStats():
+    """
+    Return lock statistics for diagnosing lock contention:
+
+    {
+        namespace: {
+            "waits": wait time histogram of all requests in namespace,
+            "resources": {
+                name: {
+                    "lockType": current lock type,
+                    "holders": [{"owner": thread name,
+                                 "time": seconds since granted}, ...],
+                    "waiters": [{"owner": thread name,
+                                 "lockType": requested lock type,
+                                 "time": seconds waiting}, ...],
+                    "waits": wait time histogram of requests for resource,
+                },
+                ...
+            },
+        },
+        ...
+    }
+
+    Only locked resources are reported. Waiters are reported in queue order,
+    longest waiter first. A wait time histogram is:
+
+        {"count": number of granted requests,
+         "total": total wait time,
+         "max": longest wait time,
+         "buckets": {upper bound: number of requests, ...}}
+    """
+    return _manager.getLockStats()
 
 
 # Private apis for the tests - clients should never use these!
@@ -19,9 +19,11 @@
 #
 
 import os
+import errno
 import logging
 import types
 import threading
+import uuid
 from collections import namedtuple
 import codecs
 from contextlib import contextmanager
@@ -35,6 +37,7 @@ from vdsm.storage.persistent import unicodeEncoder, unicodeDecoder
 import image
 import resourceFactories
 import resourceManager as rm
+from vdsm import concurrent
 from vdsm import constants
 from vdsm import qemuimg
 import outOfProcess as oop
@@ -861,6 +864,61 @@ class StorageDomain(object):
 
         return vmsInfo
 
+    def updateVMs(self, ovfs):
+        """
+        Write VMs OVF. 'ovfs' is a dict mapping a VM UUID to its OVF, encoded
+        as UTF-8.
+
+        The OVFs are written in parallel by the domain ioprocess. Every OVF is
+        written to a temporary file, synced and renamed, so readers never see
+        a partial OVF, and the VM directory is synced to make the rename
+        durable. The VMs directory is synced once, after all the writes, if
+        new VM directories were created.
+        """
+        vmsPath = self.getVMsDir()
+
+        def write(item):
+            vmUUID, ovf = item
+            return self._writeVMOvf(os.path.join(vmsPath, vmUUID), vmUUID,
+                                    ovf)
+
+        results = concurrent.tmap(write, ovfs.items(),
+                                  workers=oop.HELPERS_PER_DOMAIN)
+        if any(r.succeeded and r.value for r in results):
+            self.oop.fileUtils.fsyncPath(vmsPath)
+
+        errors = [r.value for r in results if not r.succeeded]
+        for e in errors:
+            self.log.error("Error writing VM OVF: %s", e)
+        if errors:
+            raise errors[0]
+
+    def _writeVMOvf(self, vmPath, vmUUID, ovf):
+        """
+        Write a VM OVF durably, returning True if the VM directory was
+        created.
+        """
+        ovfPath = os.path.join(vmPath, vmUUID + '.ovf')
+        tmpPath = "%s.%s.tmp" % (ovfPath, uuid.uuid4())
+        created = False
+        try:
+            self.oop.writeFile(tmpPath, ovf)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            # New VM, or a VM removed since the last update.
+            self.oop.fileUtils.createdir(vmPath)
+            created = True
+            self.oop.writeFile(tmpPath, ovf)
+        try:
+            self.oop.fileUtils.fsyncPath(tmpPath)
+            self.oop.os.rename(tmpPath, ovfPath)
+        except OSError:
+            self.oop.utils.rmFile(tmpPath)
+            raise
+        self.oop.fileUtils.fsyncPath(vmPath)
+        return created
+
     def createMasterTree(self):
         """
         Make tasks and vms directories on master directory.
@@ -20,11 +20,11 @@
 
 import os
 from glob import iglob, glob
+import hashlib
 import logging
 import threading
 import errno
 import uuid
-import codecs
 from contextlib import nested
 from functools import partial
 from weakref import proxy
@@ -49,6 +49,7 @@ from vdsm.config import config
 from sdc import sdCache
 import image
 import resourceManager as rm
+import task
 
 POOL_MASTER_DOMAIN = 'mastersd'
 
@@ -82,6 +83,7 @@ class StoragePool(object):
         self.hsmMailer = None
         self.spmMailer = None
         self.masterDomain = None
+        self.tasksDir = None
         self.spmRole = SPM_FREE
         self.domainMonitor = domainMonitor
         self._upgradeCallback = partial(StoragePool._upgradePoolDomain,
@@ -89,6 +91,9 @@ class StoragePool(object):
         self._domainStateCallback = partial(
             StoragePool._domainStateChange, proxy(self))
         self._backend = None
+        # Digests of the VMs OVF written by updateVM, keyed by (domain UUID,
+        # VMs directory, VM UUID).
+        self._ovfDigests = {}
 
     def __is_secure__(self):
         return self.isSecure()
@@ -270,6 +275,9 @@ class StoragePool(object):
 
             self.spmRole = SPM_CONTEND
 
+            # Another host may have modified the VMs OVF since we were SPM.
+            self._forgetOvfDigests()
+
             try:
                 # Forcing to acquire the host id (if it's not acquired already)
                 self.masterDomain.acquireHostId(self.id)
@@ -302,6 +310,7 @@ class StoragePool(object):
                     self.log.error("Backup domain validation failed",
                                    exc_info=True)
 
+                task.openJournal(self.tasksDir)
                 self.taskMng.loadDumpedTasks(self.tasksDir)
 
                 self.spmRole = SPM_ACQUIRED
@@ -380,6 +389,9 @@ class StoragePool(object):
 
             stopFailed = False
 
+            if self.tasksDir is not None:
+                task.closeJournal(self.tasksDir)
+
             try:
                 self.cleanupMasterMount()
             except:
@@ -708,6 +720,7 @@ class StoragePool(object):
         if msdUUID not in domDict:
             raise se.InvalidParameterException("masterDomain", msdUUID)
 
+        self._forgetOvfDigests()
         futureMaster = sdCache.produce(msdUUID)
 
         # Forcing to acquire the host id (if it's not acquired already).
@@ -757,6 +770,8 @@ class StoragePool(object):
             raise se.StoragePoolWrongMaster(self.spUUID,
                                             self.masterDomain.sdUUID)
 
+        # The master tree, holding the VMs OVF, moves to the new master.
+        self._forgetOvfDigests()
         curmsd = sdCache.produce(sdUUID)
         newmsd = sdCache.produce(msdUUID)
         self._refreshDomainLinks(newmsd)
@@ -881,6 +896,7 @@ class StoragePool(object):
          'sdUUID' - storage domain UUID
         """
         self.log.info("sdUUID=%s spUUID=%s", sdUUID, self.spUUID)
+        self._forgetOvfDigests(sdUUID)
 
         domains = self.getDomains()
         if len(domains) >= self._backend.getMaximumSupportedDomains():
@@ -942,6 +958,7 @@ class StoragePool(object):
 
     def forcedDetachSD(self, sdUUID):
         self.log.warn("Force detaching domain `%s`", sdUUID)
+        self._forgetOvfDigests(sdUUID)
         domains = self.getDomains()
 
         if sdUUID not in domains:
@@ -969,6 +986,7 @@ class StoragePool(object):
         """
 
         self.log.info("sdUUID=%s spUUID=%s", sdUUID, self.spUUID)
+        self._forgetOvfDigests(sdUUID)
 
         dom = sdCache.produce(sdUUID)
 
@@ -1046,6 +1064,7 @@ class StoragePool(object):
          'sdUUID' - storage domain UUID
         """
         self.log.info("sdUUID=%s spUUID=%s", sdUUID, self.spUUID)
+        self._forgetOvfDigests(sdUUID)
 
         dom = sdCache.produce(sdUUID)
         # Avoid domain activation if not owned by pool
@@ -1085,6 +1104,7 @@ class StoragePool(object):
         self.validatePoolSD(sdUUID)
         self.log.info("sdUUID=%s spUUID=%s newMsdUUID=%s", sdUUID, self.spUUID,
                       newMsdUUID)
+        self._forgetOvfDigests(sdUUID)
         domList = self.getDomains()
 
         if sdUUID not in domList:
@@ -1278,12 +1298,13 @@ class StoragePool(object):
                     tree must be located on this domain.
                     If sdUUID is None, the update is on the pool, and therefore
                     the master domain will be updated.
+
+        VMs whose OVF did not change since the last update are skipped.
         """
         self.validatePoolSD(sdUUID)
         self.log.info("spUUID=%s sdUUID=%s", self.spUUID, sdUUID)
         vms = self._getVMsPath(sdUUID)
-        # We should exclude 'masterd' link from IMG_METAPATTERN globing
-        vmUUID = ovf = imgList = ''
+        ovfs = {}
         for vm in vmList:
             if not vm:
                 continue
@@ -1295,22 +1316,42 @@ class StoragePool(object):
             except KeyError:
                 raise se.InvalidParameterException("vmList", str(vmList))
 
-            vmPath = os.path.join(vms, vmUUID)
-            if fileUtils.pathExists(vmPath):
-                try:
-                    fileUtils.cleanupdir(vmPath, ignoreErrors=False)
-                except RuntimeError as e:
-                    raise se.MiscDirCleanupFailure(str(e))
+            if isinstance(ovf, unicode):
+                ovf = ovf.encode('utf8')
+            ovfs[vmUUID] = ovf
+
+        digests = dict((vmUUID, hashlib.sha1(ovf).hexdigest())
+                       for vmUUID, ovf in ovfs.items())
+        changed = dict((vmUUID, ovf) for vmUUID, ovf in ovfs.items()
+                       if self._ovfDigests.get((sdUUID, vms, vmUUID)) !=
+                       digests[vmUUID])
+        self.log.info("Updating %d VMs OVF (%d unchanged)", len(changed),
+                      len(ovfs) - len(changed))
+        if not changed:
+            return
 
-            try:
-                fileUtils.createdir(vmPath)
-                codecs.open(os.path.join(vmPath, vmUUID + '.ovf'), 'w',
-                            encoding='utf8').write(ovf)
-            except OSError as ex:
-                if ex.errno == errno.ENOSPC:
-                    raise se.NoSpaceLeftOnDomain(sdUUID)
+        # Forget the digests first, so a failed update is never skipped.
+        for vmUUID in changed:
+            self._ovfDigests.pop((sdUUID, vms, vmUUID), None)
+        try:
+            sdCache.produce(sdUUID).updateVMs(changed)
+        except (IOError, OSError) as ex:
+            if ex.errno == errno.ENOSPC:
+                raise se.NoSpaceLeftOnDomain(sdUUID)
 
-                raise
+            raise
+        for vmUUID in changed:
+            self._ovfDigests[(sdUUID, vms, vmUUID)] = digests[vmUUID]
+
+    def _forgetOvfDigests(self, sdUUID=None):
+        """
+        Forget the digests of the VMs OVF written to domain sdUUID, or to all
+        domains if sdUUID is None. Must be called when a domain may be
+        modified without us, so the next update writes the OVFs again.
+        """
+        for key in list(self._ovfDigests):
+            if sdUUID is None or key[0] == sdUUID:
+                self._ovfDigests.pop(key, None)
 
     def removeVM(self, vmUUID, sdUUID):
         """
@@ -1321,6 +1362,7 @@ class StoragePool(object):
         self.log.info("spUUID=%s vmUUID=%s sdUUID=%s", self.spUUID, vmUUID,
                       sdUUID)
         vms = self._getVMsPath(sdUUID)
+        self._ovfDigests.pop((sdUUID, vms, vmUUID), None)
         if os.path.exists(os.path.join(vms, vmUUID)):
             fileUtils.cleanupdir(os.path.join(vms, vmUUID))
 
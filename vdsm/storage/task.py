@@ -53,6 +53,7 @@ from contextlib import contextmanager
 from functools import wraps
 
 from vdsm.storage import exception as se
+from vdsm.storage import journal
 from vdsm.storage.threadlocal import vars
 
 import uuid
@@ -79,9 +80,57 @@ NUM_SEP = "."
 FIELD_SEP = ","
 RESOURCE_SEP = "!"
 TASK_METADATA_VERSION = 1
+JOURNAL_FILE = "tasks.journal"
 
 ROLLBACK_SENTINEL = "rollback sentinel"
 
+_journals = {}
+_closedJournals = set()
+_journalsLock = threading.Lock()
+
+
+def openJournal(store):
+    """
+    Open the journal persisting the tasks of store, allowing it to be used
+    again after closeJournal().
+    """
+    with _journalsLock:
+        _closedJournals.discard(store)
+        return _getJournal(store)
+
+
+def getJournal(store):
+    """
+    Return the journal persisting the tasks of store, opening it if needed.
+    Raises journal.ClosedError if the journal was closed, since its store may
+    not be available any more.
+    """
+    with _journalsLock:
+        if store in _closedJournals:
+            raise journal.ClosedError(store)
+        return _getJournal(store)
+
+
+def _getJournal(store):
+    j = _journals.get(store)
+    if j is None:
+        j = journal.Journal(os.path.join(store, JOURNAL_FILE), getProcPool())
+        j.start()
+        _journals[store] = j
+    return j
+
+
+def closeJournal(store):
+    """
+    Write pending records and close the journal of store, if it is open.
+    The journal is not opened again until openJournal() is called.
+    """
+    with _journalsLock:
+        _closedJournals.add(store)
+        j = _journals.pop(store, None)
+    if j is not None:
+        j.close()
+
 
 def _eq_encode(s):
     if KEY_SEPARATOR_ENCODED in s:
@@ -503,20 +552,23 @@ class Task:
         self.log = SimpleLogAdapter(self.log, {"Task": self.id})
 
     def __del__(self):
-        def finalize(log, owner, taskDir):
+        def finalize(log, owner, store, taskID):
             log.warn("Task was autocleaned")
             owner.releaseAll()
-            if taskDir is not None:
-                getProcPool().fileUtils.cleanupdir(taskDir)
+            if store is not None:
+                try:
+                    getJournal(store).remove(taskID)
+                except journal.ClosedError:
+                    log.debug("Task journal %s was closed", store)
 
         if not self.state.isDone():
-            taskDir = None
+            store = None
             if (self.cleanPolicy == TaskCleanType.auto and
                     self.store is not None):
-                taskDir = os.path.join(self.store, self.id)
+                store = self.store
             t = concurrent.thread(
                 finalize,
-                args=(self.log, self.resOwner, taskDir),
+                args=(self.log, self.resOwner, store, self.id),
                 name="task/" + self.id[:8])
             t.start()
 
@@ -624,8 +676,12 @@ class Task:
 
     @classmethod
     def _loadMetaFile(cls, filename, obj, fields):
+        cls._loadMetaLines(filename, getProcPool().readLines, obj, fields)
+
+    @classmethod
+    def _loadMetaLines(cls, name, readLines, obj, fields):
         try:
-            for line in getProcPool().readLines(filename):
+            for line in readLines(name):
                 # process current line
                 line = line.encode('utf8')
                 if line.find(KEY_SEPARATOR) < 0:
@@ -633,21 +689,21 @@ class Task:
                 parts = line.split(KEY_SEPARATOR)
                 if len(parts) != 2:
                     cls.log.warning("Task._loadMetaFile: %s - ignoring line"
-                                    " '%s'", filename, line)
+                                    " '%s'", name, line)
                     continue
 
                 field = _eq_decode(parts[0].strip())
                 value = _eq_decode(parts[1].strip())
                 if field not in fields:
                     cls.log.warning("Task._loadMetaFile: %s - ignoring field"
-                                    " %s in line '%s'", filename, field, line)
+                                    " %s in line '%s'", name, field, line)
                     continue
 
                 ftype = fields[field]
                 setattr(obj, field, ftype(value))
         except Exception:
             cls.log.error("Unexpected error", exc_info=True)
-            raise se.TaskMetaDataLoadError(filename)
+            raise se.TaskMetaDataLoadError(name)
 
     @classmethod
     def _dump(cls, obj, fields):
@@ -670,50 +726,23 @@ class Task:
                     lines.append("%s %s %s" % (field, KEY_SEPARATOR, value))
         return lines
 
-    @classmethod
-    def _saveMetaFile(cls, filename, obj, fields):
-        try:
-            getProcPool().writeLines(filename,
-                                     [l.encode('utf8') + "\n"
-                                      for l in cls._dump(obj, fields)])
-        except Exception:
-            cls.log.error("Unexpected error", exc_info=True)
-            raise se.TaskMetaDataSaveError(filename)
-
     def _loadTaskMetaFile(self, taskDir):
         taskFile = os.path.join(taskDir, self.id + TASK_EXT)
         self._loadMetaFile(taskFile, self, Task.fields)
 
-    def _saveTaskMetaFile(self, taskDir):
-        taskFile = os.path.join(taskDir, self.id + TASK_EXT)
-        self._saveMetaFile(taskFile, self, Task.fields)
-
     def _loadJobMetaFile(self, taskDir, n):
         taskFile = os.path.join(taskDir, self.id + JOB_EXT + NUM_SEP + str(n))
         self._loadMetaFile(taskFile, self.jobs[n], Job.fields)
 
-    def _saveJobMetaFile(self, taskDir, n):
-        taskFile = os.path.join(taskDir, self.id + JOB_EXT + NUM_SEP + str(n))
-        self._saveMetaFile(taskFile, self.jobs[n], Job.fields)
-
     def _loadRecoveryMetaFile(self, taskDir, n):
         taskFile = os.path.join(taskDir,
                                 self.id + RECOVER_EXT + NUM_SEP + str(n))
         self._loadMetaFile(taskFile, self.recoveries[n], Recovery.fields)
 
-    def _saveRecoveryMetaFile(self, taskDir, n):
-        taskFile = os.path.join(taskDir,
-                                self.id + RECOVER_EXT + NUM_SEP + str(n))
-        self._saveMetaFile(taskFile, self.recoveries[n], Recovery.fields)
-
     def _loadTaskResultMetaFile(self, taskDir):
         taskFile = os.path.join(taskDir, self.id + RESULT_EXT)
         self._loadMetaFile(taskFile, self.result, TaskResult.fields)
 
-    def _saveTaskResultMetaFile(self, taskDir):
-        taskFile = os.path.join(taskDir, self.id + RESULT_EXT)
-        self._saveMetaFile(taskFile, self.result, TaskResult.fields)
-
     def _getResourcesKeyList(self, taskDir):
         keys = []
         for path in getProcPool().glob.glob(os.path.join(taskDir,
@@ -748,42 +777,70 @@ class Task:
             self._loadRecoveryMetaFile(taskDir, rn)
             self.recoveries[rn].setOwnerTask(self)
 
+    def _loadRecord(self, record):
+        """
+        Load the task from a journal record written by _save.
+        """
+        self.log.debug("%s: load from journal record", self)
+        if self.state != State.init:
+            raise se.TaskMetaDataLoadError("task %s - can't load self: "
+                                           "not in init state" % self)
+
+        def readLines(name):
+            return record[name]
+
+        oldid = self.id
+        self._loadMetaLines("task", readLines, self, Task.fields)
+        if self.id != oldid:
+            raise se.TaskMetaDataLoadError("task %s: loaded record do not "
+                                           "match id (%s != %s)" %
+                                           (self, self.id, oldid))
+        if self.state == State.finished:
+            self._loadMetaLines("result", readLines, self.result,
+                                TaskResult.fields)
+        for jn in range(self.njobs):
+            self.jobs.append(Job("load", None))
+            self._loadMetaLines("jobs", lambda _: record["jobs"][jn],
+                                self.jobs[jn], Job.fields)
+            self.jobs[jn].setOwnerTask(self)
+        for rn in range(self.nrecoveries):
+            self.recoveries.append(Recovery("load", "load",
+                                            "load", "load", ""))
+            self._loadMetaLines("recoveries",
+                                lambda _: record["recoveries"][rn],
+                                self.recoveries[rn], Recovery.fields)
+            self.recoveries[rn].setOwnerTask(self)
+
+    def _record(self):
+        self.njobs = len(self.jobs)
+        self.nrecoveries = len(self.recoveries)
+        record = {
+            "task": self._dump(self, Task.fields),
+            "jobs": [self._dump(job, Job.fields) for job in self.jobs],
+            "recoveries": [self._dump(rec, Recovery.fields)
+                           for rec in self.recoveries],
+        }
+        if self.state == State.finished:
+            record["result"] = self._dump(self.result, TaskResult.fields)
+        return record
+
     def _save(self, storPath):
-        origTaskDir = os.path.join(storPath, self.id)
-        if not getProcPool().os.path.exists(origTaskDir):
-            raise se.TaskDirError("_save: no such task dir '%s'" % origTaskDir)
-        taskDir = os.path.join(storPath, self.id + TEMP_EXT)
-        self.log.debug("_save: orig %s temp %s", origTaskDir, taskDir)
-        if getProcPool().os.path.exists(taskDir):
-            getProcPool().fileUtils.cleanupdir(taskDir)
-        getProcPool().os.mkdir(taskDir)
         try:
-            self.njobs = len(self.jobs)
-            self.nrecoveries = len(self.recoveries)
-            self._saveTaskMetaFile(taskDir)
-            if self.state == State.finished:
-                self._saveTaskResultMetaFile(taskDir)
-            for jn in range(self.njobs):
-                self._saveJobMetaFile(taskDir, jn)
-            for rn in range(self.nrecoveries):
-                self._saveRecoveryMetaFile(taskDir, rn)
+            getJournal(storPath).put(self.id, self._record())
         except Exception as e:
             self.log.error("Unexpected error", exc_info=True)
-            try:
-                getProcPool().fileUtils.cleanupdir(taskDir)
-            except:
-                self.log.warning("can't remove temp taskdir %s" % taskDir)
             raise se.TaskPersistError("%s persist failed: %s" % (self, e))
-        # Make sure backup dir doesn't exist
-        getProcPool().fileUtils.cleanupdir(origTaskDir + BACKUP_EXT)
-        getProcPool().os.rename(origTaskDir, origTaskDir + BACKUP_EXT)
-        getProcPool().os.rename(taskDir, origTaskDir)
-        getProcPool().fileUtils.cleanupdir(origTaskDir + BACKUP_EXT)
-        getProcPool().fileUtils.fsyncPath(origTaskDir)
 
     def _clean(self, storPath):
-        taskDir = os.path.join(storPath, self.id)
-        getProcPool().fileUtils.cleanupdir(taskDir)
+        try:
+            getJournal(storPath).remove(self.id)
+        except journal.ClosedError:
+            self.log.warning("Task journal %s was closed, not cleaning",
+                             storPath)
+            return
+        legacyDir = os.path.join(storPath, self.id)
+        if getProcPool().os.path.exists(legacyDir):
+            getProcPool().fileUtils.cleanupdir(legacyDir)
 
     def _recoverDone(self):
         # protect agains races with stop/abort
@@ -1104,13 +1161,12 @@ class Task:
         self.setCleanPolicy(cleanPolicy)
         if self.persistPolicy != TaskPersistType.none and not self.store:
             raise se.TaskPersistError("no store defined")
-        taskDir = os.path.join(self.store, self.id)
         try:
-            getProcPool().fileUtils.createdir(taskDir)
+            getJournal(self.store)
         except Exception as e:
             self.log.error("Unexpected error", exc_info=True)
-            raise se.TaskPersistError("%s: cannot access/create taskdir"
-                                      " %s: %s" % (self, taskDir, e))
+            raise se.TaskPersistError("%s: cannot access/create task journal"
+                                      " in %s: %s" % (self, self.store, e))
         if (self.persistPolicy == TaskPersistType.auto and
                 self.state != State.init):
             self.persist()
@@ -1137,6 +1193,33 @@ class Task:
             raise se.TaskStateError("can't persist in state %s" % self.state)
         self._save(self.store)
 
+    def migrate(self):
+        """
+        Move a task loaded from a legacy task directory into the journal.
+        """
+        self._save(self.store)
+        for ext in ("", TEMP_EXT, BACKUP_EXT):
+            taskDir = os.path.join(self.store, self.id + ext)
+            if getProcPool().os.path.exists(taskDir):
+                getProcPool().fileUtils.cleanupdir(taskDir)
+
+    @classmethod
+    def loadJournaledTasks(cls, store):
+        """
+        Return the tasks persisted in the journal of store.
+        """
+        tasks = []
+        for taskid, record in getJournal(store).items():
+            try:
+                t = Task(taskid)
+                t._loadRecord(record)
+            except Exception:
+                cls.log.error("Skipping journaled task %s", taskid,
+                              exc_info=True)
+                continue
+            tasks.append(t)
+        return tasks
+
     @classmethod
     def loadTask(cls, store, taskid):
         t = Task(taskid)
@@ -25,7 +25,7 @@ import threading
 from vdsm.config import config
 from vdsm.storage import exception as se
 
-from task import Task, Job, TaskCleanType
+from task import Task, Job, TaskCleanType, JOURNAL_FILE
 from threadPool import ThreadPool
 
 
@@ -207,15 +207,31 @@ class TaskManager:
         if not os.path.exists(store):
             self.log.debug("task dump path %s does not exist.", store)
             return
-        # taskID is the root part of each (root.ext) entry in the dump task dir
-        tasksIDs = set(os.path.splitext(tid)[0] for tid in os.listdir(store))
-        for taskID in tasksIDs:
+        journaled = set()
+        for t in Task.loadJournaledTasks(store):
+            self.log.debug("Loading journaled task %s", t.id)
+            try:
+                t.setPersistence(store,
+                                 str(t.persistPolicy),
+                                 str(t.cleanPolicy))
+            except Exception:
+                self.log.error("taskManager: Skipping task: %s", t.id,
+                               exc_info=True)
+                continue
+            journaled.add(t.id)
+            self._unqueuedTasks.append(t)
+        # Tasks dumped by older versions use a directory per task. taskID is
+        # the root part of each (root.ext) entry in the dump task dir.
+        tasksIDs = set(os.path.splitext(tid)[0] for tid in os.listdir(store)
+                       if not tid.startswith(JOURNAL_FILE))
+        for taskID in tasksIDs - journaled:
             self.log.debug("Loading dumped task %s", taskID)
             try:
                 t = Task.loadTask(store, taskID)
                 t.setPersistence(store,
                                  str(t.persistPolicy),
                                  str(t.cleanPolicy))
+                t.migrate()
                 self._unqueuedTasks.append(t)
             except Exception:
                 self.log.error("taskManager: Skipping directory: %s",
@@ -57,12 +57,55 @@ def getVcpuNumaMemoryMapping(vmName):
     vCpuPids = numa.getVcpuPid(vmName)
     vCpuIdxToNode = {}
     for vCpuIndex, vCpuPid in vCpuPids.iteritems():
-        numaMapsFile = "/proc/%s/task/%s/numa_maps" % (vmPid, vCpuPid)
         try:
-            with open(numaMapsFile, 'r') as f:
-                mappingNodes = map(
-                    int, re.findall('N(\d+)=\d+', f.read()))
-                vCpuIdxToNode[vCpuIndex] = list(set(mappingNodes))
+            vCpuIdxToNode[vCpuIndex] = _readNumaMapsNodes(vmPid, vCpuPid)
         except IOError:
             continue
     return vCpuIdxToNode
+
+
+@expose
+def getVcpusNumaInfo(vmNames):
+    """
+    Return the runtime NUMA info of the vcpus of many VMs in one call:
+    {vmName: {vCpuIndex: (last physical cpu, [host numa node, ...])}}
+
+    VMs which are not running are not reported.
+    """
+    result = {}
+    for vmName in vmNames:
+        try:
+            vmPid = getVmPid(vmName).strip()
+            vCpuPids = numa.getVcpuPid(vmName)
+        except (IOError, OSError):
+            continue
+        vCpusInfo = {}
+        for vCpuIndex, vCpuPid in vCpuPids.iteritems():
+            try:
+                pCpu = _readLastCpu(vmPid, vCpuPid)
+            except IOError:
+                continue
+            try:
+                nodes = _readNumaMapsNodes(vmPid, vCpuPid)
+            except IOError:
+                nodes = []
+            vCpusInfo[vCpuIndex] = (pCpu, nodes)
+        result[vmName] = vCpusInfo
+    return result
+
+
+def _readNumaMapsNodes(vmPid, vCpuPid):
+    numaMapsFile = "/proc/%s/task/%s/numa_maps" % (vmPid, vCpuPid)
+    with open(numaMapsFile, 'r') as f:
+        mappingNodes = map(
+            int, re.findall('N(\d+)=\d+', f.read()))
+    return list(set(mappingNodes))
+
+
+def _readLastCpu(vmPid, vCpuPid):
+    statFile = "/proc/%s/task/%s/stat" % (vmPid, vCpuPid)
+    with open(statFile, 'r') as f:
+        # The command name may contain spaces, the other fields follow its
+        # closing parenthesis, starting at the 3rd field. The 39th field is
+        # the cpu the task last ran on.
+        return int(f.read().rsplit(')', 1)[1].split()[36])
@@ -17,17 +17,32 @@
 #
 # Refer to the README and COPYING files for full details of the license
 #
+import re
 import xml.dom.minidom
+import xml.parsers.expat
+
+import six
+
+# Matches the rest of a tag, skipping '>' in quoted attribute values.
+_TAG_END = re.compile(br'''[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>''')
 
 
 class DomainDescriptor(object):
+    """
+    Describe a domain XML.
+
+    The XML is scanned once to index the devices by tag name, keeping the
+    byte span of every device. Devices are parsed only when their elements
+    are requested, and the devices hash is computed from the raw devices
+    span.
+    """
 
     def __init__(self, xmlStr):
         self._xml = xmlStr
-        self._dom = xml.dom.minidom.parseString(xmlStr)
-        self._devices = self._first_element_by_tag_name('devices')
-        self._devices_hash = hash(self._devices.toxml()
-                                  if self._devices is not None else '')
+        self._index = _Index(xmlStr)
+        self._devices = None
+        self._all_devices = None
+        self._device_nodes = {}
 
     @classmethod
     def from_id(cls, uuid):
@@ -39,14 +54,25 @@ class DomainDescriptor(object):
 
     @property
     def devices(self):
+        if self._devices is None and self._index.devices is not None:
+            try:
+                self._devices = _parse(self._index.devices)
+            except xml.parsers.expat.ExpatError:
+                self._devices = self._parse_all()
         return self._devices
 
     def get_device_elements(self, tagName):
-        return self._devices.getElementsByTagName(tagName)
+        elements = []
+        for i in self._index.tags.get(tagName, ()):
+            node = self._device_node(i)
+            if node.nodeName == tagName:
+                elements.append(node)
+            elements.extend(node.getElementsByTagName(tagName))
+        return elements
 
     @property
     def devices_hash(self):
-        return self._devices_hash
+        return hash(self._index.devices or '')
 
     def all_channels(self):
         for channel in self.get_device_elements('channel'):
@@ -60,13 +86,110 @@ class DomainDescriptor(object):
             else:
                 yield name, path
 
-    def _first_element_by_tag_name(self, tagName):
-        elements = self._dom.childNodes[0].getElementsByTagName(tagName)
-        return elements[0] if elements else None
-
     def get_memory_size(self):
         """
         Return the vm memory from xml in MiB
         """
-        memory = self._first_element_by_tag_name("memory")
-        return int(memory.firstChild.nodeValue) // 1024 if memory else None
+        memory = self._index.memory
+        return int(memory) // 1024 if memory is not None else None
+
+    def _device_node(self, i):
+        try:
+            return self._device_nodes[i]
+        except KeyError:
+            try:
+                node = _parse(self._index.device_spans[i])
+            except xml.parsers.expat.ExpatError:
+                # A device using a namespace declared on the domain cannot
+                # be parsed on its own.
+                node = self._parse_all().childNodes[i]
+            self._device_nodes[i] = node
+            return node
+
+    def _parse_all(self):
+        if self._all_devices is None:
+            dom = xml.dom.minidom.parseString(self._index.data)
+            for node in dom.documentElement.childNodes:
+                if node.nodeName == 'devices':
+                    for child in list(node.childNodes):
+                        if child.nodeType != child.ELEMENT_NODE:
+                            node.removeChild(child)
+                    self._all_devices = node
+                    break
+        return self._all_devices
+
+
+class _Index(object):
+    """
+    Scan a domain XML, keeping:
+
+    data            The XML as bytes
+    devices         The bytes of the <devices> element, or None
+    device_spans    The bytes of every device element
+    tags            The indexes in device_spans of the devices containing
+                    each tag name, in document order
+    memory          The text of the first <memory> element, or None
+    """
+
+    def __init__(self, xmlStr):
+        if isinstance(xmlStr, six.text_type):
+            xmlStr = xmlStr.encode('utf-8')
+        self.data = xmlStr
+        self.devices = None
+        self.device_spans = []
+        self.tags = {}
+        self.memory = None
+        self._depth = 0
+        self._starts = []
+        self._memory_text = None
+        self._parser = xml.parsers.expat.ParserCreate()
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._text
+        self._parser.Parse(self.data, True)
+        self._parser = None
+
+    def _start(self, name, attrs):
+        self._depth += 1
+        if self._depth == 2 and name == 'devices':
+            self._starts.append(self._parser.CurrentByteIndex)
+        elif self._depth == 3 and self._in_devices():
+            self._starts.append(self._parser.CurrentByteIndex)
+        if self._depth >= 3 and self._in_devices():
+            indexes = self.tags.setdefault(name, [])
+            i = len(self.device_spans)
+            if not indexes or indexes[-1] != i:
+                indexes.append(i)
+        if name == 'memory' and self.memory is None:
+            self._memory_text = []
+
+    def _end(self, name):
+        if self._depth == 2 and name == 'devices':
+            self.devices = self._span()
+        elif self._depth == 3 and self._in_devices():
+            self.device_spans.append(self._span())
+        if name == 'memory' and self._memory_text is not None:
+            self.memory = ''.join(self._memory_text)
+            self._memory_text = None
+        self._depth -= 1
+
+    def _text(self, data):
+        if self._memory_text is not None:
+            self._memory_text.append(data)
+
+    def _in_devices(self):
+        return bool(self._starts) and self.devices is None
+
+    def _span(self):
+        start = self._starts.pop()
+        start_tag_end = _TAG_END.match(self.data, start).end()
+        if self.data[start_tag_end - 2:start_tag_end] == b'/>':
+            end = start_tag_end
+        else:
+            end = _TAG_END.match(self.data,
+                                 self._parser.CurrentByteIndex).end()
+        return self.data[start:end]
+
+
+def _parse(data):
+    return xml.dom.minidom.parseString(data).documentElement
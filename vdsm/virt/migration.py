@@ -19,6 +19,7 @@
 #
 
 import collections
+from functools import partial
 import threading
 import time
 import libvirt
@@ -79,6 +80,21 @@ class MigrationLimitExceeded(RuntimeError):
     """
 
 
+def _create_stomp_client(cif, remote_host, port):
+    sslctx = sslutils.create_ssl_context()
+
+    def is_ipv6_address(a):
+        return (':' in a) and a.startswith('[') and a.endswith(']')
+
+    if is_ipv6_address(remote_host):
+        host = remote_host[1:-1]
+    else:
+        host = remote_host
+
+    client_socket = utils.create_connected_socket(host, int(port), sslctx)
+    return cif.createStompClient(client_socket)
+
+
 class SourceThread(object):
     """
     A thread that takes care of migration on the source vdsm.
@@ -128,6 +144,7 @@ class SourceThread(object):
         self._migrationCanceledEvt = threading.Event()
         self._monitorThread = None
         self._destServer = None
+        self._destServerPooled = False
         self._convergence_schedule = {
             'init': [],
             'stalling': []
@@ -167,20 +184,6 @@ class SourceThread(object):
 
         return self.status
 
-    def _createClient(self, port):
-        sslctx = sslutils.create_ssl_context()
-
-        def is_ipv6_address(a):
-            return (':' in a) and a.startswith('[') and a.endswith(']')
-
-        if is_ipv6_address(self.remoteHost):
-            host = self.remoteHost[1:-1]
-        else:
-            host = self.remoteHost
-
-        client_socket = utils.create_connected_socket(host, int(port), sslctx)
-        return self._vm.cif.createStompClient(client_socket)
-
     def _setupVdsConnection(self):
         if self.hibernating:
             return
@@ -191,14 +194,24 @@ class SourceThread(object):
         self.remoteHost, port = hostPort.rsplit(':', 1)
 
         try:
-            client = self._createClient(port)
             requestQueues = config.get('addresses', 'request_queues')
             requestQueue = requestQueues.split(",")[0]
-            self._destServer = jsonrpcvdscli.connect(requestQueue, client)
+            # Migrations to the same destination share one connection.
+            self._destServer = jsonrpcvdscli.connect_pooled(
+                self.remoteHost, int(port),
+                useSSL=config.getboolean('vars', 'ssl'),
+                requestQueue=requestQueue,
+                stompClientFactory=partial(
+                    _create_stomp_client, self._vm.cif, self.remoteHost,
+                    port))
+            self._destServerPooled = True
             self.log.debug('Initiating connection with destination')
             self._destServer.ping()
 
         except (JsonRpcBindingsError, JsonRpcNoResponseError):
+            if self._destServerPooled:
+                self._destServer.close()
+                self._destServerPooled = False
             if config.getboolean('vars', 'ssl'):
                 self._destServer = vdscli.connect(
                     hostPort,
@@ -369,7 +382,7 @@ class SourceThread(object):
                             'dstqemu': self._dstqemu,
                         }
                         with self._vm.migration_parameters(params):
-                            self._vm.saveState()
+                            self._vm.saveState(flush=True)
                             self._startUnderlyingMigration(time.time())
                             self._finishSuccessfully()
                 except libvirt.libvirtError as e:
@@ -389,6 +402,17 @@ class SourceThread(object):
         except Exception as e:
             self._recover(str(e))
             self.log.exception("Failed to migrate")
+        finally:
+            self._teardownVdsConnection()
+
+    def _teardownVdsConnection(self):
+        # Closing the JSON-RPC proxy returns its connection to the pool. The
+        # xmlrpc proxies have no connection to release, and calling close()
+        # on them would call a remote method.
+        if self._destServerPooled:
+            self._destServer.close()
+            self._destServerPooled = False
+        self._destServer = None
 
     def _startUnderlyingMigration(self, startTime):
         if self.hibernating:
@@ -18,6 +18,8 @@
 # Refer to the README and COPYING files for full details of the license
 #
 
+from collections import OrderedDict
+from contextlib import contextmanager
 import logging
 import os
 import os.path
@@ -29,15 +31,55 @@ import libvirt
 
 from vdsm.common import response
 from vdsm.compat import pickle
+from vdsm import concurrent
 from vdsm import constants
 from vdsm import libvirtconnection
 from vdsm import utils
+from vdsm.config import config
 from vdsm.virt import vmchannels
 from vdsm.virt import vmstatus
 from vdsm.virt.utils import isVdsmImage
 
 from . import vmxml
 
+# Number of VMs read and recovered concurrently.
+WORKERS = 8
+
+_writer = None
+
+
+def start():
+    """
+    Start writing the state of VMs in the background. Until started, and
+    after stopped, the state is written when it is saved.
+    """
+    global _writer
+    assert _writer is None
+    interval = config.getfloat('vars', 'vm_state_save_interval')
+    if interval > 0:
+        _writer = _Writer(interval)
+        _writer.start()
+
+
+def stop():
+    """
+    Write the state of all dirty VMs and stop the background writer.
+    """
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+def stats():
+    """
+    Return the number of saves written to the recovery files and coalesced
+    with a pending save, since the background writer was started.
+    """
+    if _writer is None:
+        return {'written': 0, 'coalesced': 0}
+    return _writer.stats()
+
 
 def _list_domains():
     conn = libvirtconnection.get()
@@ -76,6 +118,8 @@ class File(object):
         self._name = '%s%s' % (vmid, self.EXTENSION)
         self._path = os.path.join(constants.P_VDSM_RUN, self._name)
         self._lock = threading.Lock()
+        self._seq = 0
+        self._written_seq = 0
 
     @property
     def vmid(self):
@@ -86,24 +130,63 @@ class File(object):
         return self._name
 
     def cleanup(self):
+        writer = _writer
+        if writer is not None:
+            writer.discard(self)
         with self._lock:
             utils.rmFile(self._path)
             self._path = None
 
-    def save(self, vm):
+    def save(self, vm, flush=False):
+        """
+        Mark the state of vm dirty, to be written by the background writer.
+        If flush is True, or the writer is not running, write the state now.
+        """
+        writer = _writer
+        if writer is not None:
+            if not flush and writer.mark(self, vm):
+                return
+            writer.discard(self)
+        self.write(vm)
+
+    def write(self, vm):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
         data = self._collect(vm)
         with self._lock:
             if self._path is None:
                 self._log.debug('save after cleanup')
+            elif seq < self._written_seq:
+                # A state collected after this one was already written.
+                self._log.debug('skipping outdated save')
             else:
                 self._dump(data)
+                self._written_seq = seq
 
     def load(self, cif):
-        self._log.debug("recovery: trying with VM %s", self._vmid)
+        params = self.read()
+        if params is None:
+            return False
+        return self.recover(cif, params)
+
+    def read(self):
+        """
+        Return the VM parameters saved in this file, or None if the file
+        cannot be read.
+        """
+        self._log.debug("recovery: reading VM %s", self._vmid)
         try:
             with open(self._path) as src:
                 params = pickle.load(src)
-            self._set_elapsed_time(params)
+        except Exception:
+            self._log.exception("Error reading VM %s", self._vmid)
+            return None
+        return self._set_elapsed_time(params)
+
+    def recover(self, cif, params):
+        self._log.debug("recovery: trying with VM %s", self._vmid)
+        try:
             res = cif.createVm(params, vmRecover=True)
         except Exception:
             self._log.exception("Error recovering VM: %s", self._vmid)
@@ -156,6 +239,120 @@ class File(object):
         return params
 
 
+class _Writer(object):
+    """
+    Write the state of dirty VMs in a background thread.
+
+    The state of a VM is written once the interval since it was marked dirty
+    has passed; marking a VM dirty again before it is written is coalesced
+    with the pending save.
+    """
+
+    _log = logging.getLogger("virt.recovery.writer")
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._cond = threading.Condition(threading.Lock())
+        # File -> (vm, deadline), ordered by deadline
+        self._dirty = OrderedDict()
+        self._running = False
+        self._thread = None
+        self._written = 0
+        self._coalesced = 0
+
+    def start(self):
+        self._log.info("Starting recovery file writer (interval=%s)",
+                       self._interval)
+        with self._cond:
+            self._running = True
+        self._thread = concurrent.thread(self._run, name="recovery/writer",
+                                         logger=self._log.name)
+        self._thread.start()
+
+    def stop(self):
+        self._log.info("Stopping recovery file writer")
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self._log.info("Recovery file writer stopped (written=%d, "
+                       "coalesced=%d)", self._written, self._coalesced)
+
+    def stats(self):
+        with self._cond:
+            return {'written': self._written, 'coalesced': self._coalesced}
+
+    def mark(self, vm_file, vm):
+        """
+        Mark vm_file dirty, returning False if the writer is not running.
+        """
+        with self._cond:
+            if not self._running:
+                return False
+            if vm_file in self._dirty:
+                self._coalesced += 1
+            else:
+                deadline = utils.monotonic_time() + self._interval
+                self._dirty[vm_file] = (vm, deadline)
+                self._cond.notify()
+            return True
+
+    def discard(self, vm_file):
+        with self._cond:
+            self._dirty.pop(vm_file, None)
+
+    def _run(self):
+        self._log.debug("Recovery file writer started")
+        while True:
+            with self._cond:
+                self._wait()
+                if not self._dirty:
+                    break
+                due = self._pop_due()
+            for vm_file, vm in due:
+                try:
+                    vm_file.write(vm)
+                except Exception:
+                    self._log.exception("Error writing state of VM %s",
+                                        vm_file.vmid)
+                with self._cond:
+                    self._written += 1
+
+    def _wait(self):
+        while self._running:
+            if not self._dirty:
+                self._cond.wait()
+                continue
+            vm, deadline = next(iter(self._dirty.values()))
+            now = utils.monotonic_time()
+            if deadline <= now:
+                break
+            self._cond.wait(deadline - now)
+
+    def _pop_due(self):
+        # When stopping, all dirty VMs are written.
+        now = utils.monotonic_time()
+        due = []
+        while self._dirty:
+            vm_file, (vm, deadline) = next(iter(self._dirty.items()))
+            if self._running and deadline > now:
+                break
+            del self._dirty[vm_file]
+            due.append((vm_file, vm))
+        return due
+
+
+@contextmanager
+def phase(log, name):
+    """
+    Log the time spent in a recovery phase.
+    """
+    start = utils.monotonic_time()
+    yield
+    log.info('recovery: %s completed in %.2f seconds',
+             name, utils.monotonic_time() - start)
+
+
 def all_vms(cif):
     # Recover stage 1: domains from libvirt
     _all_vms_from_libvirt(cif)
@@ -167,12 +364,31 @@ def all_vms(cif):
 
 
 def _all_vms_from_libvirt(cif):
-    doms = _get_vdsm_domains()
+    with phase(cif.log, 'listing domains'):
+        doms = _get_vdsm_domains()
     num_doms = len(doms)
-    for idx, v in enumerate(doms):
-        vm_id = v.UUIDString()
-        vm_state = File(vm_id)
-        if vm_state.load(cif):
+    vm_states = [File(dom.UUIDString()) for dom in doms]
+
+    with phase(cif.log, 'reading %d recovery files' % num_doms):
+        results = concurrent.tmap(
+            lambda vm_state: vm_state.read(), vm_states, workers=WORKERS)
+
+    def recover(item):
+        vm_state, params = item
+        if params is None:
+            return False
+        return vm_state.recover(cif, params)
+
+    with phase(cif.log, 'recovering %d domains' % num_doms):
+        results = concurrent.tmap(
+            recover, zip(vm_states, [r.value for r in results]),
+            workers=WORKERS)
+
+    # Loose domains are killed only after all domains were recovered, in the
+    # order reported by libvirt.
+    for idx, (v, vm_state, res) in enumerate(zip(doms, vm_states, results)):
+        vm_id = vm_state.vmid
+        if res.succeeded and res.value:
             cif.log.info(
                 'recovery [1:%d/%d]: recovered domain %s from libvirt',
                 idx+1, num_doms, vm_id)
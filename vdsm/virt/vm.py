@@ -55,6 +55,7 @@ from vdsm.logUtils import SimpleLogAdapter
 from vdsm.network import api as net_api
 from vdsm.storage import fileUtils
 from vdsm.virt import guestagent
+from vdsm.virt import periodic
 from vdsm.virt import sampling
 from vdsm.virt import vmchannels
 from vdsm.virt import vmexitreason
@@ -77,7 +78,7 @@ from . import migration
 from . import recovery
 from . import vmdevices
 from .vmdevices import hwclass
-from .vmdevices.storage import DISK_TYPE
+from .vmdevices.storage import DISK_TYPE, BLOCK_THRESHOLD
 from .vmtune import update_io_tune_dom, collect_inner_elements
 from .vmtune import io_tune_values_to_dom, io_tune_dom_to_values
 from . import vmxml
@@ -204,6 +205,9 @@ class Vm(object):
     log = logging.getLogger("virt.vm")
     # limit threads number until the libvirt lock will be fixed
     _ongoingCreations = threading.BoundedSemaphore(4)
+    # Recovered VMs do not create libvirt domains, and are bounded separately
+    # so recovery does not wait for domain creations.
+    _ongoingRecoveries = threading.BoundedSemaphore(recovery.WORKERS)
     DeviceMapping = ((hwclass.DISK, vmdevices.storage.Drive),
                      (hwclass.NIC, vmdevices.network.Interface),
                      (hwclass.SOUND, vmdevices.core.Sound),
@@ -277,6 +281,7 @@ class Vm(object):
 
         self._usedIndices = {}  # {'ide': [], 'virtio' = []}
         self.disableDriveMonitor()
+        self._lastFullDriveCheck = 0
         self._vmStartEvent = threading.Event()
         self._vmAsyncStartError = None
         self._vmCreationEvent = threading.Event()
@@ -520,11 +525,15 @@ class Vm(object):
                 self._vmStartEvent.set()
                 return
 
-        self.saveState()
+        self.saveState(flush=True)
         self._vmStartEvent.set()
         try:
             self.memCommit()
-            with self._ongoingCreations:
+            if self.recovering:
+                ongoing = self._ongoingRecoveries
+            else:
+                ongoing = self._ongoingCreations
+            with ongoing:
                 self._vmCreationEvent.set()
                 try:
                     self._run()
@@ -602,17 +611,28 @@ class Vm(object):
     def driveMonitorEnabled(self):
         return self._driveMonitorEnabled
 
-    def preparePaths(self):
-        drives = self._devSpecMapFromConf()[hwclass.DISK]
-        self._preparePathsForDrives(drives)
+    def drivesToPrepare(self):
+        """
+        Return the drives whose paths should be prepared when recovering.
+        """
+        return self._devSpecMapFromConf()[hwclass.DISK]
+
+    def prepareDrivePath(self, drive):
+        """
+        Prepare the path of drive, returning False if a destroy request has
+        been issued.
+        """
+        with self._volPrepareLock:
+            if self._destroy_requested.is_set():
+                return False
+            drive['path'] = self.cif.prepareVolumePath(drive, self.id)
+            return True
 
     def _preparePathsForDrives(self, drives):
         for drive in drives:
-            with self._volPrepareLock:
-                if self._destroy_requested.is_set():
-                    # A destroy request has been issued, exit early
-                    break
-                drive['path'] = self.cif.prepareVolumePath(drive, self.id)
+            if not self.prepareDrivePath(drive):
+                # A destroy request has been issued, exit early
+                break
 
         else:
             # Now we got all the resources we needed
@@ -667,14 +687,13 @@ class Vm(object):
             load = len(self.cif.vmContainer)
         return base * (doubler + load) / doubler
 
-    def saveState(self):
-        self._recovery_file.save(self)
-
-        try:
-            self._updateDomainDescriptor()
-        except Exception:
-            # we do not care if _dom suddenly died now
-            pass
+    def saveState(self, flush=False):
+        """
+        Save the state of this VM to its recovery file. The file is written
+        in the background unless flush is True, when the state must be durable
+        before returning.
+        """
+        self._recovery_file.save(self, flush=flush)
 
     def onReboot(self):
         try:
@@ -753,10 +772,10 @@ class Vm(object):
         with self._confLock:
             self.conf['timeOffset'] = newTimeOffset
 
-    def _getExtendCandidates(self):
+    def _getExtendCandidates(self, drives):
         ret = []
 
-        for drive in self._chunkedDrives():
+        for drive in drives:
             try:
                 capacity, alloc, physical = self._getExtendInfo(drive)
             except libvirt.libvirtError as e:
@@ -776,6 +795,75 @@ class Vm(object):
         return [drive for drive in self._devices[hwclass.DISK]
                 if drive.chunked or drive.replicaChunked]
 
+    def _monitoredDrives(self):
+        """
+        Return the chunked drives that should be checked now.
+
+        Drives with a block threshold set need to be checked only when
+        libvirt reports that the threshold was exceeded. All drives are
+        checked once in vm_watermark_safety_interval, in case an event was
+        missed.
+        """
+        drives = self._chunkedDrives()
+        if self._fullDriveCheckDue():
+            return drives
+        return [drive for drive in drives
+                if drive.threshold_state != BLOCK_THRESHOLD.SET or
+                not self._canSetThreshold(drive)]
+
+    def _fullDriveCheckDue(self):
+        interval = config.getint('vars', 'vm_watermark_safety_interval')
+        return utils.monotonic_time() - self._lastFullDriveCheck >= interval
+
+    def _canSetThreshold(self, drive):
+        """
+        Return True if the drive can be monitored using block threshold
+        events. Libvirt reports the threshold of the drive, not of the
+        replica, so replicating drives are monitored by polling.
+        """
+        return (libvirtconnection.BLOCK_THRESHOLD_EVENT is not None and
+                drive.chunked and
+                not drive.isDiskReplicationInProgress())
+
+    def _setDriveThreshold(self, drive, capacity, physical):
+        """
+        Ask libvirt to report when the guest writes beyond the point where
+        the drive should be extended.
+        """
+        if physical >= drive.getMaxVolumeSize(capacity):
+            # The drive cannot be extended any more, nothing to monitor.
+            drive.threshold_state = BLOCK_THRESHOLD.SET
+            return
+        threshold = physical - drive.watermarkLimit
+        self.log.debug("Setting block threshold to %d bytes for drive %s "
+                       "(physical: %d)", threshold, drive.name, physical)
+        try:
+            self._dom.setBlockThreshold(drive.name, threshold)
+        except libvirt.libvirtError as e:
+            self.log.error("Unable to set block threshold for drive %s: %s",
+                           drive.name, e)
+            return
+        drive.threshold_state = BLOCK_THRESHOLD.SET
+
+    def onBlockThreshold(self, target, path, threshold, excess):
+        """
+        Called when libvirt reports that the block threshold of a drive was
+        exceeded. Libvirt clears the threshold, so the drive is checked and
+        extended if needed right away, and a new threshold is set later.
+        """
+        self.log.info("Block threshold %s exceeded by %s for drive %s (%s)",
+                      threshold, excess, target, path)
+        # The target may name an element of the backing chain, e.g. vda[1].
+        name = target.split('[', 1)[0]
+        try:
+            drive = self._findDriveByName(name)
+        except LookupError:
+            self.log.warning("Unknown drive %s for block threshold event",
+                             name)
+            return
+        drive.threshold_state = BLOCK_THRESHOLD.EXCEEDED
+        periodic.monitor_drives(self)
+
     def _getExtendInfo(self, drive):
         """
         Return extension info for a chunked drive or drive replicating to
@@ -842,15 +930,28 @@ class Vm(object):
         If this returns True, the periodic system will invoke
         extendDrivesIfNeeded during this periodic cycle.
         """
-        return self._driveMonitorEnabled and bool(self._chunkedDrives())
+        return self._driveMonitorEnabled and bool(self._monitoredDrives())
 
     def extendDrivesIfNeeded(self):
+        if self._fullDriveCheckDue():
+            self._lastFullDriveCheck = utils.monotonic_time()
+            drives = self._chunkedDrives()
+        else:
+            drives = self._monitoredDrives()
+
+        candidates = self._getExtendCandidates(drives)
         try:
-            extend = [x for x in self._getExtendCandidates()
-                      if self._shouldExtendVolume(*x)]
+            extend = [x for x in candidates if self._shouldExtendVolume(*x)]
         except ImprobableResizeRequestError:
             return False
 
+        # Drives being extended are checked again in the next cycles, until
+        # the extension is completed and a new threshold is set.
+        extending = set(x[0].name for x in extend)
+        for drive, volumeID, capacity, alloc, physical in candidates:
+            if drive.name not in extending and self._canSetThreshold(drive):
+                self._setDriveThreshold(drive, capacity, physical)
+
         for drive, volumeID, capacity, alloc, physical in extend:
             self.log.info(
                 "Requesting extension for volume %s on domain %s (apparent: "
@@ -959,7 +1060,7 @@ class Vm(object):
             self.cont()
         except libvirt.libvirtError:
             self.log.warn("VM %s can't be resumed", self.id, exc_info=True)
-        self._setWriteWatermarks()
+        self._resetDriveThreshold(volInfo['name'])
 
     def _acquireCpuLockWithTimeout(self):
         timeout = self._loadCorrectedTimeout(
@@ -1393,7 +1494,7 @@ class Vm(object):
         return stats
 
     def _getGuestStats(self):
-        stats = self.guestAgent.getGuestInfo()
+        stats = self.guestAgent.getGuestInfo().copy()
         realMemUsage = int(stats['memUsage'])
         if realMemUsage != 0:
             memUsage = (100 - float(realMemUsage) /
@@ -1801,7 +1902,7 @@ class Vm(object):
             # saving we will fail in inconsistent state during recovery.
             # So, to get proper device objects during VM recovery flow
             # we must to have updated conf before VM run
-            self.saveState()
+            self.saveState(flush=True)
 
         self._devices = self._devMapFromDevSpecMap(dev_spec_map)
 
@@ -1999,6 +2100,7 @@ class Vm(object):
             device_conf.append(nic)
             with self._confLock:
                 self.conf['devices'].append(nicParams)
+            self._updateDomainDescriptor()
             self.saveState()
             vmdevices.network.Interface.update_device_info(self, device_conf)
             hooks.after_nic_hotplug(nicXml, self.conf,
@@ -2075,6 +2177,7 @@ class Vm(object):
 
             with self._confLock:
                 self.conf['devices'].append(dev_spec)
+            self._updateDomainDescriptor()
             self.saveState()
             vmdevices.hostdevice.HostDevice.update_device_info(
                 self, self._devices[hwclass.HOSTDEV])
@@ -2131,6 +2234,8 @@ class Vm(object):
             dev_object.teardown()
             unplugged_devices.append(dev_name)
 
+        if unplugged_devices:
+            self._updateDomainDescriptor()
         return response.success(unpluggedDevices=unplugged_devices)
 
     def _hostdev_hotunplug_restore(self, dev_object, dev_spec):
@@ -2377,6 +2482,7 @@ class Vm(object):
                                            params=nic.custom)
             return response.error('hotunplugNic', e.message)
 
+        self._updateDomainDescriptor()
         hooks.after_nic_hotunplug(nicXml, self.conf,
                                   params=nic.custom)
         return {'status': doneCode, 'vmList': self.status()}
@@ -2442,6 +2548,7 @@ class Vm(object):
             return response.error('setNumberOfCpusErr', e.message)
 
         self.conf['smp'] = str(numberOfCpus)
+        self._updateDomainDescriptor()
         self.saveState()
         hooks.after_set_num_of_cpus()
         return {'status': doneCode, 'vmList': self.status()}
@@ -2810,6 +2917,7 @@ class Vm(object):
 
             with self._confLock:
                 self.conf['devices'].append(diskParams)
+            self._updateDomainDescriptor()
             self.saveState()
             vmdevices.storage.Drive.update_device_info(self, device_conf)
             hooks.after_disk_hotplug(driveXml, self.conf,
@@ -2862,6 +2970,7 @@ class Vm(object):
                         self.conf['devices'].remove(dev)
                     break
 
+            self._updateDomainDescriptor()
             self.saveState()
             hooks.after_disk_hotunplug(driveXml, self.conf,
                                        params=drive.custom)
@@ -3132,6 +3241,7 @@ class Vm(object):
                 for k, v in driveParams.iteritems():
                     setattr(vmDrive, k, v)
                 self.updateDriveVolume(vmDrive)
+                vmDrive.threshold_state = BLOCK_THRESHOLD.UNSET
                 break
         else:
             self.log.error("Unable to update the drive object for: %s",
@@ -3146,7 +3256,8 @@ class Vm(object):
         else:
             with self._confLock:
                 conf.update(driveParams)
-            self.saveState()
+            self._refreshDomainDescriptor()
+            self.saveState(flush=True)
 
     def freeze(self):
         """
@@ -3605,7 +3716,7 @@ class Vm(object):
         conf = self._findDriveConfigByName(drive.name)
         with self._confLock:
             conf['diskReplicate'] = replica
-        self.saveState()
+        self.saveState(flush=True)
 
         drive.diskReplicate = replica
 
@@ -3620,7 +3731,7 @@ class Vm(object):
         conf = self._findDriveConfigByName(drive.name)
         with self._confLock:
             conf['diskReplicate'] = drive.diskReplicate
-        self.saveState()
+        self.saveState(flush=True)
 
     def _delDiskReplica(self, drive):
         """
@@ -3632,7 +3743,7 @@ class Vm(object):
         conf = self._findDriveConfigByName(drive.name)
         with self._confLock:
             del conf['diskReplicate']
-        self.saveState()
+        self.saveState(flush=True)
 
     def _diskSizeExtendCow(self, drive, newSizeBytes):
         try:
@@ -3930,6 +4041,17 @@ class Vm(object):
         domainXML = self._dom.XMLDesc(0)
         self._domain = DomainDescriptor(domainXML)
 
+    def _refreshDomainDescriptor(self):
+        """
+        Update the domain descriptor after libvirt changed the domain on its
+        own, for example when a block job completes.
+        """
+        try:
+            self._updateDomainDescriptor()
+        except Exception:
+            # we do not care if _dom suddenly died now
+            pass
+
     def _ejectFloppy(self):
         if 'volatileFloppy' in self.conf:
             utils.rmFile(self.conf['floppy'])
@@ -4159,12 +4281,17 @@ class Vm(object):
         self.log.exception("Operation failed")
         return response.error(key, msg)
 
-    def _setWriteWatermarks(self):
+    def _resetDriveThreshold(self, name):
         """
-        Define when to receive an event about high write to guest image
-        Currently unavailable by libvirt.
+        Make the drive monitor check the drive and set a new block threshold
+        in the next cycle, after the drive was extended or its volume chain
+        was modified.
         """
-        pass
+        try:
+            drive = self._findDriveByName(name)
+        except LookupError:
+            return
+        drive.threshold_state = BLOCK_THRESHOLD.UNSET
 
     def onLibvirtLifecycleEvent(self, event, detail, opaque):
         self.log.debug('event %s detail %s opaque %s',
@@ -4303,7 +4430,7 @@ class Vm(object):
                                "%s already exists for image %s", jobID,
                                job['jobID'], drive['imageID'])
                 raise BlockJobExistsError()
-        self.saveState()
+        self.saveState(flush=True)
 
     def untrackBlockJob(self, jobID):
         with self._confLock:
@@ -4313,7 +4440,8 @@ class Vm(object):
                 # If there was contention on the confLock, this may have
                 # already been removed
                 return False
-        self.saveState()
+        self._refreshDomainDescriptor()
+        self.saveState(flush=True)
         return True
 
     def _activeLayerCommitReady(self, jobInfo):
@@ -4652,6 +4780,7 @@ class Vm(object):
             device['format'] = drive.format = driveFormat
             device['volumeID'] = drive.volumeID = volumeID
             device['volumeInfo'] = drive.volumeInfo = volInfo
+            drive.threshold_state = BLOCK_THRESHOLD.UNSET
             for v in device['volumeChain']:
                 if v['volumeID'] == volumeID:
                     v['path'] = activePath
@@ -4719,8 +4848,8 @@ class Vm(object):
                          stats_age)
         stats['monitorResponse'] = '-1'
 
-    def updateNumaInfo(self):
-        self._numaInfo = numa.getVmNumaNodeRuntimeInfo(self)
+    def updateNumaInfo(self, numaInfo):
+        self._numaInfo = numaInfo
 
     @property
     def hasGuestNumaNode(self):
@@ -55,6 +55,12 @@ class DRIVE_SHARED_TYPE:
         return (cls.NONE, cls.EXCLUSIVE, cls.SHARED, cls.TRANSIENT)
 
 
+class BLOCK_THRESHOLD:
+    UNSET = 0     # No threshold set, the drive is monitored by polling
+    SET = 1       # Threshold set, libvirt will report when it is exceeded
+    EXCEEDED = 2  # Threshold exceeded, the drive must be checked now
+
+
 class Drive(Base):
     __slots__ = ('iface', '_path', 'readonly', 'bootOrder', 'domainID',
                  'poolID', 'imageID', 'UUID', 'volumeID', 'format',
@@ -62,7 +68,8 @@ class Drive(Base):
                  'index', 'name', 'optional', 'shared', 'truesize',
                  'volumeChain', 'baseVolumeID', 'serial', 'reqsize', 'cache',
                  '_blockDev', 'extSharedState', 'drv', 'sgio', 'GUID',
-                 'diskReplicate', '_diskType', 'hosts', 'protocol', 'auth')
+                 'diskReplicate', '_diskType', 'hosts', 'protocol', 'auth',
+                 'threshold_state')
     VOLWM_CHUNK_SIZE = (config.getint('irs', 'volume_utilization_chunk_mb') *
                         constants.MEGAB)
     VOLWM_FREE_PCT = 100 - config.getint('irs', 'volume_utilization_percent')
@@ -169,6 +176,7 @@ class Drive(Base):
         self.apparentsize = int(kwargs.get('apparentsize', '0'))
         self.name = makeName(self.iface, self.index)
         self.cache = config.get('vars', 'qemu_drive_cache')
+        self.threshold_state = BLOCK_THRESHOLD.UNSET
 
         self._blockDev = None  # Lazy initialized
 